@@ -6,7 +6,10 @@
     See LICENSES/MIT.md for more information.
 """
 import sys
+import time
 
-from resources.lib.run_addon import run
+START_TIME = time.perf_counter()
 
-run(sys.argv)
+from resources.lib.run_addon import run  # pylint: disable=wrong-import-position
+
+run(sys.argv, START_TIME)
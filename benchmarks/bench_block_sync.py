@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+"""
+    Copyright (C) 2020 Stefano Gottardo (plugin.autoupdatekodi)
+    Benchmark of the download by reusing the blocks of the previous build
+
+    Two synthetic builds are served by a local HTTP server with Range support, the new build has some
+    changed regions and an insertion (that shift all the following data). The new build is downloaded
+    in full and by reusing the blocks of the previous one, the bytes transferred and the times are compared.
+    Run from the add-on folder: python benchmarks/bench_block_sync.py [size MB] [bandwidth Mbit/s]
+
+    SPDX-License-Identifier: MIT
+    See LICENSES/MIT.md for more information.
+"""
+import hashlib
+import json
+import os
+import random
+import re
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.request import Request, urlopen
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+# pylint: disable=wrong-import-position
+from resources.lib.helpers.block_manifest import assemble, compute_manifest, find_local_blocks
+
+CHUNK_SIZE = 64 * 1024
+CHANGED_REGIONS = 8  # Number of regions of the new build with changed bytes
+CHANGED_REGION_SIZE = 4 * 1024
+INSERTION_SIZE = 1000
+
+
+def generate_builds(folder, size):
+    """Write the previous and the new synthetic builds, return their paths"""
+    rnd = random.Random(20201229)
+    previous = rnd.getrandbits(size * 8).to_bytes(size, 'little')
+    new = bytearray(previous)
+    for _ in range(CHANGED_REGIONS):
+        pos = rnd.randrange(0, size - CHANGED_REGION_SIZE)
+        new[pos:pos + CHANGED_REGION_SIZE] = rnd.getrandbits(CHANGED_REGION_SIZE * 8).to_bytes(CHANGED_REGION_SIZE,
+                                                                                                'little')
+    pos = size * 3 // 5
+    new[pos:pos] = rnd.getrandbits(INSERTION_SIZE * 8).to_bytes(INSERTION_SIZE, 'little')
+    paths = []
+    for name, data in (('KodiSetup-previous.exe', previous), ('KodiSetup-new.exe', bytes(new))):
+        paths.append(os.path.join(folder, name))
+        with open(paths[-1], 'wb') as file_handle:
+            file_handle.write(data)
+    return paths
+
+
+class RangeHandler(BaseHTTPRequestHandler):
+    """Serve the files of the current folder, with the support of a single byte range"""
+    root = None
+    bandwidth = None  # Bytes per second, None for unlimited
+    bytes_sent = 0
+    lock = threading.Lock()
+
+    def do_GET(self):  # pylint: disable=invalid-name
+        path = os.path.join(self.root, os.path.basename(self.path))
+        if not os.path.isfile(path):
+            self.send_error(404)
+            return
+        size = os.path.getsize(path)
+        match = re.match(r'bytes=(\d+)-(\d+)', self.headers.get('Range', ''))
+        start, end = (int(match.group(1)), min(int(match.group(2)), size - 1)) if match else (0, size - 1)
+        self.send_response(206 if match else 200)
+        if match:
+            self.send_header('Content-Range', 'bytes {}-{}/{}'.format(start, end, size))
+        self.send_header('Content-Length', str(end - start + 1))
+        self.end_headers()
+        with open(path, 'rb') as file_handle:
+            file_handle.seek(start)
+            remaining = end - start + 1
+            while remaining:
+                data = file_handle.read(min(CHUNK_SIZE, remaining))
+                if self.bandwidth:
+                    time.sleep(len(data) / self.bandwidth)
+                self.wfile.write(data)
+                remaining -= len(data)
+                with self.lock:
+                    RangeHandler.bytes_sent += len(data)
+
+    def log_message(self, *args):  # pylint: disable=arguments-differ
+        pass
+
+
+def download_full(url, dest_path):
+    sha256 = hashlib.sha256()
+    with urlopen(url) as response, open(dest_path, 'wb') as file_handle:
+        while True:
+            data = response.read(CHUNK_SIZE)
+            if not data:
+                break
+            sha256.update(data)
+            file_handle.write(data)
+    return sha256.hexdigest()
+
+
+def download_block_reuse(url, dest_path, base_path):
+    # The manifest is computed here instead of being downloaded, its JSON size is added to the transferred bytes
+    manifest = compute_manifest(url_to_path(url))
+    sha256 = hashlib.sha256()
+    matches = find_local_blocks(manifest, base_path)
+
+    def fetch_range(start, end):
+        request = Request(url, headers={'Range': 'bytes={}-{}'.format(start, end)})
+        with urlopen(request) as response:
+            while True:
+                data = response.read(CHUNK_SIZE)
+                if not data:
+                    break
+                yield data
+
+    assemble(manifest, base_path, dest_path, matches, fetch_range, sha256)
+    return sha256.hexdigest(), manifest, matches
+
+
+def url_to_path(url):
+    return os.path.join(RangeHandler.root, os.path.basename(url))
+
+
+def measure(func, *args):
+    RangeHandler.bytes_sent = 0
+    start = time.perf_counter()
+    result = func(*args)
+    return time.perf_counter() - start, RangeHandler.bytes_sent, result
+
+
+def main():
+    size = int(float(sys.argv[1]) * 1024 * 1024) if len(sys.argv) > 1 else 32 * 1024 * 1024
+    bandwidth = float(sys.argv[2]) if len(sys.argv) > 2 else 100
+    folder = tempfile.mkdtemp()
+    try:
+        previous_path, new_path = generate_builds(folder, size)
+        RangeHandler.root = folder
+        RangeHandler.bandwidth = bandwidth * 1000 * 1000 / 8
+        server = ThreadingHTTPServer(('127.0.0.1', 0), RangeHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        url = 'http://127.0.0.1:{}/{}'.format(server.server_address[1], os.path.basename(new_path))
+        with open(new_path, 'rb') as file_handle:
+            expected = hashlib.sha256(file_handle.read()).hexdigest()
+        print('Synthetic builds of {:.1f} MB, {} changed regions of {} bytes and an insertion of {} bytes, '
+              'served at {} Mbit/s'.format(size / 1024 / 1024, CHANGED_REGIONS, CHANGED_REGION_SIZE,
+                                           INSERTION_SIZE, bandwidth))
+        full = measure(download_full, url, os.path.join(folder, 'full.exe'))
+        reuse = measure(download_block_reuse, url, os.path.join(folder, 'reuse.exe'), previous_path)
+        server.shutdown()
+        assert full[2] == expected, 'The full download does not match'
+        assert reuse[2][0] == expected, 'The file built by reusing the blocks does not match'
+        manifest, matches = reuse[2][1], reuse[2][2]
+        manifest_size = len(json.dumps(manifest, separators=(',', ':')))
+        print('  {:<22}{:>12}{:>20}'.format('Mode', 'Time (s)', 'Transferred (MB)'))
+        print('  {:<22}{:>12.2f}{:>20.2f}'.format('full download', full[0], full[1] / 1024 / 1024))
+        print('  {:<22}{:>12.2f}{:>20.2f}'.format('block reuse', reuse[0], (reuse[1] + manifest_size) / 1024 / 1024))
+        print('Reused {} of {} blocks, manifest of {:.0f} KB included in the transferred size'.format(
+            len(matches), len(manifest['blocks']), manifest_size / 1024))
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
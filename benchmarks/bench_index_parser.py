@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+"""
+    Copyright (C) 2020 Stefano Gottardo (plugin.autoupdatekodi)
+    Micro-benchmark of the mirror index page parser
+
+    Compare the previous approach (whole page decoded twice and two regex passes)
+    with the single-pass streaming parser, on a synthetic index page.
+    The network run delivers the chunks at a simulated bandwidth, where the streaming parser
+    works while the page is downloaded instead of after.
+    Run from the add-on folder: python benchmarks/bench_index_parser.py [entries] [bandwidth Mbit/s]
+
+    SPDX-License-Identifier: MIT
+    See LICENSES/MIT.md for more information.
+"""
+import os
+import re
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+from resources.lib.helpers.index_parser import parse_index  # pylint: disable=wrong-import-position
+
+CHUNK_SIZE = 64 * 1024
+ROUNDS = 5
+
+
+def generate_index_page(entries):
+    """Generate an index page similar to the mirrors.kodi.tv listings"""
+    rows = ['<html><head><title>Index of /nightlies/windows/win64/master/</title></head><body>',
+            '<table><tr><th>File Name</th><th>File Size</th><th>Date</th></tr>',
+            '<tr><td><a href="../">Parent directory/</a></td><td>-</td><td>-</td></tr>',
+            '<tr><td><a href="old/">old/</a></td><td>-</td><td>2020-Dec-01 10:00</td></tr>']
+    for index in range(entries):
+        filename = 'KodiSetup-2020{:04d}-{:08x}-master-x64.exe'.format(index % 10000, index * 2654435761 % 2 ** 32)
+        rows.append('<tr><td class="fn"><a href="{0}" title="{0}">{0}</a></td>'
+                    '<td class="fs">{1:.1f} MiB</td><td class="fd">2020-Dec-{2:02d} 03:{3:02d}</td></tr>'
+                    .format(filename, 70 + index % 10 / 10, index % 28 + 1, index % 60))
+    rows.append('</table></body></html>')
+    return '\n'.join(rows).encode('utf-8')
+
+
+def iter_chunks(data, bandwidth=None):
+    """Split the data in chunks, when the bandwidth (bytes/s) is set each chunk is delayed as from the network"""
+    start = time.perf_counter()
+    for pos in range(0, len(data), CHUNK_SIZE):
+        if bandwidth:
+            delay = start + (pos + CHUNK_SIZE) / bandwidth - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+        yield data[pos:pos + CHUNK_SIZE]
+
+
+def parse_previous(chunks, timing):
+    page_response = b''.join(chunks)
+    folder_list = re.findall(r'href="([^\/"\.]+)\/"', page_response.decode())
+    file_list = re.findall(r'href="([^"]*\.exe)"', page_response.decode())
+    timing.setdefault('first', time.perf_counter())
+    return folder_list, file_list
+
+
+def parse_streaming(chunks, timing):
+    folder_list = []
+    file_list = []
+    for entry in parse_index(chunks):
+        timing.setdefault('first', time.perf_counter())
+        (folder_list if entry.is_folder else file_list).append(entry)
+    return folder_list, file_list
+
+
+def measure(func, data, bandwidth=None, rounds=ROUNDS):
+    """Return the best total time, the best time to the first entry, the peak memory and the result"""
+    best_time = best_first = None
+    for _ in range(rounds):
+        timing = {}
+        start = time.perf_counter()
+        func(iter_chunks(data, bandwidth), timing)
+        elapsed = time.perf_counter() - start
+        first = timing['first'] - start
+        best_time = elapsed if best_time is None else min(best_time, elapsed)
+        best_first = first if best_first is None else min(best_first, first)
+    tracemalloc.start()
+    result = func(iter_chunks(data), {})
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return best_time, best_first, peak, result
+
+
+def print_results(title, results):
+    print(title)
+    print('  {:<24}{:>12}{:>18}{:>18}'.format('Parser', 'Total (ms)', 'First entry (ms)', 'Peak memory (KB)'))
+    for name, (total, first, peak, _) in results:
+        print('  {:<24}{:>12.1f}{:>18.1f}{:>18.0f}'.format(name, total * 1000, first * 1000, peak / 1024))
+
+
+def main():
+    entries = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    bandwidth = float(sys.argv[2]) if len(sys.argv) > 2 else 20
+    data = generate_index_page(entries)
+    print('Synthetic index page: {} entries, {:.2f} MB'.format(entries, len(data) / 1024 / 1024))
+    previous = measure(parse_previous, data)
+    streaming = measure(parse_streaming, data)
+    assert previous[3][1] == [entry.name for entry in streaming[3][1]], 'The parsed file lists differ'
+    assert previous[3][0] == [entry.name for entry in streaming[3][0]], 'The parsed folder lists differ'
+    print_results('In memory (CPU only):', [('previous (2x regex)', previous),
+                                            ('streaming single-pass', streaming)])
+    bytes_per_sec = bandwidth * 1000 * 1000 / 8
+    print_results('From network at {} Mbit/s:'.format(bandwidth),
+                  [('previous (2x regex)', measure(parse_previous, data, bytes_per_sec, 1)),
+                   ('streaming single-pass', measure(parse_streaming, data, bytes_per_sec, 1))])
+    print('Note: the streaming parser also extracts the size and date columns of each entry')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+"""
+    Copyright (C) 2020 Stefano Gottardo (plugin.autoupdatekodi)
+    Benchmark of the streaming JSON reader on a large GitHub compare response
+
+    Compare the previous approach (whole body read and decoded by json.loads) with the streaming reader
+    that extracts only the fields used, the parse time and the peak memory (traced by tracemalloc) are measured.
+    By default a synthetic compare response is used, a recorded response can be given as file, e.g.:
+    curl -o compare.json https://api.github.com/repos/xbmc/xbmc/compare/<base sha>...<head sha>
+    Run from the add-on folder: python benchmarks/bench_json_stream.py [recorded response file]
+
+    SPDX-License-Identifier: MIT
+    See LICENSES/MIT.md for more information.
+"""
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path[:0] = [os.path.join(os.path.dirname(os.path.abspath(__file__)), 'kodi_stubs'),
+                os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)]
+
+# pylint: disable=wrong-import-position
+from mirror_server import generate_compare, get_build_sha
+from resources.lib.helpers.git_index import COMPARE_FIELDS
+from resources.lib.helpers.json_stream import extract_json
+
+CHUNK_SIZE = 64 * 1024
+ROUNDS = 5
+SYNTHETIC_BUILDS = 70  # Builds between the compared commits, 4 commits for each build
+
+
+def iter_chunks(data):
+    for pos in range(0, len(data), CHUNK_SIZE):
+        yield data[pos:pos + CHUNK_SIZE]
+
+
+def parse_previous(data):
+    return json.loads(b''.join(iter_chunks(data)).decode('utf-8'))
+
+
+def parse_streaming(data):
+    return extract_json(iter_chunks(data), COMPARE_FIELDS)
+
+
+def measure(func, data):
+    """Get the median time (ms) and the peak memory (bytes) of a parse"""
+    times = []
+    for _ in range(ROUNDS):
+        start = time.perf_counter()
+        func(data)
+        times.append((time.perf_counter() - start) * 1000)
+    tracemalloc.start()
+    result = func(data)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return sorted(times)[len(times) // 2], peak, result
+
+
+def main():
+    if len(sys.argv) > 1:
+        with open(sys.argv[1], 'rb') as file_handle:
+            data = file_handle.read()
+        description = 'Recorded response {}'.format(sys.argv[1])
+    else:
+        data = json.dumps(generate_compare(get_build_sha(SYNTHETIC_BUILDS), get_build_sha(0))).encode('utf-8')
+        description = 'Synthetic compare response'
+    print('{} of {:.2f} MB'.format(description, len(data) / 1024 / 1024))
+    previous = measure(parse_previous, data)
+    streaming = measure(parse_streaming, data)
+    expected = [(commit_data['sha'], commit_data['commit']['message']) for commit_data in previous[2]['commits']]
+    assert [(commit_data['sha'], commit_data['commit']['message'])
+            for commit_data in streaming[2]['commits']] == expected, 'The extracted commits do not match'
+    assert streaming[2]['total_commits'] == previous[2]['total_commits'], 'The total of commits does not match'
+    print('  {:<22}{:>12}{:>18}'.format('Parser', 'Time (ms)', 'Peak memory (MB)'))
+    for name, (elapsed, peak, _) in (('json.loads', previous), ('streaming extract', streaming)):
+        print('  {:<22}{:>12.1f}{:>18.2f}'.format(name, elapsed, peak / 1024 / 1024))
+    print('{} commits extracted'.format(len(expected)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+"""
+    Copyright (C) 2020 Stefano Gottardo (plugin.autoupdatekodi)
+    Stand-in of the Kodi xbmc module, to run the add-on code outside Kodi (benchmarks only)
+
+    SPDX-License-Identifier: MIT
+    See LICENSES/MIT.md for more information.
+"""
+import json
+import os
+import sys
+import time
+
+LOGDEBUG = 0
+LOGINFO = 1
+LOGWARNING = 2
+LOGERROR = 4
+
+# Messages with a lower level are not printed, set with the KODI_STUB_LOG_LEVEL environment variable
+LOG_LEVEL = int(os.environ.get('KODI_STUB_LOG_LEVEL', LOGERROR))
+
+
+def log(msg, level=LOGDEBUG):
+    if level >= LOG_LEVEL:
+        sys.stderr.write(msg + '\n')
+
+
+def sleep(time_ms):
+    time.sleep(time_ms / 1000)
+
+
+def executebuiltin(function, wait=False):  # pylint: disable=unused-argument
+    pass
+
+
+def executeJSONRPC(request):  # pylint: disable=invalid-name
+    return json.dumps({'jsonrpc': '2.0', 'id': json.loads(request).get('id'), 'result': {}})
+
+
+def getLocalizedString(string_id):  # pylint: disable=invalid-name
+    return 'String {}'.format(string_id)
+
+
+class Monitor(object):
+    """Monitor that never requests the abort"""
+
+    def abortRequested(self):  # pylint: disable=invalid-name
+        return False
+
+    def waitForAbort(self, timeout=None):  # pylint: disable=invalid-name
+        time.sleep(timeout or 0)
+        return False
+
+
+class Player(object):
+    """Player that is always idle"""
+
+    def isPlaying(self):  # pylint: disable=invalid-name
+        return False
@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+"""
+    Copyright (C) 2020 Stefano Gottardo (plugin.autoupdatekodi)
+    Stand-in of the Kodi xbmcaddon module, to run the add-on code outside Kodi (benchmarks only)
+
+    The add-on info is read from addon.xml, the settings have the default values of resources/settings.xml
+    and can be changed with the SETTINGS dict. The profile folder is set with the KODI_STUB_PROFILE
+    environment variable.
+
+    SPDX-License-Identifier: MIT
+    See LICENSES/MIT.md for more information.
+"""
+import os
+import tempfile
+import xml.etree.ElementTree as ET
+
+ADDON_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, os.pardir)
+PROFILE_PATH = os.environ.get('KODI_STUB_PROFILE') or tempfile.mkdtemp(prefix='kodi_stub_profile_')
+
+
+def _load_default_settings():
+    settings = {}
+    for setting in ET.parse(os.path.join(ADDON_PATH, 'resources', 'settings.xml')).iter('setting'):
+        if 'id' not in setting.attrib:
+            continue
+        value = setting.get('default', '')
+        if setting.get('type') == 'bool':
+            value = value == 'true'
+        elif setting.get('option') == 'int':
+            value = int(value or 0)
+        settings[setting.get('id')] = value
+    return settings
+
+
+def _load_addon_info():
+    root = ET.parse(os.path.join(ADDON_PATH, 'addon.xml')).getroot()
+    return {
+        'id': root.get('id'),
+        'name': root.get('name'),
+        'version': root.get('version'),
+        'icon': os.path.join(ADDON_PATH, 'resources', 'media', 'icon.png'),
+        'path': os.path.join(os.path.abspath(ADDON_PATH), ''),
+        'profile': os.path.join(os.path.abspath(PROFILE_PATH), '')
+    }
+
+
+SETTINGS = _load_default_settings()
+ADDON_INFO = _load_addon_info()
+
+
+class Addon(object):
+    """Add-on with the settings kept in the SETTINGS dict"""
+    # pylint: disable=invalid-name
+
+    def __init__(self, addon_id=None):
+        self._addon_id = addon_id
+
+    def getAddonInfo(self, info_id):
+        return ADDON_INFO.get(info_id, '')
+
+    def getLocalizedString(self, string_id):
+        return 'String {}'.format(string_id)
+
+    def getSetting(self, setting_id):
+        value = SETTINGS.get(setting_id, '')
+        return str(value).lower() if isinstance(value, bool) else str(value)
+
+    def getSettingBool(self, setting_id):
+        return bool(SETTINGS.get(setting_id, False))
+
+    def getSettingInt(self, setting_id):
+        return int(SETTINGS.get(setting_id, 0))
+
+    def getSettingNumber(self, setting_id):
+        return float(SETTINGS.get(setting_id, 0))
+
+    def getSettingString(self, setting_id):
+        return str(SETTINGS.get(setting_id, ''))
+
+    def setSetting(self, setting_id, value):
+        SETTINGS[setting_id] = value
+
+    def setSettingBool(self, setting_id, value):
+        SETTINGS[setting_id] = bool(value)
+
+    def setSettingInt(self, setting_id, value):
+        SETTINGS[setting_id] = int(value)
+
+    def setSettingString(self, setting_id, value):
+        SETTINGS[setting_id] = str(value)
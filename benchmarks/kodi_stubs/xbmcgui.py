@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+"""
+    Copyright (C) 2020 Stefano Gottardo (plugin.autoupdatekodi)
+    Stand-in of the Kodi xbmcgui module, to run the add-on code outside Kodi (benchmarks only)
+
+    SPDX-License-Identifier: MIT
+    See LICENSES/MIT.md for more information.
+"""
+
+
+class ListItem(object):
+    """List item that keeps the values set"""
+    # pylint: disable=invalid-name
+
+    def __init__(self, label='', label2='', path='', offscreen=False):  # pylint: disable=unused-argument
+        self._label = label
+        self.info = {}
+        self.properties = {}
+        self.art = {}
+        self.context_menu_items = []
+
+    def getLabel(self):
+        return self._label
+
+    def setLabel(self, label):
+        self._label = label
+
+    def setContentLookup(self, enable):
+        pass
+
+    def setInfo(self, info_type, info_labels):  # pylint: disable=unused-argument
+        self.info.update(info_labels)
+
+    def setProperties(self, properties):
+        self.properties.update(properties)
+
+    def setArt(self, art):
+        self.art.update(art)
+
+    def addContextMenuItems(self, items):
+        self.context_menu_items.extend(items)
+
+
+class Dialog(object):
+    """Dialog that answer without user interaction, the select dialog is closed immediately"""
+    # pylint: disable=invalid-name
+
+    def ok(self, heading, message):  # pylint: disable=unused-argument
+        return True
+
+    def yesno(self, heading, message, *args, **kwargs):  # pylint: disable=unused-argument
+        return True
+
+    def select(self, heading, items, *args, **kwargs):  # pylint: disable=unused-argument
+        return -1
+
+    def textviewer(self, heading, text, *args, **kwargs):  # pylint: disable=unused-argument
+        pass
+
+    def notification(self, heading, message, *args, **kwargs):  # pylint: disable=unused-argument
+        pass
+
+
+class DialogProgress(object):
+    """Progress dialog that is never cancelled"""
+    # pylint: disable=invalid-name
+
+    def __init__(self):
+        self.updates = 0
+
+    def create(self, heading, message=''):
+        pass
+
+    def update(self, percent, message=''):  # pylint: disable=unused-argument
+        self.updates += 1
+
+    def iscanceled(self):
+        return False
+
+    def close(self):
+        pass
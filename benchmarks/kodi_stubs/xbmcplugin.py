@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+"""
+    Copyright (C) 2020 Stefano Gottardo (plugin.autoupdatekodi)
+    Stand-in of the Kodi xbmcplugin module, to run the add-on code outside Kodi (benchmarks only)
+
+    SPDX-License-Identifier: MIT
+    See LICENSES/MIT.md for more information.
+"""
+# pylint: disable=invalid-name,unused-argument
+SORT_METHOD_NONE = 0
+SORT_METHOD_LABEL = 1
+SORT_METHOD_LABEL_IGNORE_FOLDERS = 2
+SORT_METHOD_EPISODE = 3
+SORT_METHOD_VIDEO_TITLE = 4
+
+DIRECTORY_ITEMS = []  # The items of the last directory listing
+
+
+def addDirectoryItems(handle, items, totalItems=0):
+    DIRECTORY_ITEMS[:] = items
+    return True
+
+
+def addSortMethod(handle, sortMethod, labelMask=''):
+    pass
+
+
+def setContent(handle, content):
+    pass
+
+
+def setPluginCategory(handle, category):
+    pass
+
+
+def endOfDirectory(handle, succeeded=True, updateListing=False, cacheToDisc=True):
+    pass
@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+"""
+    Copyright (C) 2020 Stefano Gottardo (plugin.autoupdatekodi)
+    Stand-in of the Kodi xbmcvfs module, to run the add-on code outside Kodi (benchmarks only)
+
+    SPDX-License-Identifier: MIT
+    See LICENSES/MIT.md for more information.
+"""
+import os
+import shutil
+
+# pylint: disable=invalid-name
+
+
+def translatePath(path):
+    # The stub paths are already real file system paths
+    return path
+
+
+def makeLegalFilename(filename):
+    return filename
+
+
+def exists(path):
+    return os.path.exists(path)
+
+
+def mkdir(path):
+    try:
+        os.mkdir(path)
+        return True
+    except OSError:
+        return False
+
+
+def mkdirs(path):
+    os.makedirs(path, exist_ok=True)
+    return True
+
+
+def delete(path):
+    try:
+        os.remove(path)
+        return True
+    except OSError:
+        return False
+
+
+def rmdir(path, force=False):
+    try:
+        if force:
+            shutil.rmtree(path)
+        else:
+            os.rmdir(path)
+        return True
+    except OSError:
+        return False
+
+
+def copy(source, destination):
+    shutil.copyfile(source, destination)
+    return True
+
+
+def rename(file, newFile):  # pylint: disable=redefined-builtin
+    os.replace(file, newFile)
+    return True
+
+
+def listdir(path):
+    folders = []
+    files = []
+    for entry in os.scandir(path):
+        (folders if entry.is_dir() else files).append(entry.name)
+    return folders, files
+
+
+class File(object):
+    """File opened with the Kodi VFS"""
+
+    def __init__(self, path, mode='r'):
+        self._handle = open(path, mode + ('' if 'b' in mode else 'b'))
+
+    def read(self, size=-1):
+        return self._handle.read(size).decode('utf-8')
+
+    def readBytes(self, size=-1):
+        return self._handle.read(size)
+
+    def write(self, data):
+        self._handle.write(data.encode('utf-8') if isinstance(data, str) else data)
+        return True
+
+    def close(self):
+        self._handle.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
@@ -0,0 +1,260 @@
+# -*- coding: utf-8 -*-
+"""
+    Copyright (C) 2020 Stefano Gottardo (plugin.autoupdatekodi)
+    Local HTTP server that simulates the Kodi mirror and the GitHub API, for the benchmarks
+
+    Served paths (the builds folder can be nested in other folders, e.g. /nightlies/builds-1000/master/):
+      /builds-<N>/                    mirror index page with N installers, from the newest to the oldest
+      /builds-<N>/<installer>.exe     synthetic installer, with the support of a single byte range
+      /github/compare/<base>...<head> GitHub compare of the synthetic builds, with the merge commits of the PR's,
+                                      paginated by the page and per_page parameters as GitHub does
+      /github/pulls/<number>          GitHub pull request data
+      /github/pulls/<number>/commits  GitHub pull request commits
+    The responses have an ETag, the conditional requests are answered with 304.
+    The GitHub responses have the rate limit header, with the remaining requests never decreased.
+    Run standalone: python benchmarks/mirror_server.py [port]
+
+    SPDX-License-Identifier: MIT
+    See LICENSES/MIT.md for more information.
+"""
+import hashlib
+import json
+import random
+import re
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+INSTALLER_SIZE = 64 * 1024 * 1024
+PRS_PER_BUILD = 3  # Merged PR's between two consecutive builds
+COMPARE_PAGE_SIZE = 250  # Commits of a compare page when per_page is not specified
+COMPARE_FILES = 300  # Changed files of a compare, included in the first page only
+GITHUB_PATH = '/github/'
+RATE_LIMIT_REMAINING = 5000
+SEND_CHUNK_SIZE = 256 * 1024
+
+
+def get_build_sha(index):
+    """Get the commit sha of a synthetic build, the index 0 is the newest build"""
+    return hashlib.sha1('build-{}'.format(index).encode('ascii')).hexdigest()
+
+
+def get_build_filename(index):
+    return 'KodiSetup-{}-{}-master-x64.exe'.format(20201229 - index, get_build_sha(index)[:8])
+
+
+def get_pr_number(build_index, pr_index):
+    return 30000 - build_index * PRS_PER_BUILD - pr_index
+
+
+def generate_index_page(entries):
+    """Generate an index page similar to the mirrors.kodi.tv listings"""
+    rows = ['<html><head><title>Index of /</title></head><body>',
+            '<table><tr><th>File Name</th><th>File Size</th><th>Date</th></tr>',
+            '<tr><td><a href="../">Parent directory/</a></td><td>-</td><td>-</td></tr>']
+    for index in range(entries):
+        rows.append('<tr><td class="fn"><a href="{0}" title="{0}">{0}</a></td>'
+                    '<td class="fs">{1:.1f} MiB</td><td class="fd">2020-Dec-{2:02d} 03:{3:02d}</td></tr>'
+                    .format(get_build_filename(index), 70 + index % 10 / 10, 28 - index % 28, index % 60))
+    rows.append('</table></body></html>')
+    return '\n'.join(rows).encode('utf-8')
+
+
+def generate_compare(base_sha, head_sha, page=1, per_page=COMPARE_PAGE_SIZE):
+    """
+    Generate a GitHub compare response between two synthetic builds, the commits are from the oldest to the newest,
+    for each build there are the merge commits of its PR's followed by the commit of the build
+    """
+    base_index = _get_build_index(base_sha)
+    head_index = _get_build_index(head_sha)
+    if base_index is None or head_index is None or base_index <= head_index:
+        return None
+    commits = []
+    for build_index in range(base_index - 1, head_index - 1, -1):
+        for pr_index in range(PRS_PER_BUILD):
+            pr_number = get_pr_number(build_index, pr_index)
+            commits.append(_make_commit(
+                hashlib.sha1('merge-{}'.format(pr_number).encode('ascii')).hexdigest(),
+                'Merge pull request #{} from user/branch-{}\n\n[video] Change number {}'.format(
+                    pr_number, pr_number, pr_number)))
+        commits.append(_make_commit(get_build_sha(build_index), 'Build {}'.format(build_index)))
+    data = {'total_commits': len(commits), 'commits': commits[(page - 1) * per_page:page * per_page]}
+    if page == 1:
+        data['files'] = [_make_file(index) for index in range(min(COMPARE_FILES, len(commits) * 3))]
+    return data
+
+
+def generate_pull_request(pr_number):
+    return {'number': pr_number, 'title': 'Change number {}'.format(pr_number),
+            'body': '<!-- template -->Description of the change {}.\n'.format(pr_number) * 5}
+
+
+def generate_pull_request_commits(pr_number):
+    return [_make_commit(hashlib.sha1('pr-{}-{}'.format(pr_number, index).encode('ascii')).hexdigest(),
+                         'Commit {} of PR {}\n\nDetails'.format(index, pr_number))
+            for index in range(5)]
+
+
+def _make_commit(sha, message):
+    """A commit with the same fields of the GitHub API"""
+    person = {'name': 'Author', 'email': 'author@example.com', 'date': '2020-12-29T03:00:00Z'}
+    user = {'login': 'author', 'id': 1000, 'node_id': 'MDQ6VXNlcjEwMDA=', 'type': 'User', 'site_admin': False,
+            'avatar_url': 'https://avatars.githubusercontent.com/u/1000?v=4',
+            'url': 'https://api.github.com/users/author', 'html_url': 'https://github.com/author'}
+    return {'sha': sha, 'node_id': 'MDY6Q29tbWl0' + sha[:20],
+            'commit': {'author': person, 'committer': person, 'message': message,
+                       'tree': {'sha': sha[::-1], 'url': 'https://api.github.com/repos/xbmc/xbmc/git/trees/' + sha},
+                       'url': 'https://api.github.com/repos/xbmc/xbmc/git/commits/' + sha,
+                       'comment_count': 0,
+                       'verification': {'verified': False, 'reason': 'unsigned', 'signature': None, 'payload': None}},
+            'url': 'https://api.github.com/repos/xbmc/xbmc/commits/' + sha,
+            'html_url': 'https://github.com/xbmc/xbmc/commit/' + sha,
+            'comments_url': 'https://api.github.com/repos/xbmc/xbmc/commits/{}/comments'.format(sha),
+            'author': user, 'committer': user,
+            'parents': [{'sha': sha[1:] + sha[0], 'url': 'https://api.github.com/repos/xbmc/xbmc/commits/' + sha}]}
+
+
+_PATCH_LINES = ['  if (m_value{0} > 0)', '  {{', '    m_items.emplace_back(m_value{0}, GetItem({0}));',
+                '    CLog::Log(LOGDEBUG, "CFile::Process - item {0}: {{}}", m_items.back().name);', '  }}',
+                '\tauto value{0} = std::make_shared<CValue>(m_settings->GetInt(SETTING_VALUE_{0}));',
+                '  // Update the value {0} when the settings are changed', '  m_changed = true;']
+
+
+def _make_file(index):
+    """A changed file of a compare, with a patch of some kilobytes"""
+    filename = 'xbmc/cores/module_{}/File{}.cpp'.format(index % 20, index)
+    lines = ['@@ -{0},7 +{0},9 @@ void CFile{1}::Process()'.format(index * 10, index)]
+    for line in range(200):
+        lines.append('+-  '[line % 4] + _PATCH_LINES[line % len(_PATCH_LINES)].format(line))
+    return {'sha': hashlib.sha1(filename.encode('ascii')).hexdigest(), 'filename': filename, 'status': 'modified',
+            'additions': 30, 'deletions': 15, 'changes': 45,
+            'blob_url': 'https://github.com/xbmc/xbmc/blob/master/' + filename,
+            'raw_url': 'https://github.com/xbmc/xbmc/raw/master/' + filename,
+            'contents_url': 'https://api.github.com/repos/xbmc/xbmc/contents/' + filename,
+            'patch': '\n'.join(lines)}
+
+
+_BUILD_INDEXES = {}  # Short sha -> build index
+MAX_BUILDS = 10000
+
+
+def _get_build_index(sha):
+    if not _BUILD_INDEXES:
+        _BUILD_INDEXES.update((get_build_sha(index)[:8], index) for index in range(MAX_BUILDS))
+    return _BUILD_INDEXES.get(sha[:8])
+
+
+class MirrorRequestHandler(BaseHTTPRequestHandler):
+    """Serve the synthetic mirror and GitHub responses"""
+    protocol_version = 'HTTP/1.1'  # Keep-alive connections, as the real servers
+    installer = b''
+
+    def do_GET(self):  # pylint: disable=invalid-name
+        path, _, query = self.path.partition('?')
+        body, content_type = self._get_content(path, parse_qs(query))
+        if body is None:
+            self._send_empty(404)
+            return
+        etag = '"{}"'.format(hashlib.md5(body[:4096]).hexdigest()[:16] + str(len(body)))
+        if self.headers.get('If-None-Match') == etag:
+            self._send_empty(304, {'ETag': etag})
+            return
+        match = re.match(r'bytes=(\d+)-(\d*)$', self.headers.get('Range', ''))
+        if match and self.headers.get('If-Range') in (None, etag):
+            start = int(match.group(1))
+            end = min(int(match.group(2)) if match.group(2) else len(body) - 1, len(body) - 1)
+            self.send_response(206)
+            self.send_header('Content-Range', 'bytes {}-{}/{}'.format(start, end, len(body)))
+        else:
+            start, end = 0, len(body) - 1
+            self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(end - start + 1))
+        self.send_header('Accept-Ranges', 'bytes')
+        self.send_header('ETag', etag)
+        if content_type == 'application/json':
+            self.send_header('X-RateLimit-Remaining', str(RATE_LIMIT_REMAINING))
+        self.end_headers()
+        view = memoryview(body)
+        for pos in range(start, end + 1, SEND_CHUNK_SIZE):
+            self.wfile.write(view[pos:min(pos + SEND_CHUNK_SIZE, end + 1)])
+
+    def _get_content(self, path, query):
+        if path.startswith(GITHUB_PATH):
+            data = self._get_github_data(path[len(GITHUB_PATH):], query)
+            return (None, None) if data is None else (json.dumps(data).encode('utf-8'), 'application/json')
+        match = re.search(r'/builds-(\d+)/', path)
+        if not match:
+            return None, None
+        if path.endswith('/'):
+            return generate_index_page(int(match.group(1))), 'text/html'
+        if path.endswith('.exe'):
+            return self.installer, 'application/octet-stream'
+        return None, None
+
+    @staticmethod
+    def _get_github_data(path, query):
+        match = re.match(r'compare/(\w+)\.\.\.(\w+)$', path)
+        if match:
+            return generate_compare(match.group(1), match.group(2), int(query.get('page', ['1'])[0]),
+                                    int(query.get('per_page', [str(COMPARE_PAGE_SIZE)])[0]))
+        match = re.match(r'pulls/(\d+)(/commits)?$', path)
+        if match:
+            if match.group(2):
+                return generate_pull_request_commits(int(match.group(1)))
+            return generate_pull_request(int(match.group(1)))
+        return None
+
+    def _send_empty(self, status, headers=None):
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def log_message(self, *args):  # pylint: disable=arguments-differ
+        pass
+
+
+class MirrorServer(object):
+    """The server running in a background thread"""
+
+    def __init__(self, port=0, installer_size=INSTALLER_SIZE):
+        rnd = random.Random(20201229)
+        # A handler class for each server, so each one can have its own installer size
+        self._handler = type('Handler', (MirrorRequestHandler,),
+                             {'installer': rnd.getrandbits(installer_size * 8).to_bytes(installer_size, 'little')})
+        self._server = ThreadingHTTPServer(('127.0.0.1', port), self._handler)
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        return 'http://127.0.0.1:{}/'.format(self._server.server_address[1])
+
+    @property
+    def github_url(self):
+        return self.url + GITHUB_PATH[1:]
+
+    @property
+    def installer_size(self):
+        return len(self._handler.installer)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def join(self):
+        self._thread.join()
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+if __name__ == '__main__':
+    SERVER = MirrorServer(int(sys.argv[1]) if len(sys.argv) > 1 else 8080)
+    print('Serving the mirror at {} and the GitHub API at {}'.format(SERVER.url, SERVER.github_url))
+    SERVER.start().join()
@@ -0,0 +1,251 @@
+# -*- coding: utf-8 -*-
+"""
+    Copyright (C) 2020 Stefano Gottardo (plugin.autoupdatekodi)
+    Benchmark suite of the add-on, runs outside Kodi
+
+    The Kodi modules are replaced by the stand-ins of the kodi_stubs folder, the mirror and the GitHub API
+    by the local server of mirror_server.py, so the results do not depend on the network.
+    Measured:
+      startup       run_addon.run of the root listing, cold (new interpreter) and warm (reuseLanguageInvoker)
+      subfolder     Directory.subfolder of listings with 100, 1000, 10000 builds, not cached and cached
+      download      file_ops.download_file throughput of an installer
+      git_history   ActionsExecutor.get_git_history latency, with the git index empty and filled
+    The results are saved in benchmarks/results/<add-on version>.json and compared with the last results
+    of another version, so the regressions show up between the versions.
+    Run from the add-on folder: python benchmarks/run_benchmarks.py [--quick] [--no-save] [--compare FILE]
+
+    SPDX-License-Identifier: MIT
+    See LICENSES/MIT.md for more information.
+"""
+import argparse
+import glob
+import json
+import os
+import platform
+import shutil
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections import OrderedDict
+from datetime import datetime
+
+BENCHMARKS_PATH = os.path.dirname(os.path.abspath(__file__))
+ADDON_PATH = os.path.join(BENCHMARKS_PATH, os.pardir)
+RESULTS_PATH = os.path.join(BENCHMARKS_PATH, 'results')
+sys.path[:0] = [os.path.join(BENCHMARKS_PATH, 'kodi_stubs'), ADDON_PATH]
+
+# pylint: disable=wrong-import-position
+from mirror_server import MirrorServer, get_build_filename
+
+ROOT_URL = 'plugin://plugin.autoupdatekodi/'
+BUILDS_FOLDER = ['nightlies', 'builds-{}', 'master']  # 'nightlies' and 'master' enable the GitHub menu
+LISTING_SIZES = (100, 1000, 10000)
+REGRESSION_THRESHOLD = 0.1  # Relative change of a result considered a regression
+
+
+class Benchmarks(object):
+    """Run the benchmarks in this process, the add-on modules use the stand-ins and the local server"""
+
+    def __init__(self, server, profile_path, quick=False):
+        self.server = server
+        self.profile_path = profile_path
+        self.rounds = 3 if quick else 10
+        self.results = OrderedDict()
+        setup_addon(profile_path, server.url, server.github_url)
+
+    def run_all(self):
+        self.bench_startup()
+        self.bench_subfolder()
+        self.bench_download()
+        self.bench_git_history()
+        return self.results
+
+    def bench_startup(self):
+        cold_times = [measure_cold_start(self.profile_path, self.server) for _ in range(self.rounds // 2 + 1)]
+        self._add_result('startup_cold', statistics.median(cold_times), 'ms')
+        from resources.lib.run_addon import run
+        run([ROOT_URL, '1', ''])  # The first run in this process is the cold start
+        self._add_result('startup_warm', self._measure(lambda: run([ROOT_URL, '1', '']), self.rounds * 5), 'ms')
+
+    def bench_subfolder(self):
+        from resources.lib.helpers.http_cache import HTTP_CACHE
+        from resources.lib.helpers.listing_cache import LISTING_CACHE
+        from resources.lib.navigation.directory import Directory
+
+        def clear_caches():
+            LISTING_CACHE.invalidate()
+            HTTP_CACHE.clear()
+
+        for entries in LISTING_SIZES:
+            pathitems = get_builds_pathitems(entries)
+            self._add_result('subfolder_{}'.format(entries),
+                             self._measure(lambda: Directory({}).subfolder(pathitems), self.rounds, clear_caches),
+                             'ms')
+            self._add_result('subfolder_{}_cached'.format(entries),
+                             self._measure(lambda: Directory({}).subfolder(pathitems), self.rounds), 'ms')
+
+    def bench_download(self):
+        from resources.lib.helpers.file_ops import download_file
+        url = self.server.url + '/'.join(get_builds_pathitems(10)) + '/' + get_build_filename(0)
+        dest_path = os.path.join(self.profile_path, 'benchmark_download.exe')
+        rounds = max(self.rounds // 3, 1)
+        elapsed = self._measure(lambda: download_file(url, dest_path, get_build_filename(0)), rounds,
+                                lambda: _delete_file(dest_path))
+        _delete_file(dest_path)
+        self._add_result('download_throughput', self.server.installer_size / 1024 / 1024 / (elapsed / 1000),
+                         'MB/s', lower_is_better=False)
+
+    def bench_git_history(self):
+        from resources.lib.helpers.git_index import GIT_INDEX
+        from resources.lib.navigation.actions import ActionsExecutor
+        from resources.lib.navigation.directory import Directory
+        pathitems = get_builds_pathitems(1000)
+        Directory({}).subfolder(pathitems)  # The builds list is taken from the listing cache
+
+        def clear_index():
+            with sqlite3.connect(GIT_INDEX.db_path) as conn:
+                conn.execute('DELETE FROM merged_prs')
+            conn.close()
+
+        def get_git_history(index):
+            ActionsExecutor({}).get_git_history(pathitems + [get_build_filename(index)])
+
+        # The index is cleared before each round, so each round requests the compare to GitHub
+        self._add_result('git_history_not_indexed',
+                         self._measure(lambda: get_git_history(5), self.rounds, clear_index), 'ms')
+        self._add_result('git_history_indexed', self._measure(lambda: get_git_history(5), self.rounds), 'ms')
+
+    @staticmethod
+    def _measure(func, rounds, setup=None):
+        """Get the median time of the function execution in ms, the setup function is not measured"""
+        times = []
+        for _ in range(rounds):
+            if setup:
+                setup()
+            start_time = time.perf_counter()
+            func()
+            times.append((time.perf_counter() - start_time) * 1000)
+        return statistics.median(times)
+
+    def _add_result(self, name, value, unit, lower_is_better=True):
+        self.results[name] = {'value': round(value, 3), 'unit': unit, 'lower_is_better': lower_is_better}
+        print('  {:<28}{:>12.2f} {}'.format(name, value, unit))
+
+
+def setup_addon(profile_path, mirror_url, github_url=None):
+    """Configure the stand-ins and the add-on to use the local server"""
+    os.environ['KODI_STUB_PROFILE'] = profile_path
+    import xbmcaddon
+    xbmcaddon.SETTINGS['mirrors'] = mirror_url
+    if not github_url:
+        return
+    # The GitHub API URL is not configurable, the module constants are replaced
+    import resources.lib.helpers.git_index as git_index
+    import resources.lib.helpers.github_api as github_api
+    github_api.API_REPO_URL = github_url
+    git_index.API_REPO_URL = github_url
+
+
+def get_builds_pathitems(entries):
+    return [item.format(entries) for item in BUILDS_FOLDER]
+
+
+def measure_cold_start(profile_path, server):
+    """Run the add-on in a new interpreter, as Kodi does for the first invocation"""
+    output = subprocess.check_output([sys.executable, os.path.abspath(__file__), '--probe-startup',
+                                      profile_path, server.url])
+    return float(output.decode('utf-8').strip().splitlines()[-1])
+
+
+def probe_startup(profile_path, mirror_url):
+    """Executed in the new interpreter by measure_cold_start, print the time of the add-on execution"""
+    setup_addon(profile_path, mirror_url)  # The root listing does not use the GitHub API
+    start_time = time.perf_counter()
+    addon_file = os.path.join(ADDON_PATH, 'addon.py')
+    sys.argv = [ROOT_URL, '1', '']
+    with open(addon_file, 'r') as file_handle:
+        exec(compile(file_handle.read(), addon_file, 'exec'), {'__name__': '__main__'})  # pylint: disable=exec-used
+    print((time.perf_counter() - start_time) * 1000)
+
+
+def save_results(results, quick):
+    import xbmcaddon
+    version = xbmcaddon.ADDON_INFO['version'] + ('-quick' if quick else '')
+    data = OrderedDict([('version', version),
+                        ('date', datetime.now().isoformat(timespec='seconds')),
+                        ('python', platform.python_version()),
+                        ('platform', platform.platform()),
+                        ('results', results)])
+    os.makedirs(RESULTS_PATH, exist_ok=True)
+    file_path = os.path.join(RESULTS_PATH, version + '.json')
+    with open(file_path, 'w') as file_handle:
+        json.dump(data, file_handle, indent=2)
+    print('Results saved in {}'.format(file_path))
+    return file_path
+
+
+def find_previous_results(exclude_path, quick):
+    """Find the most recent results of another version, made with the same mode (quick or not)"""
+    file_paths = [file_path for file_path in glob.glob(os.path.join(RESULTS_PATH, '*.json'))
+                  if not os.path.exists(exclude_path) or not os.path.samefile(file_path, exclude_path)
+                  if file_path.endswith('-quick.json') == quick]
+    return max(file_paths, key=os.path.getmtime) if file_paths else None
+
+
+def compare_results(results, previous_path):
+    """Print the changes from the previous results, return the names of the regressed benchmarks"""
+    with open(previous_path, 'r') as file_handle:
+        previous = json.load(file_handle)
+    print('Compared with version {} ({})'.format(previous['version'], previous['date']))
+    print('  {:<28}{:>12}{:>12}{:>9}'.format('Benchmark', 'Previous', 'Current', 'Change'))
+    regressions = []
+    for name, result in results.items():
+        if name not in previous['results'] or not previous['results'][name]['value']:
+            continue
+        change = result['value'] / previous['results'][name]['value'] - 1
+        worse = change if result['lower_is_better'] else -change
+        is_regression = worse > REGRESSION_THRESHOLD
+        if is_regression:
+            regressions.append(name)
+        print('  {:<28}{:>12.2f}{:>12.2f}{:>+9.1%}{}'.format(name, previous['results'][name]['value'],
+                                                             result['value'], change,
+                                                             '  REGRESSION' if is_regression else ''))
+    return regressions
+
+
+def _delete_file(file_path):
+    try:
+        os.remove(file_path)
+    except FileNotFoundError:
+        pass
+
+
+def main():
+    if len(sys.argv) > 1 and sys.argv[1] == '--probe-startup':
+        probe_startup(*sys.argv[2:4])
+        return 0
+    parser = argparse.ArgumentParser(description='Run the benchmarks of the add-on')
+    parser.add_argument('--quick', action='store_true', help='less rounds and a smaller installer')
+    parser.add_argument('--no-save', action='store_true', help='do not save the results')
+    parser.add_argument('--compare', help='results file to compare with, default the last of another version')
+    args = parser.parse_args()
+    profile_path = tempfile.mkdtemp(prefix='autoupdatekodi_benchmarks_')
+    server = MirrorServer(installer_size=(16 if args.quick else 64) * 1024 * 1024).start()
+    try:
+        print('Running the benchmarks (profile {}, server {})'.format(profile_path, server.url))
+        results = Benchmarks(server, profile_path, args.quick).run_all()
+    finally:
+        server.stop()
+        shutil.rmtree(profile_path, ignore_errors=True)
+    file_path = '' if args.no_save else save_results(results, args.quick)
+    previous_path = args.compare or find_previous_results(file_path, args.quick)
+    if previous_path:
+        return 1 if compare_results(results, previous_path) else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
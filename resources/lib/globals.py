@@ -9,9 +9,11 @@
 # Using the Kodi reuseLanguageInvoker feature, only the code in the addon.py or service.py module
 # will be run every time the addon is called.
 # All other modules (imports) are initialized only on the first invocation of the add-on.
+import os
 from urllib.parse import parse_qsl, unquote, urlparse
 
 import xbmcaddon
+import xbmcvfs
 
 
 class GlobalVariables(object):
@@ -37,13 +39,13 @@ class GlobalVariables(object):
         self.DATA_PATH = None
         self.FILES_LIST = []
 
-    def init_globals(self, argv):
-        """Initialized globally used module variables. Needs to be called at start of each plugin instance!"""
+    def init_globals(self, argv, reload_settings=False):
+        """Initialized globally used module variables. Needs to be called at start of each plugin instance!
+        :param reload_settings: if True the settings are read again also when the settings file is not modified
+        """
         # IS_ADDON_FIRSTRUN: specifies if the add-on has been initialized for the first time
         #                    (reuseLanguageInvoker not used yet)
         self.IS_ADDON_FIRSTRUN = self.IS_ADDON_FIRSTRUN is None
-        # xbmcaddon.Addon must be created at every instance otherwise it does not read any new changes to the settings
-        self.ADDON = xbmcaddon.Addon()
         self.URL = urlparse(argv[0])
         self.REQUEST_PATH = unquote(self.URL[2][1:])
         try:
@@ -52,6 +54,7 @@ class GlobalVariables(object):
             self.PARAM_STRING = ''
         self.REQUEST_PARAMS = dict(parse_qsl(self.PARAM_STRING))
         if self.IS_ADDON_FIRSTRUN:
+            self.ADDON = CachedAddon()
             # Global variables that do not need to be generated at every instance
             self.ADDON_ID = self.ADDON.getAddonInfo('id')
             self.PLUGIN = self.ADDON.getAddonInfo('name')
@@ -70,16 +73,89 @@ class GlobalVariables(object):
                 self.IS_SERVICE = True
                 self.BASE_URL = '{scheme}://{netloc}'.format(scheme='plugin',
                                                              netloc=self.ADDON_ID)
+            # Temporary file path (use to download and run the installer)
+            data_path = xbmcvfs.translatePath(self.DATA_PATH)
+            self.INSTALLER_TEMP_PATH = data_path + 'temp/'
+            self.INSTALLER_TEMP_NAME = 'KodiInstaller.exe'  # Mush be equal to all scripts
+            self.DOWNLOADS_PATH = data_path + 'downloads/'
+            self.TRACES_PATH = data_path + 'traces/'  # Time traces and profiles
+        else:
+            # xbmcaddon.Addon must be created again to read the changes to the settings,
+            # this is done only when the settings file has been modified
+            self.ADDON.refresh(reload_settings)
         # Initialize the log
         from resources.lib.helpers.logging import LOG
         LOG.initialize(self.ADDON_ID, self.PLUGIN_HANDLE,
                        self.ADDON.getSettingString('debug_log_level'),
-                       self.ADDON.getSettingBool('enable_timing'))
-        # Temporary file path (use to download and run the installer)
-        from resources.lib.helpers.file_ops import translate_path
-        self.INSTALLER_TEMP_PATH = translate_path(G.DATA_PATH) + 'temp/'
-        self.INSTALLER_TEMP_NAME = 'KodiInstaller.exe'  # Mush be equal to all scripts
-        self.DOWNLOADS_PATH = translate_path(G.DATA_PATH) + 'downloads/'
+                       self.ADDON.getSettingBool('enable_timing'),
+                       self.TRACES_PATH if self.ADDON.getSettingBool('save_time_trace') else None,
+                       self.ADDON.getSettingBool('capture_debug_log'))
+
+
+class CachedAddon(object):
+    """
+    Wrapper of xbmcaddon.Addon that caches the values of the settings, so the add-on invocations
+    made with reuseLanguageInvoker do not call the Kodi API for each setting read.
+    The cache is valid until the settings file is modified (by the settings dialog or by setSetting).
+    """
+    # pylint: disable=invalid-name
+
+    def __init__(self):
+        addon = xbmcaddon.Addon()
+        self._settings_path = xbmcvfs.translatePath(addon.getAddonInfo('profile')) + 'settings.xml'
+        # Swapped with a single assignment, so the threads that read the settings never mix the old and new state
+        self._state = (addon, {}, _get_file_stamp(self._settings_path))
+
+    def refresh(self, force=False):
+        """
+        Read again the settings, when the settings file has been modified
+        :param force: if True the settings are read again also when the settings file is not modified
+        :return: True if the settings have been read again
+        """
+        stamp = _get_file_stamp(self._settings_path)
+        if not force and stamp == self._state[2]:
+            return False
+        self._state = (xbmcaddon.Addon(), {}, stamp)
+        return True
+
+    def getSetting(self, setting_id):
+        return self._get_setting('getSetting', setting_id)
+
+    def getSettingBool(self, setting_id):
+        return self._get_setting('getSettingBool', setting_id)
+
+    def getSettingInt(self, setting_id):
+        return self._get_setting('getSettingInt', setting_id)
+
+    def getSettingNumber(self, setting_id):
+        return self._get_setting('getSettingNumber', setting_id)
+
+    def getSettingString(self, setting_id):
+        return self._get_setting('getSettingString', setting_id)
+
+    def _get_setting(self, getter_name, setting_id):
+        addon, values, _ = self._state
+        try:
+            return values[(getter_name, setting_id)]
+        except KeyError:
+            value = values[(getter_name, setting_id)] = getattr(addon, getter_name)(setting_id)
+            return value
+
+    def __getattr__(self, name):
+        addon, values, _ = self._state
+        if name.startswith('setSetting'):
+            # The value will be changed, the cached values are no longer valid
+            values.clear()
+        return getattr(addon, name)
+
+
+def _get_file_stamp(file_path):
+    try:
+        stat = os.stat(file_path)
+        return stat.st_mtime_ns, stat.st_size
+    except FileNotFoundError:
+        # The settings file does not exist until a setting is changed from the default value
+        return None
 
 
 def remove_ver_suffix(version):
@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+"""
+    Copyright (C) 2020 Stefano Gottardo (plugin.autoupdatekodi)
+    Block checksums manifest, to rebuild a file by reusing the blocks of a similar local file
+
+    This module does not depend on Kodi, it is used also by the manifest generator (utils folder)
+    and by the benchmarks.
+
+    SPDX-License-Identifier: MIT
+    See LICENSES/MIT.md for more information.
+"""
+import hashlib
+import os
+import zlib
+
+MANIFEST_VERSION = 1
+MANIFEST_SUFFIX = '.blocks.json'
+DEFAULT_BLOCK_SIZE = 64 * 1024
+STRONG_HASH_LENGTH = 16  # Hex chars of the md5 digest kept for each block
+
+
+def compute_manifest(file_path, block_size=DEFAULT_BLOCK_SIZE):
+    """
+    Compute the block checksums manifest of a file
+    :param file_path: The file path
+    :param block_size: The size of the blocks
+    :return: dict of the manifest, to be saved as JSON
+    """
+    blocks = []
+    file_hash = hashlib.sha256()
+    file_size = 0
+    with open(file_path, 'rb') as file_handle:
+        while True:
+            data = file_handle.read(block_size)
+            if not data:
+                break
+            file_hash.update(data)
+            file_size += len(data)
+            blocks.append([zlib.adler32(data), _get_strong_hash(data)])
+    return {
+        'version': MANIFEST_VERSION,
+        'file_size': file_size,
+        'block_size': block_size,
+        'sha256': file_hash.hexdigest(),
+        'blocks': blocks
+    }
+
+
+def is_valid_manifest(manifest):
+    return (isinstance(manifest, dict)
+            and manifest.get('version') == MANIFEST_VERSION
+            and manifest.get('block_size', 0) > 0
+            and len(manifest.get('blocks', [])) == -(-manifest.get('file_size', 0) // manifest['block_size']))
+
+
+def find_local_blocks(manifest, base_path):
+    """
+    Find the blocks of the manifest that are available in a local file.
+    A per-byte rolling checksum in pure Python would take minutes on a 100 MB file, so the local file
+    is scanned only on two block grids: aligned to the file start and aligned to the file end.
+    The first one finds the unchanged blocks before any insertion/deletion, the second one finds the blocks
+    after it (shifted by the size difference). The weak checksum (adler32) filter the blocks
+    before computing the strong hash.
+    :param manifest: The manifest of the file to build
+    :param base_path: The local file to reuse
+    :return: dict of target block index -> offset of the block in the local file
+    """
+    block_size = manifest['block_size']
+    target_weaks = {weak for weak, _ in manifest['blocks']}
+    base_size = os.path.getsize(base_path)
+    grid_offsets = sorted({0, (base_size - manifest['file_size']) % block_size})
+    local_blocks = {}  # (weak, strong) -> offset
+    with open(base_path, 'rb') as file_handle:
+        for grid_offset in grid_offsets:
+            file_handle.seek(grid_offset)
+            offset = grid_offset
+            while True:
+                data = file_handle.read(block_size)
+                if len(data) < block_size:
+                    break
+                weak = zlib.adler32(data)
+                if weak in target_weaks:
+                    local_blocks.setdefault((weak, _get_strong_hash(data)), offset)
+                offset += block_size
+        # The last block of the target file can be shorter, it can be only at the end of the local file
+        last_size = manifest['file_size'] - (len(manifest['blocks']) - 1) * block_size
+        if 0 < last_size < block_size <= base_size:
+            file_handle.seek(base_size - last_size)
+            data = file_handle.read(last_size)
+            local_blocks.setdefault((zlib.adler32(data), _get_strong_hash(data)), base_size - last_size)
+    matches = {}
+    for index, (weak, strong) in enumerate(manifest['blocks']):
+        offset = local_blocks.get((weak, strong))
+        if offset is not None:
+            matches[index] = offset
+    return matches
+
+
+def assemble(manifest, base_path, dest_path, matches, fetch_range, hasher=None, progress_callback=None):
+    """
+    Write the file described by the manifest, by copying the matching blocks from the local file
+    and by fetching the other ones (the consecutive missing blocks are fetched with a single range)
+    :param manifest: The manifest of the file to build
+    :param base_path: The local file to reuse
+    :param dest_path: The file to write
+    :param matches: dict of target block index -> offset in the local file (see find_local_blocks)
+    :param fetch_range: function (start, end) that returns an iterable of the bytes of the range, end included
+    :param hasher: optional object with an update method, to hash the file while it is written
+    :param progress_callback: optional function called with (bytes written, file size)
+    :return: the number of bytes fetched
+    """
+    block_size = manifest['block_size']
+    file_size = manifest['file_size']
+    blocks_count = len(manifest['blocks'])
+    fetched = 0
+    written = 0
+    with open(base_path, 'rb') as base_handle, open(dest_path, 'wb') as dest_handle:
+        index = 0
+        while index < blocks_count:
+            if index in matches:
+                base_handle.seek(matches[index])
+                chunks = [base_handle.read(min(block_size, file_size - index * block_size))]
+                index += 1
+            else:
+                last = index
+                while last + 1 < blocks_count and last + 1 not in matches:
+                    last += 1
+                start, end = index * block_size, min((last + 1) * block_size, file_size) - 1
+                chunks = fetch_range(start, end)
+                fetched += end - start + 1
+                index = last + 1
+            for data in chunks:
+                dest_handle.write(data)
+                if hasher:
+                    hasher.update(data)
+                written += len(data)
+                if progress_callback:
+                    progress_callback(written, file_size)
+            if written != min(index * block_size, file_size):
+                raise IOError('Incomplete block data, written {} bytes of {}'.format(
+                    written, min(index * block_size, file_size)))
+    return fetched
+
+
+def _get_strong_hash(data):
+    return hashlib.md5(data).hexdigest()[:STRONG_HASH_LENGTH]
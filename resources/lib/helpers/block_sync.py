@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+"""
+    Copyright (C) 2020 Stefano Gottardo (plugin.autoupdatekodi)
+    Download of a file by reusing the blocks of a previous build (zsync-like)
+
+    SPDX-License-Identifier: MIT
+    See LICENSES/MIT.md for more information.
+"""
+import json
+import os
+from urllib.error import HTTPError, URLError
+
+from resources.lib.globals import G
+from resources.lib.helpers.block_manifest import MANIFEST_SUFFIX, assemble, find_local_blocks, is_valid_manifest
+from resources.lib.helpers.checksum import ChecksumError, StreamHasher
+from resources.lib.helpers.downloader import ActiveMarker
+from resources.lib.helpers.http_client import HTTP_CLIENT
+from resources.lib.helpers.local_tree import LOCAL_TREE
+from resources.lib.helpers.logging import LOG, measure_exec_time, measure_exec_time_decorator
+
+CHUNK_SIZE = 64 * 1024
+PART_SUFFIX = '.part'
+
+
+def find_base_file(url_file_path):
+    """
+    Find the local file to reuse for a download, the newest build saved in the same folder
+    :param url_file_path: The relative path of the file to download
+    :return: the file path, or None if there are no builds saved
+    """
+    folder, _, filename = url_file_path.rpartition('/')
+    _, files = LOCAL_TREE.list_folder(folder.split('/') if folder else [])
+    files = [entry for entry in files if entry.name != filename and entry.name.endswith('.exe')]
+    if not files:
+        return None
+    newest = max(files, key=lambda entry: (entry.date, entry.name))
+    return G.DOWNLOADS_PATH + (folder + '/' if folder else '') + newest.name
+
+
+@measure_exec_time_decorator(category='download')
+def download_with_block_reuse(url, dest_path, base_path, progress_callback=None):
+    """
+    Download a file by copying the blocks unchanged from a similar local file, only the changed ranges
+    are downloaded. It needs the block checksums manifest published on the mirror (see utils/make_block_manifests.py)
+    :param url: The URL of the file
+    :param dest_path: The destination file path
+    :param base_path: The local file to reuse
+    :param progress_callback: function called with (bytes written, file size),
+                              if it raise an exception the download will be cancelled
+    :return: dict of hex digests of the file, or None if the manifest is not available
+    :raise ChecksumError: when the file built does not match the manifest
+    """
+    manifest = _get_manifest(url)
+    if not manifest:
+        return None
+    with measure_exec_time('find_local_blocks', 'file'):
+        matches = find_local_blocks(manifest, base_path)
+    LOG.info('Reuse {} of {} blocks from {}', len(matches), len(manifest['blocks']), base_path)
+    hasher = StreamHasher()
+    part_path = dest_path + PART_SUFFIX
+    # The active marker allow the other processes to know that the download is in progress
+    with ActiveMarker(url, dest_path) as active_marker:
+        def on_progress(written, file_size):
+            active_marker.refresh()
+            if progress_callback:
+                progress_callback(written, file_size)
+
+        try:
+            fetched = assemble(manifest, base_path, part_path, matches,
+                               lambda start, end: _fetch_range(url, start, end), hasher, on_progress)
+            hexdigests = hasher.hexdigests()
+            if hexdigests['sha256'] != manifest['sha256']:
+                raise ChecksumError('The file built by reusing the blocks does not match the manifest')
+        except BaseException:
+            _delete_file(part_path)
+            raise
+    os.replace(part_path, dest_path)
+    LOG.info('Downloaded {} of {} bytes ({:.1%} saved by reusing the blocks)',
+             fetched, manifest['file_size'], 1 - fetched / manifest['file_size'] if manifest['file_size'] else 0)
+    return hexdigests
+
+
+def _get_manifest(url):
+    try:
+        with HTTP_CLIENT.request(url + MANIFEST_SUFFIX) as response:
+            manifest = json.loads(response.read().decode('utf-8'))
+    except HTTPError as exc:
+        if exc.code != 404:
+            LOG.warn('Cannot get the block manifest of {}: {}', url, exc)
+        return None
+    except (URLError, ValueError) as exc:
+        LOG.warn('Cannot get the block manifest of {}: {}', url, exc)
+        return None
+    if not is_valid_manifest(manifest):
+        LOG.warn('The block manifest of {} is not valid', url)
+        return None
+    return manifest
+
+
+def _fetch_range(url, start, end):
+    with HTTP_CLIENT.request(url, headers={'Range': 'bytes={}-{}'.format(start, end)}) as response:
+        if response.status != 206:
+            raise IOError('The server has not returned the requested range')
+        while True:
+            data = response.read(CHUNK_SIZE)
+            if not data:
+                break
+            yield data
+
+
+def _delete_file(file_path):
+    try:
+        os.remove(file_path)
+    except FileNotFoundError:
+        pass
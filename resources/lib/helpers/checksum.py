@@ -0,0 +1,154 @@
+# -*- coding: utf-8 -*-
+"""
+    Copyright (C) 2020 Stefano Gottardo (plugin.autoupdatekodi)
+    Checksum verification of the installer files
+
+    SPDX-License-Identifier: MIT
+    See LICENSES/MIT.md for more information.
+"""
+import hashlib
+import os
+import re
+import threading
+from urllib.error import HTTPError, URLError
+
+from resources.lib.globals import G
+from resources.lib.helpers.http_client import HTTP_CLIENT
+from resources.lib.helpers.logging import LOG, measure_exec_time_decorator
+from resources.lib.helpers.shared_file import SharedJsonFile
+
+ALGORITHMS = ('sha256', 'md5')
+CHUNK_SIZE = 1024 * 1024
+KNOWN_HASHES_FILENAME = 'known_hashes.json'
+_HEX_DIGEST_RE = re.compile(r'^([0-9a-fA-F]+)\b')
+
+
+class ChecksumError(Exception):
+    """The checksum of a file does not match the published checksum"""
+
+
+class StreamHasher(object):
+    """Compute the hashes of the data while it is read or written, so the file has not to be read again"""
+
+    def __init__(self):
+        self._hashes = {algorithm: hashlib.new(algorithm) for algorithm in ALGORITHMS}
+
+    def update(self, data):
+        for hash_obj in self._hashes.values():
+            hash_obj.update(data)
+
+    def hexdigests(self):
+        """Get a dict with the hex digest of each algorithm"""
+        return {algorithm: hash_obj.hexdigest() for algorithm, hash_obj in self._hashes.items()}
+
+
+class KnownHashes(object):
+    """
+    Keep the verified hashes of the files in the downloads folder, with the size and the modification time
+    of each file, so an unchanged file has not to be hashed again
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # The service save the hashes of its downloads, the file is shared with the add-on process
+        self._file = SharedJsonFile(self._get_file_path)
+
+    @property
+    def data(self):
+        return self._file.load()
+
+    def get(self, key, file_path):
+        """
+        Get the verified hashes of a file
+        :param key: The file key (the relative path in the mirror)
+        :param file_path: The file path, to check if the file has been changed
+        :return: dict of hex digests, or None if the file has been changed or never verified
+        """
+        with self._lock:
+            entry = self.data.get(key)
+        if not entry:
+            return None
+        try:
+            stat = os.stat(file_path)
+        except OSError:
+            return None
+        if entry['size'] != stat.st_size or entry['mtime'] != stat.st_mtime_ns:
+            return None
+        return entry['hashes']
+
+    def set(self, key, file_path, hexdigests):
+        stat = os.stat(file_path)
+        entry = {'size': stat.st_size, 'mtime': stat.st_mtime_ns, 'hashes': hexdigests}
+        with self._lock:
+            self._file.update(lambda data: data.update({key: entry}))
+
+    def remove(self, key):
+        with self._lock:
+            if key in self.data:
+                self._file.update(lambda data: data.pop(key, None))
+
+    def _get_file_path(self):
+        from resources.lib.helpers.file_ops import translate_path
+        return translate_path(G.DATA_PATH) + KNOWN_HASHES_FILENAME
+
+
+@measure_exec_time_decorator(category='http')
+def get_published_checksums(url):
+    """
+    Get the checksums published on the mirror, from the files with the algorithm extension (e.g. ".sha256")
+    :param url: The URL of the file
+    :return: dict of hex digests, can be empty when the mirror does not publish checksums
+    """
+    checksums = {}
+    for algorithm in ALGORITHMS:
+        try:
+            with HTTP_CLIENT.request('{}.{}'.format(url, algorithm)) as response:
+                # The content can be only the digest or the digest followed by the filename
+                match = _HEX_DIGEST_RE.match(response.read(1024).decode('utf-8', 'ignore').strip())
+        except HTTPError as exc:
+            if exc.code != 404:
+                LOG.warn('Cannot get the {} checksum of {}: {}', algorithm, url, exc)
+            continue
+        except URLError as exc:
+            LOG.warn('Cannot get the {} checksum of {}: {}', algorithm, url, exc)
+            continue
+        if match and len(match.group(1)) == hashlib.new(algorithm).digest_size * 2:
+            checksums[algorithm] = match.group(1).lower()
+    return checksums
+
+
+def verify_checksums(hexdigests, expected, file_description):
+    """
+    Compare the hashes of a file with the expected checksums
+    :param hexdigests: dict of the computed hex digests
+    :param expected: dict of the expected hex digests, only the available algorithms are compared
+    :param file_description: Text used in the log and in the exception
+    :raise ChecksumError: when a checksum does not match
+    """
+    if not expected:
+        LOG.warn('No checksums available for {}, the file cannot be verified', file_description)
+        return
+    for algorithm, checksum in expected.items():
+        if hexdigests.get(algorithm) != checksum:
+            raise ChecksumError('The {} checksum of {} does not match (expected {}, got {})'.format(
+                algorithm, file_description, checksum, hexdigests.get(algorithm)))
+    LOG.debug('Checksums verified ({}) for {}', ', '.join(expected), file_description)
+
+
+@measure_exec_time_decorator(category='file')
+def hash_file(file_path):
+    """
+    Compute the hashes of a file
+    :return: dict of hex digests
+    """
+    hasher = StreamHasher()
+    with open(file_path, 'rb') as file_handle:
+        while True:
+            data = file_handle.read(CHUNK_SIZE)
+            if not data:
+                break
+            hasher.update(data)
+    return hasher.hexdigests()
+
+
+KNOWN_HASHES = KnownHashes()
@@ -0,0 +1,323 @@
+# -*- coding: utf-8 -*-
+"""
+    Copyright (C) 2020 Stefano Gottardo (plugin.autoupdatekodi)
+    Content-addressed store of the downloaded installers
+
+    SPDX-License-Identifier: MIT
+    See LICENSES/MIT.md for more information.
+"""
+import errno
+import os
+import shutil
+import sys
+import threading
+import time
+
+from resources.lib.globals import G
+from resources.lib.helpers.checksum import KNOWN_HASHES
+from resources.lib.helpers.listing_cache import LISTING_CACHE
+from resources.lib.helpers.logging import LOG, measure_exec_time_decorator
+from resources.lib.helpers.shared_file import SharedJsonFile
+
+STORE_FOLDER = 'store/'
+INDEX_FILENAME = 'downloads_index.json'
+COPY_CHUNK_SIZE = 1024 * 1024
+KERNEL_COPY_CHUNK_SIZE = 64 * 1024 * 1024
+FICLONE = 0x40049409  # Linux ioctl to clone (reflink) a file on CoW filesystems (btrfs, xfs)
+
+
+class DownloadStore(object):
+    """
+    Store of the installers named by the sha256 hash of their content, each installer is written once
+    in the store and exposed to the downloads folder and to the temp installer path with hard links
+    (or reflinks/kernel copies when the filesystem does not support hard links).
+
+    An index keeps the size, the last used time, the hash and the pinned state of each file of the downloads
+    folder (by relative path), used to account the disk usage and to delete the least recently used files
+    when the disk quota is exceeded.
+    """
+
+    def __init__(self):
+        self._store_path = None
+        # The service save its downloads too, the index file is shared with the add-on process
+        self._index_file = SharedJsonFile(self._get_index_path, self._build_index)
+        self._lock = threading.RLock()
+        self._is_copy_staged = False  # A file has been copied, so the link count of the store files is not reliable
+
+    @property
+    def store_path(self):
+        if self._store_path is None:
+            from resources.lib.helpers.file_ops import translate_path
+            self._store_path = translate_path(G.DATA_PATH) + STORE_FOLDER
+            os.makedirs(self._store_path, exist_ok=True)
+        return self._store_path
+
+    def get_object_path(self, sha256):
+        return self.store_path + sha256
+
+    def has(self, sha256):
+        return os.path.isfile(self.get_object_path(sha256))
+
+    def add(self, file_path, sha256):
+        """
+        Move a file into the store, the file is renamed so its data is not written again
+        :param file_path: The file to move, it will no longer exist
+        :param sha256: The sha256 hex digest of the file content
+        """
+        if self.has(sha256):
+            os.remove(file_path)
+        else:
+            os.replace(file_path, self.get_object_path(sha256))
+
+    def adopt(self, file_path, sha256):
+        """
+        Add to the store an existing file, by keeping it in place (e.g. the files saved in the downloads folder
+        by the previous versions of the add-on)
+        :param file_path: The file to add
+        :param sha256: The sha256 hex digest of the file content
+        """
+        if self.has(sha256):
+            return
+        try:
+            os.link(file_path, self.get_object_path(sha256))
+        except OSError as exc:
+            # Do not duplicate the data, the file stay only in its current path
+            LOG.debug('Cannot add the file {} to the store: {}', file_path, exc)
+
+    def stage(self, sha256, dest_path, fallback_path=None):
+        """
+        Expose a file of the store to another path
+        :param sha256: The sha256 hex digest of the file content
+        :param dest_path: The destination path
+        :param fallback_path: A copy of the file to use when it is not in the store
+        """
+        from_path = self.get_object_path(sha256) if self.has(sha256) else fallback_path
+        method = stage_file(from_path, dest_path)
+        if method not in ('hard link', 'same file'):
+            self._is_copy_staged = True
+        LOG.debug('File {} staged to {} by {}', from_path, dest_path, method)
+
+    @measure_exec_time_decorator(category='file')
+    def save_download(self, key, file_path, hexdigests):
+        """
+        Save a verified download to the downloads folder, by moving it to the store,
+        then delete the least recently used downloads when the downloads folder exceed the quota
+        :param key: The relative path of the file in the downloads folder (and in the mirror)
+        :param file_path: The downloaded file, it will be moved
+        :param hexdigests: The verified hashes of the file
+        """
+        sha256 = hexdigests['sha256']
+        file_size = os.path.getsize(file_path)
+        dwn_filepath = G.DOWNLOADS_PATH + key
+        self.add(file_path, sha256)
+        self.stage(sha256, dwn_filepath)
+        KNOWN_HASHES.set(key, dwn_filepath, hexdigests)
+        self.register(key, sha256, file_size)
+        self.enforce_quota(G.ADDON.getSettingInt('downloads_quota') * 1024 * 1024, keep_key=key)
+        LISTING_CACHE.invalidate(is_local=True)
+
+    @property
+    def index(self):
+        return self._index_file.load()
+
+    def register(self, key, sha256, size):
+        """
+        Add or update a file of the downloads folder in the index, as just used,
+        called when a file is saved and each time it is staged to be installed
+        :param key: The relative path of the file in the downloads folder
+        :param sha256: The sha256 hex digest of the file content, if known
+        :param size: The file size
+        """
+        def update(index):
+            entry = index.setdefault(key, {'pinned': False})
+            entry.update({'sha256': sha256, 'size': size, 'last_used': time.time()})
+
+        with self._lock:
+            self._index_file.update(update)
+
+    def is_pinned(self, key):
+        with self._lock:
+            return self.index.get(key, {}).get('pinned', False)
+
+    def set_pinned(self, key, pinned):
+        """Pin a file of the downloads folder, the pinned files are never deleted to respect the quota"""
+        def update(index):
+            if key not in index:
+                index[key] = {'sha256': None, 'size': _get_file_size(G.DOWNLOADS_PATH + key),
+                              'last_used': time.time()}
+            index[key]['pinned'] = pinned
+
+        with self._lock:
+            self._index_file.update(update)
+
+    def get_usage(self):
+        """Get the disk space used by the downloads folder, the hard linked copies of a file are counted once"""
+        with self._lock:
+            return _get_usage(self.index.values())
+
+    def enforce_quota(self, quota, keep_key=None):
+        """
+        Delete the least recently used files not pinned, until the disk usage is within the quota
+        :param quota: The max disk usage in bytes, 0 for unlimited
+        :param keep_key: A file to never delete (e.g. the file just downloaded)
+        :return: list of the keys of the deleted files
+        """
+        if not quota:
+            return []
+        deleted = []
+        with self._lock:
+            entries = dict(self.index)
+            candidates = sorted((key for key, entry in entries.items()
+                                 if not entry.get('pinned') and key != keep_key),
+                                key=lambda key: entries[key]['last_used'])
+            for key in candidates:
+                if _get_usage(entries.values()) <= quota:
+                    break
+                del entries[key]
+                self.remove(key)
+                deleted.append(key)
+        if deleted:
+            LOG.info('Deleted {} downloads to respect the quota of {} bytes: {}', len(deleted), quota, deleted)
+            self.prune()
+        return deleted
+
+    def remove(self, key):
+        """Delete a file of the downloads folder, and the folders left empty"""
+        with self._lock:
+            self._index_file.update(lambda index: index.pop(key, None))
+        KNOWN_HASHES.remove(key)
+        file_path = G.DOWNLOADS_PATH + key
+        try:
+            os.remove(file_path)
+        except FileNotFoundError:
+            pass
+        folder_path = os.path.dirname(file_path)
+        while os.path.normpath(folder_path) != os.path.normpath(G.DOWNLOADS_PATH):
+            try:
+                os.rmdir(folder_path)
+            except OSError:
+                break
+            folder_path = os.path.dirname(folder_path)
+        LISTING_CACHE.invalidate(is_local=True)
+
+    def clear_index(self):
+        """Clear the index, to be used after deleting all the files of the downloads folder"""
+        with self._lock:
+            self._index_file.update(lambda index: index.clear())
+        LISTING_CACHE.invalidate(is_local=True)
+
+    def _build_index(self):
+        """Build the index by walking the downloads folder, used only when the index does not exist (or is broken)"""
+        index = {}
+        for root, _, filenames in os.walk(G.DOWNLOADS_PATH):
+            for filename in filenames:
+                stat = os.stat(os.path.join(root, filename))
+                key = os.path.relpath(os.path.join(root, filename), G.DOWNLOADS_PATH).replace(os.sep, '/')
+                index[key] = {'sha256': None, 'size': stat.st_size, 'last_used': stat.st_mtime, 'pinned': False}
+        LOG.debug('Built the index of the downloads folder, {} files', len(index))
+        return index
+
+    def _get_index_path(self):
+        from resources.lib.helpers.file_ops import translate_path
+        return translate_path(G.DATA_PATH) + INDEX_FILENAME
+
+    def prune(self):
+        """Delete the files of the store that are no longer linked from other paths"""
+        if self._is_copy_staged:
+            LOG.debug('The store is not pruned, some files have been copied instead of linked')
+            return
+        for entry in os.scandir(self.store_path):
+            # On Windows DirEntry.stat() does not get the link count (st_nlink is always 0), os.stat get it
+            if entry.is_file() and os.stat(entry.path).st_nlink <= 1:
+                LOG.debug('Delete the unreferenced file {} from the store', entry.name)
+                os.remove(entry.path)
+
+
+def _get_usage(entries):
+    sizes = {}
+    for entry in entries:
+        sizes[entry['sha256'] or id(entry)] = entry['size']
+    return sum(sizes.values())
+
+
+def _get_file_size(file_path):
+    try:
+        return os.path.getsize(file_path)
+    except OSError:
+        return 0
+
+
+@measure_exec_time_decorator(category='file')
+def stage_file(from_path, to_path):
+    """
+    Make a file available to another path, without copying the data when the filesystem allow it.
+    The methods are tried in order: hard link, reflink, kernel copy (copy_file_range/sendfile), buffered copy
+    :return: the name of the method used
+    """
+    if os.path.normcase(os.path.abspath(from_path)) == os.path.normcase(os.path.abspath(to_path)):
+        return 'same file'
+    os.makedirs(os.path.dirname(to_path), exist_ok=True)
+    try:
+        os.remove(to_path)
+    except FileNotFoundError:
+        pass
+    try:
+        os.link(from_path, to_path)
+        return 'hard link'
+    except OSError as exc:
+        LOG.debug('Cannot create the hard link of {}: {}', from_path, exc)
+    with open(from_path, 'rb') as src_handle, open(to_path, 'wb') as dst_handle:
+        if _reflink(src_handle, dst_handle):
+            return 'reflink'
+        if _kernel_copy(src_handle, dst_handle):
+            return 'kernel copy'
+        shutil.copyfileobj(src_handle, dst_handle, COPY_CHUNK_SIZE)
+        return 'buffered copy'
+
+
+def _reflink(src_handle, dst_handle):
+    if not sys.platform.startswith('linux'):
+        return False
+    import fcntl
+    try:
+        fcntl.ioctl(dst_handle.fileno(), FICLONE, src_handle.fileno())
+        return True
+    except OSError:
+        return False
+
+
+def _kernel_copy(src_handle, dst_handle):
+    """Copy the data inside the kernel, without passing it through user space buffers"""
+    if hasattr(os, 'copy_file_range'):  # Linux, Python 3.8+
+        copy_func = os.copy_file_range
+    elif hasattr(os, 'sendfile') and sys.platform.startswith('linux'):  # Linux >= 2.6.33 allows file to file
+        copy_func = os.sendfile
+    else:
+        return False
+    src_fd = src_handle.fileno()
+    dst_fd = dst_handle.fileno()
+    file_size = os.fstat(src_fd).st_size
+    offset = 0
+    try:
+        while offset < file_size:
+            if copy_func is os.sendfile:
+                copied = os.sendfile(dst_fd, src_fd, offset, min(KERNEL_COPY_CHUNK_SIZE, file_size - offset))
+            else:
+                copied = os.copy_file_range(src_fd, dst_fd, min(KERNEL_COPY_CHUNK_SIZE, file_size - offset),
+                                            offset, offset)
+            if not copied:
+                break
+            offset += copied
+    except OSError as exc:
+        if exc.errno not in (errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP, errno.EBADF):
+            raise
+    if offset == file_size:
+        return True
+    # Not supported or interrupted, restart with the buffered copy
+    src_handle.seek(0)
+    dst_handle.seek(0)
+    dst_handle.truncate()
+    return False
+
+
+DOWNLOAD_STORE = DownloadStore()
@@ -0,0 +1,357 @@
+# -*- coding: utf-8 -*-
+"""
+    Copyright (C) 2020 Stefano Gottardo (plugin.autoupdatekodi)
+    Multi-connection segmented downloader
+
+    SPDX-License-Identifier: MIT
+    See LICENSES/MIT.md for more information.
+"""
+import json
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_EXCEPTION, wait
+
+from resources.lib.globals import G
+from resources.lib.helpers.checksum import StreamHasher
+from resources.lib.helpers.http_client import HTTP_CLIENT
+from resources.lib.helpers.logging import LOG, measure_exec_time_decorator
+
+CHUNK_SIZE = 64 * 1024
+SEGMENT_RETRIES = 2
+PROGRESS_INTERVAL = 0.25  # Seconds between each progress callback
+PART_SUFFIX = '.part'
+STATE_SUFFIX = '.part.json'
+ACTIVE_SUFFIX = '.part.active'
+ACTIVE_REFRESH_INTERVAL = 5  # Seconds between the updates of the modification time of the active marker
+ACTIVE_EXPIRY = 30  # Seconds after which an active marker not updated is left by a terminated process
+ACTIVE_CHECK_INTERVAL = 1  # Seconds in which the result of is_download_active is reused
+
+
+_active_check = [0, False]  # Time and result of the last check of any download in progress
+
+
+def is_download_active(url_path=None):
+    """
+    Check if an installer download is in progress, also in the other processes (the add-on and the service),
+    by finding the active markers written next to the partial downloads in the temp folder
+    :param url_path: Check only the downloads of the URLs that end with this path
+    """
+    now = time.time()
+    if url_path is None and now - _active_check[0] < ACTIVE_CHECK_INTERVAL:
+        return _active_check[1]
+    is_active = False
+    for root, _, filenames in os.walk(G.INSTALLER_TEMP_PATH):
+        for filename in filenames:
+            if not filename.endswith(ACTIVE_SUFFIX):
+                continue
+            marker_path = os.path.join(root, filename)
+            try:
+                if now - os.path.getmtime(marker_path) > ACTIVE_EXPIRY:
+                    continue
+                with open(marker_path, 'r') as file_handle:
+                    url = json.load(file_handle)['url']
+            except (IOError, ValueError, KeyError):
+                continue  # Deleted meanwhile, or just created and not yet written
+            if url_path is None or url.endswith('/' + url_path.lstrip('/')):
+                is_active = True
+                break
+        if is_active:
+            break
+    if url_path is None:
+        _active_check[:] = [now, is_active]
+    return is_active
+
+
+class ActiveMarker(object):
+    """
+    Marker file written next to a partial download while it is in progress, with the URL of the download,
+    so the other processes can know it (see is_download_active). Its modification time is updated
+    by refresh, a marker not updated for ACTIVE_EXPIRY seconds has been left by a terminated process.
+    """
+
+    def __init__(self, url, dest_path):
+        self.url = url
+        self.path = dest_path + ACTIVE_SUFFIX
+        self._refresh_time = 0
+
+    def refresh(self):
+        """Update the modification time of the marker, to be called while the download progresses"""
+        now = time.time()
+        if now - self._refresh_time >= ACTIVE_REFRESH_INTERVAL:
+            self._refresh_time = now
+            os.utime(self.path)
+
+    def __enter__(self):
+        with open(self.path, 'w') as file_handle:
+            json.dump({'url': self.url, 'pid': os.getpid()}, file_handle)
+        self._refresh_time = time.time()
+        _active_check[0] = 0
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        _delete_file(self.path)
+        _active_check[0] = 0
+
+
+class ValidatorChangedError(IOError):
+    """The file on the server has been changed since the partial download was started"""
+
+
+class SegmentedDownloader(object):
+    """
+    Download a file by splitting it in byte ranges (HTTP Range) fetched over several connections,
+    each segment is written directly to its position in the destination file.
+    When the server ignores the Range requests falls back to a single stream download.
+
+    The data is written to a ".part" file, a ".part.json" sidecar file keeps the URL, the validators
+    (ETag/Last-Modified) and the bytes written of each segment, so that an interrupted download
+    can be resumed by requesting only the missing ranges.
+
+    The file hashes are computed while the file is downloaded, the segments written out of order
+    are hashed as soon as the contiguous part of the file grows, when the data is still in the disk cache.
+    """
+
+    def __init__(self, url, dest_path, connections=4, segment_size=8 * 1024 * 1024):
+        self.url = url
+        self.dest_path = dest_path
+        self.part_path = dest_path + PART_SUFFIX
+        self.state_path = dest_path + STATE_SUFFIX
+        self.connections = max(1, connections)
+        self.segment_size = max(CHUNK_SIZE, segment_size)
+        self.file_size = 0
+        self.hexdigests = None  # The hashes of the downloaded file
+        self._hasher = None
+        self._hashed_size = 0
+        self._state = None
+        self._downloaded = 0
+        self._lock = threading.Lock()
+        self._cancel_event = threading.Event()
+        self._active_marker = ActiveMarker(url, dest_path)
+
+    @property
+    def downloaded(self):
+        with self._lock:
+            return self._downloaded
+
+    def cancel(self):
+        """Request to stop the download, the running segments will be interrupted"""
+        self._cancel_event.set()
+
+    @measure_exec_time_decorator(category='download')
+    def download(self, progress_callback=None):
+        """
+        Download the file, resuming a previous partial download when possible
+        :param progress_callback: function called with (downloaded bytes, file size),
+                                  if it raise an exception the download will be cancelled
+        """
+        # The active marker allow the other processes to know that the download is in progress
+        with self._active_marker:
+            try:
+                self._download(progress_callback)
+            except ValidatorChangedError:
+                LOG.warn('The file on the server has been changed, restart the download: {}', self.url)
+                self.delete_partial()
+                # The failed attempt has cancelled its segments, the new attempt needs a new event
+                self._cancel_event = threading.Event()
+                self._download(progress_callback)
+        self.hexdigests = self._hasher.hexdigests()
+        os.replace(self.part_path, self.dest_path)
+        _delete_file(self.state_path)
+
+    def delete_partial(self):
+        """Delete the partial download data"""
+        _delete_file(self.part_path)
+        _delete_file(self.state_path)
+
+    def _download(self, progress_callback):
+        self._hasher = StreamHasher()
+        self._hashed_size = 0
+        with self._lock:
+            self._downloaded = 0
+        response = HTTP_CLIENT.request(self.url, headers={'Range': 'bytes=0-0'})
+        file_size = _get_range_total_size(response)
+        if response.status != 206 or not file_size:
+            # The server ignore the Range request (or the total size is unknown, "bytes 0-0/*"),
+            # the download cannot be segmented or resumed
+            LOG.debug('Download with a single stream: {}', self.url)
+            if response.status == 206:
+                response.read()
+                response.close()
+                response = HTTP_CLIENT.request(self.url)
+            self._download_single(response, progress_callback)
+            return
+        response.read()
+        response.close()
+        # Use the final URL, so that all the segments are downloaded from the same mirror after a redirect
+        url = response.geturl()
+        self.file_size = file_size
+        self._init_state(file_size, response.headers.get('ETag'), response.headers.get('Last-Modified'))
+        segment_size = self._state['segment_size']
+        all_segments = [(start, min(start + segment_size, file_size) - 1)
+                        for start in range(0, file_size, segment_size)]
+        segments = [(start, end) for start, end in all_segments if self._get_position(start) <= end]
+        if not segments:
+            self._update_hash(all_segments)
+            return
+        LOG.debug('Download with {} connections, {} segments of {} bytes ({} bytes already downloaded): {}',
+                  self.connections, len(segments), segment_size, self._downloaded, url)
+        executor = ThreadPoolExecutor(max_workers=min(self.connections, len(segments)))
+        futures = {executor.submit(self._download_segment, url, start, end) for start, end in segments}
+        try:
+            while futures:
+                done, futures = wait(futures, timeout=PROGRESS_INTERVAL, return_when=FIRST_EXCEPTION)
+                for future in done:
+                    future.result()  # Raise the segment exception, if any
+                self._save_state()
+                self._update_hash(all_segments)
+                self._active_marker.refresh()
+                if progress_callback:
+                    progress_callback(self.downloaded, file_size)
+        except BaseException:
+            self.cancel()
+            for future in futures:
+                future.cancel()
+            raise
+        finally:
+            executor.shutdown(wait=True)
+            self._save_state()
+
+    def _init_state(self, file_size, etag, last_modified):
+        """Load the state of a previous partial download, or start a new one"""
+        state = _load_state(self.state_path)
+        if (state and os.path.exists(self.part_path)
+                and state.get('url') == self.url
+                and state.get('file_size') == file_size
+                and state.get('etag') == etag
+                and state.get('last_modified') == last_modified):
+            self._state = state
+            self._downloaded = sum(position - int(start) for start, position in state['segments'].items())
+            LOG.info('Resume the partial download from {} of {} bytes', self._downloaded, file_size)
+            return
+        if state:
+            LOG.debug('The partial download data does not match the requested file, start a new download')
+        self._state = {
+            'url': self.url,
+            'etag': etag,
+            'last_modified': last_modified,
+            'file_size': file_size,
+            'segment_size': self.segment_size,
+            'segments': {}
+        }
+        self._downloaded = 0
+        with open(self.part_path, 'wb') as file_handle:
+            file_handle.truncate(file_size)
+        self._save_state()
+
+    def _save_state(self):
+        with self._lock:
+            data = json.dumps(self._state)
+        tmp_path = self.state_path + '.tmp'
+        with open(tmp_path, 'w') as file_handle:
+            file_handle.write(data)
+        os.replace(tmp_path, self.state_path)
+
+    def _get_position(self, start):
+        with self._lock:
+            return self._state['segments'].get(str(start), start)
+
+    def _download_single(self, response, progress_callback):
+        self.file_size = int(response.headers.get('Content-Length') or 0)
+        with response, open(self.part_path, 'wb') as file_handle:
+            while True:
+                chunk = response.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                file_handle.write(chunk)
+                self._hasher.update(chunk)
+                self._downloaded += len(chunk)
+                self._active_marker.refresh()
+                if progress_callback:
+                    progress_callback(self._downloaded, self.file_size)
+        if self.file_size and self._downloaded != self.file_size:
+            raise IOError('Incomplete download, received {} of {} bytes'.format(self._downloaded, self.file_size))
+
+    def _update_hash(self, segments):
+        """Hash the data written since the last call, up to the end of the contiguous part of the file"""
+        contiguous_size = self.file_size
+        for start, end in segments:
+            position = self._get_position(start)
+            if position <= end:
+                contiguous_size = position
+                break
+        if contiguous_size <= self._hashed_size:
+            return
+        with open(self.part_path, 'rb') as file_handle:
+            file_handle.seek(self._hashed_size)
+            while self._hashed_size < contiguous_size:
+                data = file_handle.read(min(CHUNK_SIZE, contiguous_size - self._hashed_size))
+                if not data:
+                    raise IOError('Unexpected end of the partial download file')
+                self._hasher.update(data)
+                self._hashed_size += len(data)
+
+    @measure_exec_time_decorator(category='download')
+    def _download_segment(self, url, start, end):
+        retries = 0
+        while True:
+            try:
+                self._fetch_range(url, start, end)
+                return
+            except (InterruptedError, ValidatorChangedError):
+                raise
+            except Exception as exc:  # pylint: disable=broad-except
+                if retries >= SEGMENT_RETRIES:
+                    raise
+                retries += 1
+                # The next attempt resume from the last position written
+                LOG.warn('Segment {}-{} failed at {} ({}), retry {} of {}',
+                         start, end, self._get_position(start), exc, retries, SEGMENT_RETRIES)
+
+    def _fetch_range(self, url, start, end):
+        """Download the missing part of a segment and write it to the destination file"""
+        position = self._get_position(start)
+        headers = {'Range': 'bytes={}-{}'.format(position, end)}
+        # If-Range ensure that the server returns the range only if the file is unchanged
+        validator = self._state['etag'] or self._state['last_modified']
+        if validator:
+            headers['If-Range'] = validator
+        # Use an unbuffered file, the position saved in the state must correspond to the data written
+        with HTTP_CLIENT.request(url, headers=headers) as response, \
+                open(self.part_path, 'r+b', buffering=0) as file_handle:
+            if response.status != 206:
+                raise ValidatorChangedError('The server has not returned the requested range')
+            file_handle.seek(position)
+            while position <= end:
+                if self._cancel_event.is_set():
+                    raise InterruptedError
+                chunk = response.read(min(CHUNK_SIZE, end - position + 1))
+                if not chunk:
+                    raise IOError('Connection closed at {} of segment {}-{}'.format(position, start, end))
+                file_handle.write(chunk)
+                position += len(chunk)
+                with self._lock:
+                    self._state['segments'][str(start)] = position
+                    self._downloaded += len(chunk)
+
+
+def _get_range_total_size(response):
+    """Get the total file size from the Content-Range header of a partial response"""
+    match = re.match(r'bytes \d+-\d+/(\d+)', response.headers.get('Content-Range', ''))
+    return int(match.group(1)) if match else 0
+
+
+def _load_state(state_path):
+    try:
+        with open(state_path, 'r') as file_handle:
+            return json.load(file_handle)
+    except (IOError, ValueError):
+        return None
+
+
+def _delete_file(file_path):
+    try:
+        os.remove(file_path)
+    except FileNotFoundError:
+        pass
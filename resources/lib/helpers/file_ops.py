@@ -6,29 +6,39 @@
     See LICENSES/MIT.md for more information.
 """
 import os
-import time
 
 import xbmc
 import xbmcvfs
-import xbmcgui
 
 from resources.lib.globals import G
-from urllib.request import urlretrieve
-
-from resources.lib.helpers.kodi_ops import get_local_string
 from resources.lib.helpers.logging import LOG
 
 
-def download_file(url, dest_path, filename):
-    start_time = time.time()
+def download_file(url, dest_path, filename, base_path=None):
+    """
+    Download a file by showing the progress dialog
+    :param base_path: A previous build to reuse the unchanged blocks, when the mirror provide the block manifest
+    :return: dict with the hex digests of the file hashes, or None if the download has been cancelled
+    """
+    # Imported here, this module is used also by the directory listings that do not download files
+    import xbmcgui
+    from resources.lib.helpers.downloader import SegmentedDownloader
+    from resources.lib.helpers.kodi_ops import get_local_string
+    from resources.lib.helpers.progress import DownloadProgress
     dlg = xbmcgui.DialogProgress()
     dlg.create(G.ADDON_ID, get_local_string(30499))
     try:
-        urlretrieve(url.rstrip('/'),
-                    dest_path,
-                    lambda num_blocks, block_size, file_size: reporthook(num_blocks, block_size, file_size,
-                                                                         dlg, start_time, filename))
-        return True
+        if base_path:
+            hexdigests = _download_with_block_reuse(url.rstrip('/'), dest_path, base_path,
+                                                    DownloadProgress(dlg, filename))
+            if hexdigests:
+                return hexdigests
+        downloader = SegmentedDownloader(url.rstrip('/'),
+                                         dest_path,
+                                         G.ADDON.getSettingInt('download_connections'),
+                                         G.ADDON.getSettingInt('download_segment_size') * 1024 * 1024)
+        downloader.download(DownloadProgress(dlg, filename))
+        return downloader.hexdigests
     except InterruptedError:
         LOG.error('Download interrupted by user')
     except Exception as exc:
@@ -36,31 +46,19 @@ def download_file(url, dest_path, filename):
         raise Exception('Download failed') from exc
     finally:
         dlg.close()
-    return False
+    return None
 
 
-def reporthook(num_blocks, block_size, file_size, dlg, start_time, filename):
+def _download_with_block_reuse(url, dest_path, base_path, progress_callback):
+    from resources.lib.helpers.block_sync import download_with_block_reuse
+    from resources.lib.helpers.checksum import ChecksumError
     try:
-        percent = min(num_blocks * block_size * 100 / file_size, 100)
-        currently_downloaded = float(num_blocks) * block_size / (1024 * 1024)
-        kbps_speed = num_blocks * block_size / (time.time() - start_time)
-        eta = 0
-        if kbps_speed > 0:
-            eta = (file_size - num_blocks * block_size) / kbps_speed
-            if eta < 0:
-                eta = 0
-        kbps_speed = kbps_speed / 1024
-        eta = divmod(eta, 60)
-        file_size_mb = float(file_size) / (1024 * 1024)
-        status = '{:.02f} MB of {:.02f} MB '.format(currently_downloaded, file_size_mb)
-        status += '{} {:.02f} Kb/s '.format(get_local_string(30501), kbps_speed)
-        status += '{} {:02d}:{:02d}'.format(get_local_string(30502), int(eta[0]), int(eta[1]))
-        dlg.update(int(percent), '{}[CR]{}[CR]{}'.format(get_local_string(30500), filename, status))
-    except Exception as exc:
-        LOG.error('[download_file] reporthook raised an error: {}', exc)
-        dlg.update(100)
-    if dlg.iscanceled():
-        raise InterruptedError
+        return download_with_block_reuse(url, dest_path, base_path, progress_callback)
+    except InterruptedError:
+        raise
+    except (ChecksumError, IOError) as exc:
+        LOG.warn('Download by reusing the blocks failed ({}), download the whole file', exc)
+        return None
 
 
 def check_folder_path(path):
@@ -0,0 +1,205 @@
+# -*- coding: utf-8 -*-
+"""
+    Copyright (C) 2020 Stefano Gottardo (plugin.autoupdatekodi)
+    Local index of the PR's merged between the nightly builds
+
+    SPDX-License-Identifier: MIT
+    See LICENSES/MIT.md for more information.
+"""
+import json
+import re
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from resources.lib.globals import G
+from resources.lib.helpers.github_api import API_REPO_URL, get_json_page
+from resources.lib.helpers.logging import LOG
+
+DB_FILENAME = 'git_index.sqlite3'
+INDEX_WINDOW = 10  # Max number of consecutive builds indexed with a single compare
+COMPARE_PAGE_SIZE = 100  # Commits per page of the compare (the max allowed by GitHub)
+MAX_PAGE_WORKERS = 4  # Pages of a compare requested at same time
+RATE_LIMIT_RESERVE = 10  # Requests of the GitHub rate limit (60 per hour without authentication) left to the PR's
+COMPARE_FIELDS = ('total_commits', 'commits[].sha', 'commits[].commit.message')
+
+
+class GitIndex(object):
+    """
+    Index saved in a SQLite database, that maps the commit sha of each nightly build with the labels
+    of the PR's merged between the previous build and it. The index is filled incrementally,
+    the builds not indexed are requested to GitHub with a single compare request for several builds.
+    """
+
+    def __init__(self):
+        self._db_path = None
+        self._lock = threading.Lock()
+
+    @property
+    def db_path(self):
+        if self._db_path is None:
+            from resources.lib.helpers.file_ops import translate_path
+            self._db_path = translate_path(G.DATA_PATH) + DB_FILENAME
+            with self._connect() as conn:
+                conn.execute('CREATE TABLE IF NOT EXISTS merged_prs ('
+                             'sha TEXT NOT NULL, '
+                             'previous_sha TEXT NOT NULL, '
+                             'labels TEXT NOT NULL, '
+                             'PRIMARY KEY (sha, previous_sha))')
+        return self._db_path
+
+    def get_merged_prs(self, files_list, selected_file, progress_callback=None):
+        """
+        Get the labels of the PR's merged in a nightly build
+        :param files_list: The filenames of the builds, from the newest to the oldest
+        :param selected_file: The filename of the build
+        :param progress_callback: function called while the commits are requested to GitHub (see _compare)
+        :return: list of labels, from the newest to the oldest
+        """
+        index = files_list.index(selected_file) if selected_file in files_list else -1
+        shas = [get_commit_sha(filename) for filename in files_list]
+        selected_sha = get_commit_sha(selected_file)
+        if index == -1 or index + 1 >= len(shas):
+            # There is no previous build
+            return _get_labels(_compare('HEAD', selected_sha, progress_callback)[0])
+        with self._lock:
+            labels = self._load(selected_sha, shas[index + 1])
+            if labels is None:
+                labels = self._index_builds(shas, index, progress_callback)
+        return labels
+
+    def _index_builds(self, shas, index, progress_callback):
+        """
+        Index the builds starting from the index position, up to the window size or a build already indexed
+        :return: the labels of the build at the index position
+        """
+        last = index
+        while (last + 1 < min(len(shas) - 1, index + INDEX_WINDOW)
+               and self._load(shas[last + 1], shas[last + 2]) is None):
+            last += 1
+        LOG.debug('Index the merged PR\'s of {} builds', last - index + 1)
+        commits, is_complete = _compare(shas[last + 1], shas[index], progress_callback)
+        if last > index:
+            # Split the commits between the builds, by finding the commit of each build in the list
+            positions = {pos: _find_commit(commits, shas[pos]) for pos in range(index + 1, last + 1)}
+            if is_complete and -1 not in positions.values():
+                end = len(commits)
+                for pos in range(index, last + 1):
+                    start = positions[pos + 1] + 1 if pos < last else 0
+                    self._save(shas[pos], shas[pos + 1], _get_labels(commits[start:end]))
+                    end = start
+                return self._load(shas[index], shas[index + 1])
+            LOG.debug('Cannot split the commits between the builds, index only the selected build')
+            commits, is_complete = _compare(shas[index + 1], shas[index], progress_callback)
+        labels = _get_labels(commits)
+        if is_complete:
+            self._save(shas[index], shas[index + 1], labels)
+        else:
+            LOG.warn('The GitHub rate limit does not allow to get all the commits of {}, not indexed', shas[index])
+        return labels
+
+    def _load(self, sha, previous_sha):
+        with self._connect() as conn:
+            row = conn.execute('SELECT labels FROM merged_prs WHERE sha = ? AND previous_sha = ?',
+                               (sha, previous_sha)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def _save(self, sha, previous_sha, labels):
+        with self._connect() as conn:
+            conn.execute('INSERT OR REPLACE INTO merged_prs (sha, previous_sha, labels) VALUES (?, ?, ?)',
+                         (sha, previous_sha, json.dumps(labels)))
+
+    def _connect(self):
+        return _ClosingConnection(self.db_path)
+
+
+class _ClosingConnection(object):
+    """SQLite connection context manager that commit the changes and close the connection"""
+
+    def __init__(self, db_path):
+        self._conn = sqlite3.connect(db_path)
+
+    def __enter__(self):
+        return self._conn
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self._conn.commit()
+        self._conn.close()
+
+
+def get_commit_sha(filename):
+    return filename.split('-')[2]
+
+
+def _compare(base_sha, head_sha, progress_callback=None):
+    """
+    Get the commits between two commits. GitHub truncates a compare response, so the commits are requested
+    by pages: the first page gives the total of commits, then the other pages are requested concurrently,
+    as long as the rate limit allows it. Only the sha and the message of the commits are extracted
+    while the pages are received, the other data (e.g. the changed files of the first page) is skipped.
+    The result is saved in the index, then it is useless to keep the responses in the HTTP cache.
+    :param progress_callback: function called with (pages loaded, total pages, number of merged PR's found),
+                              if it raise an exception the requests are cancelled
+    :return: tuple (list of commits from the oldest to the newest, True if the list is complete)
+    """
+    url = '{}compare/{}...{}?per_page={}&page={{}}'.format(API_REPO_URL, base_sha, head_sha, COMPARE_PAGE_SIZE)
+    if progress_callback:
+        progress_callback(0, 1, 0)
+    data, remaining = get_json_page(url.format(1), COMPARE_FIELDS)
+    pages = {1: data['commits']}
+    total_pages = -(-data['total_commits'] // len(pages[1])) if pages[1] else 1
+    last_page = total_pages
+    if remaining is not None and total_pages - 1 > remaining - RATE_LIMIT_RESERVE:
+        last_page = max(remaining - RATE_LIMIT_RESERVE + 1, 1)
+        LOG.warn('The GitHub rate limit allows to get only {} of {} pages of the commits', last_page, total_pages)
+    if progress_callback:
+        progress_callback(1, total_pages, _count_merges(pages[1]))
+    if last_page > 1:
+        LOG.debug('Get {} pages of {} commits', last_page, data['total_commits'])
+        with ThreadPoolExecutor(max_workers=min(MAX_PAGE_WORKERS, last_page - 1)) as executor:
+            futures = {executor.submit(get_json_page, url.format(page), COMPARE_FIELDS): page
+                       for page in range(2, last_page + 1)}
+            try:
+                for future in as_completed(futures):
+                    pages[futures[future]] = future.result()[0]['commits']
+                    if progress_callback:
+                        progress_callback(len(pages), total_pages, sum(_count_merges(page) for page in pages.values()))
+            except BaseException:
+                for future in futures:
+                    future.cancel()
+                raise
+    commits = [commit_data for page in sorted(pages) for commit_data in pages[page]]
+    return commits, len(commits) >= data['total_commits']
+
+
+def _count_merges(commits):
+    return sum(1 for commit_data in commits if commit_data['commit']['message'].startswith('Merge'))
+
+
+def _find_commit(commits, short_sha):
+    for pos, commit_data in enumerate(commits):
+        if commit_data['sha'].startswith(short_sha):
+            return pos
+    return -1
+
+
+def _get_labels(commits):
+    """Get the labels of the merged PR's (only "Merge" commits), from the newest to the oldest"""
+    labels = []
+    for commit_data in reversed(commits):
+        if not commit_data['commit']['message'].startswith('Merge'):
+            continue
+        labels.append(_generate_label_from_commit(commit_data))
+    return labels
+
+
+def _generate_label_from_commit(data):
+    list_header_text = data['commit']['message'].split('\n')
+    # Get PR number
+    pr_number = re.findall(r'#(\d+)', list_header_text[0])
+    return '#{} {}'.format(pr_number[0] if pr_number else '',
+                           list_header_text[2] if len(list_header_text) > 2 else list_header_text[0])
+
+
+GIT_INDEX = GitIndex()
@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+"""
+    Copyright (C) 2020 Stefano Gottardo (plugin.autoupdatekodi)
+    Access to the GitHub API of the Kodi repository
+
+    SPDX-License-Identifier: MIT
+    See LICENSES/MIT.md for more information.
+"""
+import json
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from resources.lib.helpers.http_cache import HTTP_CACHE
+from resources.lib.helpers.http_client import HTTP_CLIENT
+from resources.lib.helpers.json_stream import extract_json
+from resources.lib.helpers.logging import LOG
+
+API_REPO_URL = 'https://api.github.com/repos/xbmc/xbmc/'
+PR_CACHE_MAX_ITEMS = 64
+MAX_WORKERS = 4
+CHUNK_SIZE = 64 * 1024
+# The fields used of the responses, the other fields are skipped while the response is received
+PR_FIELDS = ('title', 'body')
+PR_COMMITS_FIELDS = ('[].commit.message',)
+
+
+def get_json(url, use_cache=True, fields=None):
+    """
+    Get the JSON data of a GitHub API request, the responses are kept in the HTTP cache and revalidated with ETags
+    (the "not modified" responses do not count against the rate limit)
+    :param fields: the paths of the fields to get (see json_stream.extract_json), None to get all the data
+    """
+    if use_cache:
+        if fields:
+            return extract_json(HTTP_CACHE.iter_content(url), fields)
+        return json.loads(HTTP_CACHE.get(url).decode('utf-8'))
+    return get_json_page(url, fields)[0]
+
+
+def get_json_page(url, fields=None):
+    """
+    Get the JSON data of a GitHub API request without using the HTTP cache
+    :param fields: the paths of the fields to get (see json_stream.extract_json), None to get all the data
+    :return: tuple (JSON data, number of requests remaining in the rate limit, None if unknown)
+    """
+    LOG.debug('Execute HTTP request to: {}', url)
+    with HTTP_CLIENT.request(url) as response:
+        remaining = response.headers.get('X-RateLimit-Remaining')
+        if fields:
+            data = extract_json(iter(lambda: response.read(CHUNK_SIZE), b''), fields)
+        else:
+            data = json.loads(response.read().decode('utf-8'))
+        return data, int(remaining) if remaining is not None else None
+
+
+class PullRequests(object):
+    """Get the data of the pull requests, the data of the recently used pull requests is kept in memory"""
+
+    def __init__(self):
+        self._executor = None
+        self._requests_executor = None
+        self._lock = threading.Lock()
+        self._cache = OrderedDict()  # PR number -> Future of (PR data, commits data)
+
+    def get(self, pr_number):
+        """
+        Get the data of a pull request, the PR data and the commits list are requested concurrently
+        :param pr_number: The PR number
+        :return: tuple (PR data, commits data)
+        """
+        future = self._submit(pr_number)
+        try:
+            return future.result()
+        except Exception:
+            with self._lock:
+                # Do not keep the failed requests
+                if self._cache.get(pr_number) is future:
+                    del self._cache[pr_number]
+            raise
+
+    def is_loaded(self, pr_number):
+        """Check if the data of a pull request is available without waiting"""
+        with self._lock:
+            future = self._cache.get(pr_number)
+        return future is not None and future.done() and not future.exception()
+
+    def preload(self, pr_numbers):
+        """Get the data of the pull requests in background"""
+        for pr_number in pr_numbers:
+            self._submit(pr_number)
+
+    def _submit(self, pr_number):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=MAX_WORKERS)
+                # A separate executor for the sub-requests, so the PR tasks can never wait on themselves
+                self._requests_executor = ThreadPoolExecutor(max_workers=MAX_WORKERS)
+            future = self._cache.get(pr_number)
+            if future:
+                self._cache.move_to_end(pr_number)
+                return future
+            future = self._executor.submit(self._fetch, pr_number)
+            self._cache[pr_number] = future
+            while len(self._cache) > PR_CACHE_MAX_ITEMS:
+                self._cache.popitem(last=False)
+            return future
+
+    def _fetch(self, pr_number):
+        LOG.debug('Get the data of the PR #{}', pr_number)
+        # The two requests are executed at same time
+        commits_future = self._requests_executor.submit(get_json,
+                                                        '{}pulls/{}/commits'.format(API_REPO_URL, pr_number),
+                                                        fields=PR_COMMITS_FIELDS)
+        pr_data = get_json('{}pulls/{}'.format(API_REPO_URL, pr_number), fields=PR_FIELDS)
+        return pr_data, commits_future.result()
+
+
+PULL_REQUESTS = PullRequests()
@@ -0,0 +1,287 @@
+# -*- coding: utf-8 -*-
+"""
+    Copyright (C) 2020 Stefano Gottardo (plugin.autoupdatekodi)
+    Persistent HTTP cache with ETag/Last-Modified revalidation
+
+    SPDX-License-Identifier: MIT
+    See LICENSES/MIT.md for more information.
+"""
+import hashlib
+import os
+import threading
+import time
+from urllib.error import URLError
+
+from resources.lib.globals import G
+from resources.lib.helpers.http_client import HTTP_CLIENT
+from resources.lib.helpers.logging import LOG, measure_exec_time_decorator
+from resources.lib.helpers.rate_limiter import background_transfers
+from resources.lib.helpers.shared_file import SharedJsonFile
+
+CHUNK_SIZE = 64 * 1024
+FRESH_TTL = 5 * 60  # Seconds in which a cached response is used without revalidation
+STALE_TTL = 7 * 24 * 60 * 60  # Seconds in which a stale response is used while it is revalidated in background
+INDEX_FILENAME = 'index.json'
+ACCESS_SAVE_INTERVAL = 60  # Seconds between the saves of the access times of the cache hits
+
+
+class HttpCache(object):
+    """
+    On-disk cache of HTTP responses, saved in the add-on profile folder.
+    A fresh response is served directly, a stale response is served immediately and revalidated in background
+    with a conditional request (If-None-Match/If-Modified-Since), when the server is unreachable
+    the cached response is used as fallback. The cache size is bounded by removing the least recently used items.
+    """
+
+    def __init__(self):
+        self._path = None
+        # The service use the cache too, the index file is shared with the add-on process
+        self._index_file = SharedJsonFile(lambda: self.path + INDEX_FILENAME)
+        self._lock = threading.RLock()
+        self._revalidations = {}
+        self._access_times = {}  # The access times of the cache hits not saved yet
+        self._access_save_time = time.time()
+
+    @property
+    def path(self):
+        if self._path is None:
+            from resources.lib.helpers.file_ops import translate_path
+            self._path = translate_path(G.DATA_PATH) + 'cache/'
+            os.makedirs(self._path, exist_ok=True)
+        return self._path
+
+    @property
+    def index(self):
+        return self._index_file.load()
+
+    def get(self, url):
+        """
+        Get the body of a HTTP GET request, by using the cache when possible
+        :param url: The URL to request
+        :return: The response body as bytes
+        """
+        return b''.join(self.iter_content(url))
+
+    def iter_content(self, url, chunk_size=CHUNK_SIZE):
+        """
+        Get the body of a HTTP GET request as a stream, by using the cache when possible.
+        The request is executed immediately, the body is read while the returned generator is consumed.
+        :param url: The URL to request
+        :param chunk_size: The size of the chunks
+        :return: generator of the response body as bytes chunks
+        """
+        key = _get_key(url)
+        with self._lock:
+            entry = self.index.get(key)
+            if entry and not os.path.exists(self.path + key):
+                entry = None
+        if entry:
+            age = time.time() - entry['fetched']
+            if age < FRESH_TTL:
+                LOG.debug('HTTP cache hit (fresh) for: {}', url)
+                self._touch(key)
+                return self._iter_file(key, chunk_size)
+            if age < STALE_TTL:
+                LOG.debug('HTTP cache hit (stale), revalidate in background: {}', url)
+                self._touch(key)
+                # The revalidation starts when the cached file has been read
+                return self._iter_file(key, chunk_size, lambda: self._revalidate_async(url, key))
+        try:
+            response = self._request(url, entry)
+        except (URLError, IOError) as exc:
+            if not entry:
+                raise
+            LOG.warn('HTTP request failed ({}), use the cached response of: {}', exc, url)
+            return self._iter_file(key, chunk_size)
+        if response is None:
+            return self._iter_file(key, chunk_size)
+        return self._iter_response(url, key, response, chunk_size)
+
+    def is_fresh(self, url):
+        """Check if there is a cached response that can be used without revalidation"""
+        with self._lock:
+            entry = self.index.get(_get_key(url))
+            return bool(entry) and time.time() - entry['fetched'] < FRESH_TTL and os.path.exists(
+                self.path + _get_key(url))
+
+    def wait_revalidations(self, timeout=None):
+        """Wait for the background revalidations to be completed"""
+        with self._lock:
+            threads = list(self._revalidations.values())
+        for thread in threads:
+            thread.join(timeout)
+
+    def invalidate(self, url):
+        """Remove a cached response"""
+        with self._lock:
+            self._update_index(lambda index: self._delete_entry(index, _get_key(url)))
+
+    def clear(self):
+        """Remove all the cached responses"""
+        def update(index):
+            for key in list(index.keys()):
+                self._delete_entry(index, key)
+
+        with self._lock:
+            self._update_index(update)
+
+    def _revalidate_async(self, url, key):
+        with self._lock:
+            if key in self._revalidations:
+                return
+            thread = threading.Thread(target=self._revalidate, args=(url, key))
+            thread.daemon = True
+            self._revalidations[key] = thread
+        thread.start()
+
+    @measure_exec_time_decorator(category='http')
+    def _revalidate(self, url, key):
+        try:
+            with self._lock:
+                entry = self.index.get(key)
+            with background_transfers():
+                response = self._request(url, entry)
+                if response is not None:
+                    for _ in self._iter_response(url, key, response, CHUNK_SIZE):
+                        pass
+        except Exception as exc:  # pylint: disable=broad-except
+            LOG.warn('HTTP cache revalidation failed ({}) for: {}', exc, url)
+        finally:
+            with self._lock:
+                self._revalidations.pop(key, None)
+
+    def _request(self, url, entry):
+        """Execute a HTTP request, conditional when there is a cached response, return None if not modified"""
+        headers = {}
+        if entry:
+            if entry.get('etag'):
+                headers['If-None-Match'] = entry['etag']
+            if entry.get('last_modified'):
+                headers['If-Modified-Since'] = entry['last_modified']
+        LOG.debug('Execute HTTP request to: {}', url)
+        response = HTTP_CLIENT.request(url, headers=headers)
+        if response.status != 304:
+            return response
+        response.close()
+        if not headers:
+            # Not modified response to a request that was not conditional (e.g. from a proxy),
+            # there is no cached response to use, then it is a miss, request again the whole response
+            LOG.warn('HTTP response not modified without a cached response, request it again: {}', url)
+            response = HTTP_CLIENT.request(url, headers={'Cache-Control': 'no-cache'})
+            if response.status == 304:
+                response.close()
+                raise URLError('HTTP response not modified without a cached response')
+            return response
+        LOG.debug('HTTP response not modified: {}', url)
+        key = _get_key(url)
+        now = time.time()
+
+        def update(index):
+            if key in index:
+                index[key]['fetched'] = now
+
+        with self._lock:
+            self._update_index(update)
+        return None
+
+    def _iter_response(self, url, key, response, chunk_size):
+        """Read the response body and write it to the cache at the same time"""
+        tmp_path = '{}{}.{}.tmp'.format(self.path, key, threading.get_ident())
+        size = 0
+        try:
+            with response, open(tmp_path, 'wb') as file_handle:
+                while True:
+                    chunk = response.read(chunk_size)
+                    if not chunk:
+                        break
+                    file_handle.write(chunk)
+                    size += len(chunk)
+                    yield chunk
+            self._commit(url, key, tmp_path, size, response.headers)
+        finally:
+            try:
+                os.remove(tmp_path)
+            except FileNotFoundError:
+                pass
+
+    def _commit(self, url, key, tmp_path, size, headers):
+        with self._lock:
+            try:
+                os.replace(tmp_path, self.path + key)
+            except PermissionError:
+                # On Windows the file cannot be replaced while it is being read, keep the current one
+                LOG.debug('HTTP cache file in use, the response will not be cached: {}', url)
+                return
+            now = time.time()
+            entry = {
+                'url': url,
+                'etag': headers.get('ETag'),
+                'last_modified': headers.get('Last-Modified'),
+                'fetched': now,
+                'last_access': now,
+                'size': size
+            }
+
+            def update(index):
+                index[key] = entry
+                self._evict(index)
+
+            self._update_index(update)
+
+    def _iter_file(self, key, chunk_size, on_close=None):
+        try:
+            with open(self.path + key, 'rb') as file_handle:
+                while True:
+                    chunk = file_handle.read(chunk_size)
+                    if not chunk:
+                        break
+                    yield chunk
+        finally:
+            if on_close:
+                on_close()
+
+    def _touch(self, key):
+        """Update the access time of a cache hit, the access times are saved with the next change of the index"""
+        with self._lock:
+            self._access_times[key] = time.time()
+            if time.time() - self._access_save_time > ACCESS_SAVE_INTERVAL:
+                self._update_index(lambda index: None)
+
+    def _update_index(self, func):
+        """Change the index with the file locked, see SharedJsonFile.update, the access times are saved too"""
+        access_times = self._access_times
+        self._access_times = {}
+        self._access_save_time = time.time()
+
+        def update(index):
+            for key, access_time in access_times.items():
+                if key in index:
+                    index[key]['last_access'] = max(index[key]['last_access'], access_time)
+            func(index)
+
+        self._index_file.update(update)
+
+    def _evict(self, index):
+        """Remove the least recently used items until the cache size fits the limit"""
+        max_size = G.ADDON.getSettingInt('cache_max_size') * 1024 * 1024
+        total_size = sum(entry['size'] for entry in index.values())
+        for key, entry in sorted(index.items(), key=lambda item: item[1]['last_access']):
+            if total_size <= max_size:
+                break
+            LOG.debug('HTTP cache evict: {}', entry['url'])
+            total_size -= entry['size']
+            self._delete_entry(index, key)
+
+    def _delete_entry(self, index, key):
+        index.pop(key, None)
+        try:
+            os.remove(self.path + key)
+        except FileNotFoundError:
+            pass
+
+
+def _get_key(url):
+    return hashlib.sha1(url.encode('utf-8')).hexdigest()
+
+
+HTTP_CACHE = HttpCache()
@@ -0,0 +1,237 @@
+# -*- coding: utf-8 -*-
+"""
+    Copyright (C) 2020 Stefano Gottardo (plugin.autoupdatekodi)
+    HTTP client with per-host keep-alive connections pool
+
+    SPDX-License-Identifier: MIT
+    See LICENSES/MIT.md for more information.
+"""
+import base64
+import http.client
+import ssl
+import threading
+import time
+from urllib.error import HTTPError, URLError
+from urllib.parse import unquote, urljoin, urlsplit
+from urllib.request import getproxies, proxy_bypass
+
+from resources.lib.globals import G
+from resources.lib.helpers.logging import LOG, measure_exec_time
+from resources.lib.helpers.rate_limiter import get_rate_limiter
+
+HTTP_TIMEOUT = 10
+IDLE_TIMEOUT = 30  # Seconds after which an unused connection is closed
+MAX_IDLE_PER_HOST = 8
+MAX_RETRIES = 2
+RETRY_BACKOFF = 0.5  # Seconds, doubled at each retry
+MAX_REDIRECTS = 5
+RETRY_STATUS_CODES = (502, 503, 504)
+REDIRECT_STATUS_CODES = (301, 302, 303, 307, 308)
+
+
+class HttpClient(object):
+    """
+    HTTP client that keeps the connections alive, so that the consecutive requests to the same host
+    (and the concurrent requests of the downloads) can reuse them without a new TCP/TLS handshake.
+    With the reuseLanguageInvoker the pool is kept between the add-on invocations.
+    The system proxy is used as urllib does, the HTTPS connections pass through it with a CONNECT tunnel.
+    """
+
+    def __init__(self):
+        self._pools = {}
+        self._lock = threading.Lock()
+        self._ssl_context = None
+        self._proxies = None  # The system proxy of each scheme
+        self._host_proxies = {}  # The proxy of each (scheme, netloc), None when the host is not proxied
+
+    def request(self, url, headers=None, method='GET', timeout=HTTP_TIMEOUT):
+        """
+        Execute a HTTP request, the redirects are followed and the failed connections are retried
+        :param url: The URL to request
+        :param headers: Dict of headers to send
+        :param method: The HTTP method
+        :param timeout: The timeout of the socket operations
+        :return: HttpResponse object, to be closed after use (it can be used as context manager)
+        :raise HTTPError: when the HTTP response status is an error
+        :raise URLError: when the connection fails
+        """
+        request_headers = {
+            'User-Agent': '{}/{}'.format(G.ADDON_ID, G.VERSION),
+            'Accept-Encoding': 'identity'
+        }
+        request_headers.update(headers or {})
+        # The time trace covers the request until the response headers, the body is read by the caller
+        trace_args = {'url': url, 'range': request_headers['Range']} if 'Range' in request_headers else {'url': url}
+        with measure_exec_time('HTTP ' + method, 'http', trace_args):
+            for _ in range(MAX_REDIRECTS + 1):
+                response = self._request_with_retry(url, request_headers, method, timeout)
+                if response.status not in REDIRECT_STATUS_CODES or not response.headers.get('Location'):
+                    break
+                response.read()
+                response.close()
+                url = urljoin(url, response.headers['Location'])
+                LOG.debug('HTTP redirect to: {}', url)
+            else:
+                raise URLError('Too many redirects')
+        if response.status >= 400:
+            response.close()
+            raise HTTPError(url, response.status, response.reason, response.headers, None)
+        return response
+
+    def close_all(self):
+        """Close all the connections of the pool"""
+        with self._lock:
+            for connections in self._pools.values():
+                for connection, _ in connections:
+                    connection.close()
+            self._pools.clear()
+
+    def _request_with_retry(self, url, headers, method, timeout):
+        url_parts = urlsplit(url)
+        path = url_parts.path or '/'
+        if url_parts.query:
+            path += '?' + url_parts.query
+        key = (url_parts.scheme, url_parts.netloc)
+        proxy = self._get_proxy(key)
+        if proxy and url_parts.scheme == 'http':
+            # Without the tunnel the proxy needs the absolute URL
+            path = url
+            headers = dict(headers, **_get_proxy_headers(proxy))
+        retries = 0
+        while True:
+            connection, is_reused = self._acquire(key, timeout)
+            try:
+                connection.request(method, path, headers=headers)
+                response = connection.getresponse()
+            except (OSError, http.client.HTTPException) as exc:
+                connection.close()
+                if is_reused:
+                    # The server has closed the idle connection, retry immediately with a new one
+                    LOG.debug('HTTP reused connection failed ({}), retry with a new one', exc)
+                    continue
+                if retries >= MAX_RETRIES:
+                    raise URLError(exc) from exc
+                retries += 1
+                LOG.warn('HTTP request failed ({}), retry {} of {}: {}', exc, retries, MAX_RETRIES, url)
+                time.sleep(RETRY_BACKOFF * 2 ** (retries - 1))
+                continue
+            if response.status in RETRY_STATUS_CODES and retries < MAX_RETRIES:
+                response.read()
+                self._release(key, connection, response)
+                retries += 1
+                LOG.warn('HTTP response status {}, retry {} of {}: {}', response.status, retries, MAX_RETRIES, url)
+                time.sleep(RETRY_BACKOFF * 2 ** (retries - 1))
+                continue
+            return HttpResponse(self, key, connection, response, url)
+
+    def _acquire(self, key, timeout):
+        """Get an idle connection from the pool or create a new one, return the connection and if it is reused"""
+        now = time.time()
+        with self._lock:
+            connections = self._pools.get(key, [])
+            while connections:
+                connection, last_used = connections.pop()
+                if now - last_used < IDLE_TIMEOUT:
+                    connection.timeout = timeout
+                    if connection.sock:
+                        connection.sock.settimeout(timeout)
+                    return connection, True
+                connection.close()
+        scheme, netloc = key
+        proxy = self._get_proxy(key)
+        host = _get_proxy_host(proxy) if proxy else netloc
+        if scheme == 'https':
+            if self._ssl_context is None:
+                self._ssl_context = ssl.create_default_context()
+            connection = http.client.HTTPSConnection(host, timeout=timeout, context=self._ssl_context)
+            if proxy:
+                connection.set_tunnel(netloc, headers=_get_proxy_headers(proxy))
+            return connection, False
+        return http.client.HTTPConnection(host, timeout=timeout), False
+
+    def _get_proxy(self, key):
+        """Get the URL parts of the system proxy to use for a (scheme, netloc), None to connect directly"""
+        if key in self._host_proxies:
+            return self._host_proxies[key]
+        scheme, netloc = key
+        if self._proxies is None:
+            # On Windows read the proxy from the Internet Settings of the registry, otherwise from the environment
+            self._proxies = getproxies()
+        proxy_url = self._proxies.get(scheme)
+        proxy = None
+        if proxy_url and not proxy_bypass(netloc):
+            proxy = urlsplit(proxy_url if '://' in proxy_url else 'http://' + proxy_url)
+            LOG.debug('HTTP connections to {} use the proxy {}', netloc, _get_proxy_host(proxy))
+        self._host_proxies[key] = proxy
+        return proxy
+
+    def _release(self, key, connection, response):
+        """Return the connection to the pool, if it can be reused"""
+        if not response.isclosed() or response.will_close:
+            connection.close()
+            return
+        with self._lock:
+            connections = self._pools.setdefault(key, [])
+            if len(connections) >= MAX_IDLE_PER_HOST:
+                connection.close()
+                return
+            connections.append((connection, time.time()))
+
+
+def _get_proxy_host(proxy):
+    """Get the host:port of a proxy, without the credentials"""
+    return proxy.netloc.rpartition('@')[2]
+
+
+def _get_proxy_headers(proxy):
+    if proxy.username is None:
+        return {}
+    credentials = '{}:{}'.format(unquote(proxy.username), unquote(proxy.password or ''))
+    return {'Proxy-Authorization': 'Basic ' + base64.b64encode(credentials.encode('utf-8')).decode('ascii')}
+
+
+class HttpResponse(object):
+    """
+    A HTTP response, the connection is returned to the pool when the body has been read and is closed.
+    The body reads are limited by the bandwidth limiter of the thread that executed the request.
+    """
+
+    def __init__(self, client, key, connection, response, url):
+        self._client = client
+        self._key = key
+        self._connection = connection
+        self._response = response
+        self._url = url
+        self._rate_limiter = get_rate_limiter()
+        self.status = response.status
+        self.reason = response.reason
+        self.headers = response.headers
+
+    def geturl(self):
+        """Get the final URL of the response (after the redirects)"""
+        return self._url
+
+    def read(self, amt=None):
+        data = self._response.read(amt)
+        if data:
+            self._rate_limiter.consume(len(data))
+        return data
+
+    def close(self):
+        if self._connection is None:
+            return
+        if not self._response.isclosed() and self._response.length == 0:
+            # Response without body (e.g. HEAD or 304), complete it so the connection can be reused
+            self._response.read()
+        self._client._release(self._key, self._connection, self._response)  # pylint: disable=protected-access
+        self._response.close()
+        self._connection = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+HTTP_CLIENT = HttpClient()
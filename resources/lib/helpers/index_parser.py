@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+"""
+    Copyright (C) 2020 Stefano Gottardo (plugin.autoupdatekodi)
+    Single-pass streaming parser for the mirror index pages
+
+    SPDX-License-Identifier: MIT
+    See LICENSES/MIT.md for more information.
+"""
+import re
+from collections import namedtuple
+from urllib.parse import unquote
+
+IndexEntry = namedtuple('IndexEntry', ['name', 'is_folder', 'size', 'date'])
+
+# The page is scanned as bytes, only the matched values are decoded
+_ANCHOR_RE = re.compile(rb'<a\s[^>]*?href="([^"]*)"', re.IGNORECASE)
+_FOLDER_RE = re.compile(rb'^[^/".]+/$')
+# Dates as: 2020-12-29 03:31, 2020-Dec-29 03:31, 29-Dec-2020 03:31
+_DATE_RE = re.compile(rb'(\d{4})-(\d{2}|[A-Za-z]{3})-(\d{2})[ T](\d{2}:\d{2})|(\d{2})-([A-Za-z]{3})-(\d{4}) (\d{2}:\d{2})')
+# Sizes as: 74836232, 71.4M, 71.4 MiB, 71.4 MB (a number delimited by spaces or tags)
+_SIZE_RE = re.compile(rb'[>\s](\d+(?:\.\d+)?)\s*([KMGTkmgt]?)(?:i?B)?(?=[<\s])')
+_MONTHS = {b'jan': b'01', b'feb': b'02', b'mar': b'03', b'apr': b'04', b'may': b'05', b'jun': b'06',
+           b'jul': b'07', b'aug': b'08', b'sep': b'09', b'oct': b'10', b'nov': b'11', b'dec': b'12'}
+_SIZE_UNITS = {b'': 1, b'k': 1024, b'm': 1024 ** 2, b'g': 1024 ** 3, b't': 1024 ** 4}
+_MAX_TAIL_SIZE = 4096  # Max bytes kept from a chunk to the next, when there is no entry pending
+
+
+def parse_index(chunks):
+    """
+    Parse a mirror index page (HTML directory listing) in a single pass,
+    the entries are yielded as soon as they are found, without decoding the whole page
+    :param chunks: iterable of the page content as bytes chunks
+    :return: generator of IndexEntry, the size is in bytes (0 when unknown),
+             the date as 'YYYY-MM-DD HH:MM' string (empty when unknown)
+    """
+    buffer = b''
+    pending = None  # The last entry found: (href, position where its columns start)
+    for chunk in chunks:
+        buffer += chunk
+        scan_pos = 0
+        for match in _ANCHOR_RE.finditer(buffer):
+            scan_pos = match.end()
+            href = match.group(1)
+            if href[-4:] != b'.exe' and not _FOLDER_RE.match(href):
+                continue
+            if pending:
+                yield _make_entry(pending[0], buffer, pending[1], match.start())
+            pending = (href, scan_pos)
+        # Keep only the data not processed yet (the columns of the pending entry or a truncated tag)
+        if pending:
+            cut = pending[1]
+            pending = (pending[0], 0)
+        else:
+            cut = max(scan_pos, len(buffer) - _MAX_TAIL_SIZE)
+        buffer = buffer[cut:]
+    if pending:
+        yield _make_entry(pending[0], buffer, pending[1], len(buffer))
+
+
+def _make_entry(href, buffer, start, end):
+    """Create the entry from the href and the text of the next columns (between start and end of the buffer)"""
+    is_folder = href[-1:] == b'/'
+    name = (href[:-1] if is_folder else href).decode('utf-8', 'replace')
+    if '%' in name:
+        name = unquote(name)
+    # Skip the text of the link, then get the values of the next columns (size and date)
+    pos = buffer.find(b'</a>', start, end)
+    if pos != -1:
+        start = pos + 3
+    pos = buffer.find(b'</tr>', start, end)
+    if pos != -1:
+        end = pos + 1
+    date = ''
+    size = 0
+    match = _DATE_RE.search(buffer, start, end)
+    if match:
+        if match.group(1):
+            year, month, day, hour = match.group(1, 2, 3, 4)
+        else:
+            day, month, year, hour = match.group(5, 6, 7, 8)
+        if not month.isdigit():
+            month = _MONTHS.get(month.lower(), b'00')
+        date = (b'%s-%s-%s %s' % (year, month, day, hour)).decode('ascii')
+    if not is_folder:
+        # The size column can be before or after the date
+        size_match = _SIZE_RE.search(buffer, start, match.start() + 1) if match else None
+        if not size_match:
+            size_match = _SIZE_RE.search(buffer, match.end() - 1 if match else start, end)
+        if size_match:
+            size = int(float(size_match.group(1)) * _SIZE_UNITS[size_match.group(2).lower()])
+    return IndexEntry(name, is_folder, size, date)
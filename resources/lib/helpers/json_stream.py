@@ -0,0 +1,246 @@
+# -*- coding: utf-8 -*-
+"""
+    Copyright (C) 2020 Stefano Gottardo (plugin.autoupdatekodi)
+    Streaming JSON reader that extracts only the requested fields
+
+    SPDX-License-Identifier: MIT
+    See LICENSES/MIT.md for more information.
+"""
+import json
+import re
+
+ARRAY = '[]'
+MAX_ITEM_DECODE_SIZE = 16 * 1024  # Max size of an array item decoded whole, the bigger items are read by fields
+
+_WHITESPACE_RE = re.compile(rb'[ \t\r\n]*')
+# The content of a container up to the next bracket or to the next string with escapes,
+# the strings without escapes are skipped here (they may contain brackets)
+_CONTAINER_CONTENT_RE = re.compile(rb'[^"\[\]{}]*(?:"[^"\\]*"[^"\[\]{}]*)*')
+_BACKSLASH = ord('\\')
+_SCALAR_RE = re.compile(rb'[^ \t\r\n,\]}]*')
+_PATH_SEPARATOR_RE = re.compile(r'\.|(\[\])')
+
+
+def extract_json(chunks, paths):
+    """
+    Parse a JSON document while it is received, and extract only the values of the requested paths.
+    The other values are skipped without decoding them, and the data already scanned is discarded,
+    so a large value not requested (e.g. the patches of a GitHub compare) never takes memory.
+    :param chunks: iterable of the JSON document as bytes chunks, it is always consumed until the end
+                   (e.g. so the HTTP cache can save the whole response)
+    :param paths: iterable of the paths to extract, the keys are separated by dots and "[]" means each item
+                  of an array, e.g. ['total_commits', 'commits[].sha', 'commits[].commit.message'],
+                  for a document that is an array: ['[].commit.message']
+    :return: the document with only the requested values, with the same structure of the original document
+    :raise ValueError: when the document is not valid
+    """
+    reader = _Reader(chunks)
+    result = reader.read_value(compile_paths(paths))
+    reader.drain()
+    return result
+
+
+def compile_paths(paths):
+    """Convert the paths to a tree of dicts, where the requested values are the None leaves"""
+    tree = {}
+    for path in paths:
+        parts = [part for part in _PATH_SEPARATOR_RE.split(path) if part]
+        node = tree
+        for part in parts[:-1]:
+            if node.get(part, {}) is None:
+                break  # A parent value is already requested whole
+            node = node.setdefault(part, {})
+        else:
+            node[parts[-1]] = None
+    return tree
+
+
+def _prune(value, node):
+    """Keep only the requested values of a decoded value"""
+    if node is None:
+        return value
+    if isinstance(value, dict):
+        return {key: _prune(item, node[key]) for key, item in value.items() if key in node}
+    if isinstance(value, list) and ARRAY in node:
+        return [_prune(item, node[ARRAY]) for item in value]
+    return value
+
+
+class _Reader(object):
+    """
+    Recursive reader of the JSON values, the buffer holds only the data not yet scanned
+    (and the data of the value being extracted), the skipped strings and containers are scanned by regex
+    """
+
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+        self._buffer = b''
+        self._pos = 0
+        self._keep = None  # Position of the buffer from which the data cannot be discarded
+
+    def read_value(self, node):
+        char = self._peek()
+        if node is not None and char == b'{':
+            return self._read_object(node)
+        if node is not None and char == b'[' and ARRAY in node:
+            return self._read_array(node[ARRAY])
+        # A requested value, or a value of a different type than expected (e.g. null instead of an object)
+        self._keep = self._pos
+        self._skip_value()
+        data = self._buffer[self._keep:self._pos]
+        self._keep = None
+        return json.loads(data)
+
+    def drain(self):
+        for _ in self._chunks:
+            pass
+
+    def _read_object(self, node):
+        self._pos += 1
+        result = {}
+        if self._peek() == b'}':
+            self._pos += 1
+            return result
+        while True:
+            key = self._read_key()
+            self._expect(b':')
+            if key in node:
+                result[key] = self.read_value(node[key])
+            else:
+                self._skip_value()
+            if self._next_separator(b'}'):
+                return result
+
+    def _read_array(self, node):
+        self._pos += 1
+        result = []
+        if self._peek() == b']':
+            self._pos += 1
+            return result
+        while True:
+            if node is not None and self._peek() == b'{':
+                result.append(self._read_item(node))
+            else:
+                result.append(self.read_value(node))
+            if self._next_separator(b']'):
+                return result
+
+    def _read_item(self, node):
+        """
+        Read an object item of an array, the small items (e.g. the commits) are found by regex and decoded
+        by the json module, that is faster than reading their keys one by one
+        """
+        self._keep = self._pos
+        self._skip_container()
+        start = self._keep
+        self._keep = None
+        if self._pos - start <= MAX_ITEM_DECODE_SIZE:
+            return _prune(json.loads(self._buffer[start:self._pos]), node)
+        # The item is still in the buffer, read it again by fields
+        self._pos = start
+        return self._read_object(node)
+
+    def _read_key(self):
+        if self._peek() != b'"':
+            raise ValueError('Expected an object key at position {}'.format(self._pos))
+        self._keep = self._pos
+        self._skip_string()
+        data = self._buffer[self._keep:self._pos]
+        self._keep = None
+        return json.loads(data) if b'\\' in data else data[1:-1].decode('utf-8')
+
+    def _next_separator(self, end_char):
+        """Consume the separator after a value, return True if it is the end of the container"""
+        char = self._peek()
+        self._pos += 1
+        if char == end_char:
+            return True
+        if char != b',':
+            raise ValueError('Expected "," or "{}" at position {}'.format(end_char.decode(), self._pos - 1))
+        return False
+
+    def _skip_value(self):
+        char = self._peek()
+        if char == b'"':
+            self._skip_string()
+        elif char in (b'{', b'['):
+            self._skip_container()
+        else:
+            self._skip_scalar()
+
+    def _skip_string(self):
+        # The quotes are found with bytes.find, much faster than a regex on the long strings with many escapes
+        self._pos += 1
+        while True:
+            end = self._buffer.find(b'"', self._pos)
+            if end == -1:
+                # Keep the trailing backslashes, they may escape a quote at the start of the next chunk
+                end = len(self._buffer)
+                while end > self._pos and self._buffer[end - 1] == _BACKSLASH:
+                    end -= 1
+                self._pos = end
+                self._fill()
+                continue
+            start = end
+            while start > self._pos and self._buffer[start - 1] == _BACKSLASH:
+                start -= 1
+            self._pos = end + 1
+            if (end - start) % 2 == 0:
+                return
+
+    def _skip_container(self):
+        depth = 0
+        while True:
+            self._pos = _CONTAINER_CONTENT_RE.match(self._buffer, self._pos).end()
+            char = self._buffer[self._pos:self._pos + 1]
+            if char == b'"':
+                # A string with escapes, or truncated at the end of the buffer
+                self._skip_string()
+                continue
+            if not char:
+                self._fill()
+                continue
+            self._pos += 1
+            depth += 1 if char in (b'{', b'[') else -1
+            if depth == 0:
+                return
+
+    def _skip_scalar(self):
+        while True:
+            self._pos = _SCALAR_RE.match(self._buffer, self._pos).end()
+            if self._pos < len(self._buffer) or not self._fill(required=False):
+                return
+
+    def _peek(self):
+        """Skip the whitespaces and get the next byte"""
+        char = self._buffer[self._pos:self._pos + 1]
+        if char and char not in b' \t\r\n':
+            return char  # Fast path, the JSON of the API responses has no whitespaces
+        while True:
+            self._pos = _WHITESPACE_RE.match(self._buffer, self._pos).end()
+            if self._pos < len(self._buffer):
+                return self._buffer[self._pos:self._pos + 1]
+            self._fill()
+
+    def _expect(self, char):
+        if self._peek() != char:
+            raise ValueError('Expected "{}" at position {}'.format(char.decode(), self._pos))
+        self._pos += 1
+
+    def _fill(self, required=True):
+        """
+        Add the next chunk to the buffer, the data before the current position is discarded
+        :param required: if True raise an error when there is no more data
+        :return: False when there is no more data
+        """
+        chunk = next(self._chunks, None)
+        if chunk is None:
+            if required:
+                raise ValueError('Unexpected end of the JSON data')
+            return False
+        drop = min(self._pos if self._keep is None else self._keep, len(self._buffer))
+        self._buffer = self._buffer[drop:] + chunk
+        self._pos -= drop
+        if self._keep is not None:
+            self._keep -= drop
+        return True
@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+"""
+    Copyright (C) 2020 Stefano Gottardo (plugin.autoupdatekodi)
+    In memory cache of the parsed directory listings
+
+    SPDX-License-Identifier: MIT
+    See LICENSES/MIT.md for more information.
+"""
+import threading
+import time
+from array import array
+from collections import OrderedDict, namedtuple
+
+from resources.lib.helpers.index_parser import IndexEntry
+from resources.lib.helpers.logging import LOG
+
+LISTING_TTL = 2 * 60  # Seconds in which a cached listing is used
+MAX_MEMORY_SIZE = 2 * 1024 * 1024  # Estimated bytes of the cached listings
+ENTRY_OVERHEAD = 250  # Estimated bytes of an IndexEntry, excluding the strings
+COMPACT_MIN_SIZE = 256 * 1024  # Estimated bytes of a listing from which it is stored in the compact form
+
+_Listing = namedtuple('_Listing', ['folders', 'files', 'expires', 'stamp', 'size'])
+
+
+class ListingCache(object):
+    """
+    LRU cache of the parsed directory listings, it is kept in memory (with the reuseLanguageInvoker also between
+    the add-on invocations), so going back to a folder already opened does not fetch and parse it again.
+    A listing expires after LISTING_TTL seconds, or when the stamp of the folder (e.g. the modification time
+    of a local folder) is changed. The least recently used listings are removed when exceed the memory size.
+    The big listings (e.g. the nightly builds, with thousands of files) are stored in a compact form,
+    so they fit the memory size and going to the next page does not parse the whole listing again.
+    """
+
+    def __init__(self, max_size=MAX_MEMORY_SIZE):
+        self._lock = threading.Lock()
+        self._listings = OrderedDict()  # (path, is_local) -> _Listing
+        self._size = 0
+        self._max_size = max_size
+
+    def get(self, pathitems, is_local, stamp=None):
+        """
+        Get a cached listing
+        :param pathitems: The path of the folder
+        :param is_local: True for a folder of the downloads folder, False for a folder of the mirror
+        :param stamp: The current stamp of the folder, if it is not equal to the cached one the listing is expired
+        :return: tuple of two lists of IndexEntry (folders, files), or None if not cached
+        """
+        key = ('/'.join(pathitems), is_local)
+        with self._lock:
+            listing = self._listings.get(key)
+            if listing is None:
+                return None
+            if listing.expires < time.monotonic() or listing.stamp != stamp:
+                self._remove(key)
+                return None
+            self._listings.move_to_end(key)
+        LOG.debug('Listing of {} served from the memory cache', key[0])
+        if isinstance(listing.files, _CompactEntries):
+            return listing.folders.expand(), listing.files.expand()
+        return listing.folders, listing.files
+
+    def put(self, pathitems, is_local, folders, files, stamp=None):
+        """
+        Add a listing to the cache
+        :param pathitems: The path of the folder
+        :param is_local: True for a folder of the downloads folder, False for a folder of the mirror
+        :param folders: list of IndexEntry of the folders
+        :param files: list of IndexEntry of the files
+        :param stamp: The current stamp of the folder
+        """
+        key = ('/'.join(pathitems), is_local)
+        size = sum(ENTRY_OVERHEAD + len(entry.name) + len(entry.date) for entry in folders + files)
+        if size >= COMPACT_MIN_SIZE:
+            folders = _CompactEntries(folders, True)
+            files = _CompactEntries(files, False)
+            size = folders.size + files.size
+        else:
+            folders = tuple(folders)
+            files = tuple(files)
+        if size > self._max_size:
+            return
+        with self._lock:
+            if key in self._listings:
+                self._remove(key)
+            self._listings[key] = _Listing(folders, files, time.monotonic() + LISTING_TTL, stamp, size)
+            self._size += size
+            while self._size > self._max_size:
+                self._remove(next(iter(self._listings)))
+
+    def invalidate(self, is_local=None):
+        """
+        Remove the cached listings, to be used when the folders are changed
+        :param is_local: if True remove only the listings of the downloads folder, if False only those of the mirror
+        """
+        with self._lock:
+            for key in [key for key in self._listings if is_local is None or key[1] == is_local]:
+                self._remove(key)
+
+    def _remove(self, key):
+        self._size -= self._listings.pop(key).size
+
+
+class _CompactEntries(object):
+    """
+    The entries of a big listing, stored as two strings and an array instead of an object for each entry,
+    that takes about a quarter of the memory, the entries are created again when the listing is used
+    """
+    __slots__ = ('is_folder', 'names', 'dates', 'sizes')
+    SEPARATOR = '\0'  # Not allowed in the file names
+
+    def __init__(self, entries, is_folder):
+        self.is_folder = is_folder
+        self.names = self.SEPARATOR.join(entry.name for entry in entries)
+        self.dates = self.SEPARATOR.join(entry.date for entry in entries)
+        self.sizes = array('q', (entry.size for entry in entries))
+
+    @property
+    def size(self):
+        return len(self.names) + len(self.dates) + self.sizes.itemsize * len(self.sizes)
+
+    def expand(self):
+        """Get the list of IndexEntry"""
+        if not self.sizes:
+            return []
+        return list(map(IndexEntry, self.names.split(self.SEPARATOR), [self.is_folder] * len(self.sizes),
+                        self.sizes, self.dates.split(self.SEPARATOR)))
+
+
+LISTING_CACHE = ListingCache()
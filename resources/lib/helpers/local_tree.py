@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+"""
+    Copyright (C) 2020 Stefano Gottardo (plugin.autoupdatekodi)
+    Cached tree index of the downloads folder
+
+    SPDX-License-Identifier: MIT
+    See LICENSES/MIT.md for more information.
+"""
+import os
+import threading
+import time
+
+from resources.lib.globals import G
+from resources.lib.helpers.index_parser import IndexEntry
+from resources.lib.helpers.logging import LOG, measure_exec_time_decorator
+
+
+class _Node(object):
+    """A folder of the tree"""
+    __slots__ = ('mtime_ns', 'folders', 'files')
+
+    def __init__(self, mtime_ns):
+        self.mtime_ns = mtime_ns
+        self.folders = {}  # Name -> _Node
+        self.files = {}  # Name -> (size, mtime)
+
+
+class LocalTree(object):
+    """
+    Tree of the folders and files of the downloads folder, built with a single os.scandir walk.
+    The tree is kept in memory (with the reuseLanguageInvoker also between the add-on invocations),
+    at each use only the folders with a changed modification time are scanned again.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._root = None
+
+    def folder_exists(self, pathitems):
+        """Check if a folder exists, the pathitems are relative to the downloads folder"""
+        return self._get_node(pathitems) is not None
+
+    def list_folder(self, pathitems):
+        """
+        Get the contents of a folder, the pathitems are relative to the downloads folder
+        :return: tuple of two lists of IndexEntry (folders, files), empty if the folder not exists
+        """
+        node = self._get_node(pathitems)
+        if node is None:
+            return [], []
+        folders = [IndexEntry(name, True, 0, '') for name in node.folders]
+        files = [IndexEntry(name, False, size, time.strftime('%Y-%m-%d %H:%M', time.localtime(mtime)))
+                 for name, (size, mtime) in node.files.items()]
+        return folders, files
+
+    def get_folder_stamp(self, pathitems):
+        """
+        Get the modification time of a folder, it changes when the folder contents are changed.
+        Only the folder is checked, the tree is not refreshed
+        :return: the modification time in nanoseconds, or None if the folder not exists
+        """
+        try:
+            return os.stat(os.path.join(G.DOWNLOADS_PATH, *pathitems)).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    @measure_exec_time_decorator(category='file')
+    def _get_node(self, pathitems):
+        with self._lock:
+            self._root = _refresh(self._root, G.DOWNLOADS_PATH)
+            node = self._root
+        for name in pathitems:
+            if node is None:
+                break
+            node = node.folders.get(name)
+        return node
+
+
+def _refresh(node, path):
+    """Update the node of a folder, by scanning again only the changed folders"""
+    try:
+        mtime_ns = os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return None
+    if node is None or node.mtime_ns != mtime_ns:
+        LOG.debug('Scan the downloads folder: {}', path)
+        return _scan(path, mtime_ns)
+    # The folder mtime changes only when its direct entries change, then the subfolders must be checked
+    for name, child in list(node.folders.items()):
+        child = _refresh(child, os.path.join(path, name))
+        if child is None:
+            del node.folders[name]
+        else:
+            node.folders[name] = child
+    return node
+
+
+def _scan(path, mtime_ns):
+    node = _Node(mtime_ns)
+    with os.scandir(path) as entries:
+        for entry in entries:
+            if entry.is_dir():
+                # scandir provides the type without a stat call, the stat is needed only for the mtime
+                node.folders[entry.name] = _scan(entry.path, entry.stat().st_mtime_ns)
+            else:
+                stat = entry.stat()
+                node.files[entry.name] = (stat.st_size, stat.st_mtime)
+    return node
+
+
+LOCAL_TREE = LocalTree()
@@ -8,11 +8,21 @@
     SPDX-License-Identifier: MIT
     See LICENSES/MIT.md for more information.
 """
+import json
+import os
+import threading
 import time
+from collections import deque
+from contextlib import contextmanager
 from functools import wraps
 
 import xbmc
 
+MAX_TRACE_FILES = 20  # Number of files of each type (time trace, profile) kept in the traces folder
+PROFILE_LOG_LINES = 40  # Number of functions of the profile stats written to the log
+CAPTURE_BUFFER_SIZE = 500  # Number of the last messages not logged that are kept in memory
+_CONTAINER_TYPES = (list, dict, set)  # The captured arguments that are copied, the others are kept as they are
+
 
 class Logging:
     """A helper class for logging"""
@@ -26,29 +36,46 @@ class Logging:
         self.__addon_id = None
         self.__plugin_handle = None
         self.is_time_trace_enabled = False
-        self.time_trace_level = -2
+        self.trace_folder = None
+        self.__time_trace_local = threading.local()
         self.__time_trace_data = []
+        self.__time_trace_run = 0  # Id of the current run, the traces of the threads of the previous runs are dropped
+        self.is_capture_enabled = False
+        self.__captured = deque(maxlen=CAPTURE_BUFFER_SIZE)
         self.debug = self._debug
         self.info = self._info
         self.warn = self._warn
 
-    def initialize(self, addon_id, plugin_handle, log_level, is_time_trace_enabled):
-        if log_level == self.level and is_time_trace_enabled == self.is_time_trace_enabled:
+    def initialize(self, addon_id, plugin_handle, log_level, is_time_trace_enabled, trace_folder=None,
+                   is_capture_enabled=False):
+        """
+        Initialize the log
+        :param trace_folder: if set, the time trace is saved also to a trace file in this folder
+        :param is_capture_enabled: if True the messages below the log level are kept in memory,
+                                   to be written to the log when an error occurs (see write_captured)
+        """
+        self.trace_folder = trace_folder
+        if (log_level == self.level and is_time_trace_enabled == self.is_time_trace_enabled
+                and is_capture_enabled == self.is_capture_enabled):
             return
         self.__addon_id = addon_id
         self.__plugin_handle = plugin_handle
         self.__log('The debug logging level is set as "{}"'.format(log_level), xbmc.LOGINFO)
         self.level = log_level
         self.is_time_trace_enabled = log_level == self.LEVEL_VERBOSE and is_time_trace_enabled
+        self.is_capture_enabled = is_capture_enabled
+        if not is_capture_enabled:
+            self.__captured.clear()
         # To avoid adding extra workload to the cpu when logging is not required,
-        # we replace the log methods with a empty method
+        # we replace the log methods with a empty method, or with a method that only store the message
+        not_logged = self._capture_debug if is_capture_enabled else self.__not_to_process
         if self.level != self.LEVEL_VERBOSE:
-            self.debug = self.__not_to_process
+            self.debug = not_logged
         else:
             self.debug = self._debug
         if self.level == self.LEVEL_DISABLED:
-            self.info = self.__not_to_process
-            self.warn = self.__not_to_process
+            self.info = self._capture_info if is_capture_enabled else self.__not_to_process
+            self.warn = self._capture_warn if is_capture_enabled else self.__not_to_process
         else:
             self.info = self._info
             self.warn = self._warn
@@ -82,34 +109,163 @@ class Logging:
     def __not_to_process(self, msg, *args, **kwargs):
         pass
 
+    # The captured messages are stored with the arguments not formatted, the format is done only when
+    # they are written to the log, a deque with maxlen discards the oldest messages (append is thread safe)
+    def _capture_debug(self, msg, *args, **kwargs):
+        self.__captured.append((time.time(), 'DEBUG', threading.current_thread().name, msg,
+                                _freeze_args(args), _freeze_kwargs(kwargs)))
+
+    def _capture_info(self, msg, *args, **kwargs):
+        self.__captured.append((time.time(), 'INFO', threading.current_thread().name, msg,
+                                _freeze_args(args), _freeze_kwargs(kwargs)))
+
+    def _capture_warn(self, msg, *args, **kwargs):
+        self.__captured.append((time.time(), 'WARNING', threading.current_thread().name, msg,
+                                _freeze_args(args), _freeze_kwargs(kwargs)))
+
+    def write_captured(self):
+        """
+        Write to the log (as error) the messages captured in memory, to have the context of an error.
+        The arguments are formatted now, the lists, dicts and sets have been copied when captured.
+        """
+        captured = list(self.__captured)
+        self.__captured.clear()
+        if not captured:
+            return
+        lines = ['The last {} messages before the error (not written at the current log level):'.format(len(captured))]
+        for timestamp, level, thread_name, msg, args, kwargs in captured:
+            try:
+                text = msg.format(*args, **kwargs) if args or kwargs else msg
+            except Exception:  # pylint: disable=broad-except
+                text = '{} {} {}'.format(msg, args, kwargs)
+            lines.append('{}.{:03d} {:<7} [{}] {}'.format(time.strftime('%H:%M:%S', time.localtime(timestamp)),
+                                                          int(timestamp % 1 * 1000), level, thread_name, text))
+        self.__log('\n'.join(lines), xbmc.LOGERROR)
+
+    @property
+    def time_trace_level(self):
+        """The nesting level of the time trace, each thread has its own level"""
+        return getattr(self.__time_trace_local, 'level', -2)
+
     def add_time_trace_level(self):
         """Add a level to the time trace"""
-        self.time_trace_level += 2
+        level = self.time_trace_level + 2
+        if level == 0:
+            # The first level of the thread, its traces belong to the current run
+            # (a thread can end after the run that has started it, e.g. a background revalidation)
+            self.__time_trace_local.run = self.__time_trace_run
+        self.__time_trace_local.level = level
 
     def remove_time_trace_level(self):
         """Remove a level from the time trace"""
-        self.time_trace_level -= 2
+        self.__time_trace_local.level = self.time_trace_level - 2
 
-    def add_time_trace(self, func_name, execution_time):
-        self.__time_trace_data.append([func_name, execution_time, self.time_trace_level])
+    def add_time_trace(self, name, start_time, end_time, category='function', args=None):
+        """
+        Add an execution time to the time trace
+        :param name: The name of the function or of the phase
+        :param start_time: The start time (perf_counter)
+        :param end_time: The end time (perf_counter)
+        :param category: The category of the trace event
+        :param args: Optional dict of details of the trace event (e.g. the URL of a request)
+        """
+        # list.append is atomic, the threads can add the traces without a lock
+        self.__time_trace_data.append((name, category, start_time, end_time, self.time_trace_level,
+                                       threading.current_thread().name, args,
+                                       getattr(self.__time_trace_local, 'run', None)))
 
     def reset_time_trace(self):
-        """Reset current time trace info"""
-        self.__time_trace_data = []
-        self.time_trace_level = -2
+        """
+        Reset current time trace info, the nesting levels of the threads still running are kept
+        :return: the traces of the current run
+        """
+        run = self.__time_trace_run
+        # Swap the list in one step, then the traces added meanwhile by a thread of this run are in one of the lists
+        traces, self.__time_trace_data = self.__time_trace_data, []
+        self.__time_trace_run += 1
+        return [trace for trace in traces if trace[7] == run]
 
-    def log_time_trace(self):
-        """Write the time tracing info to the debug log"""
+    def log_time_trace(self, description=''):
+        """
+        Write the time tracing info to the debug log, and to a trace file when the trace folder is set
+        :param description: Description of the run, saved in the trace file (e.g. the add-on URL)
+        """
         if not self.is_time_trace_enabled:
             return
         time_trace = ['Execution time measured for this run:\n']
-        self.__time_trace_data.reverse()
-        for trace in self.__time_trace_data:
-            time_trace.append(' ' * trace[2])
-            time_trace.append(format(trace[0], '<30'))
-            time_trace.append('{:>5} ms\n'.format(trace[1]))
+        main_thread = threading.main_thread().name
+        # The traces are added when the functions end, sorted by start time the callers come before the callees
+        traces = sorted(self.reset_time_trace(), key=lambda trace: (trace[5] != main_thread, trace[5], trace[2]))
+        for name, _, start_time, end_time, level, thread_name, _, _ in traces:
+            time_trace.append(' ' * level)
+            time_trace.append(format(name if thread_name == main_thread else '[{}] {}'.format(thread_name, name),
+                                     '<30'))
+            time_trace.append('{:>5} ms\n'.format(int((end_time - start_time) * 1000)))
         self.debug(''.join(time_trace))
-        self.reset_time_trace()
+        if self.trace_folder and traces:
+            try:
+                self.debug('Time trace saved to {}', _save_trace_file(self.trace_folder, traces, description))
+            except OSError as exc:
+                self.warn('Cannot save the time trace file: {}', exc)
+
+
+def _freeze_args(args):
+    """
+    Copy the mutable containers of the arguments, so the captured message show their content at the time of the call,
+    the arguments are not formatted here, it would be done also for the messages that will never be written
+    """
+    if not args:
+        return args
+    return tuple(arg.copy() if isinstance(arg, _CONTAINER_TYPES) else arg for arg in args)
+
+
+def _freeze_kwargs(kwargs):
+    if not kwargs:
+        return kwargs
+    return {key: arg.copy() if isinstance(arg, _CONTAINER_TYPES) else arg for key, arg in kwargs.items()}
+
+
+def _save_trace_file(folder, traces, description):
+    """
+    Save the traces to a file in the Chrome trace event format, it can be opened with chrome://tracing
+    or https://ui.perfetto.dev, the oldest files are deleted to keep at most MAX_TRACE_FILES files
+    :return: the file path
+    """
+    os.makedirs(folder, exist_ok=True)
+    origin = min(trace[2] for trace in traces)
+    thread_ids = {}
+    events = []
+    for name, category, start_time, end_time, _, thread_name, args, _ in traces:
+        if thread_name not in thread_ids:
+            thread_ids[thread_name] = len(thread_ids) + 1
+            events.append({'name': 'thread_name', 'ph': 'M', 'pid': 1, 'tid': thread_ids[thread_name],
+                           'args': {'name': thread_name}})
+        event = {'name': name, 'cat': category, 'ph': 'X', 'pid': 1, 'tid': thread_ids[thread_name],
+                 'ts': round((start_time - origin) * 1000000, 1),
+                 'dur': round((end_time - start_time) * 1000000, 1)}
+        if args:
+            event['args'] = args
+        events.append(event)
+    file_path = os.path.join(folder, 'trace_{}.json'.format(_get_file_timestamp()))
+    with open(file_path + '.tmp', 'w') as file_handle:
+        json.dump({'traceEvents': events, 'displayTimeUnit': 'ms', 'otherData': {'description': description}},
+                  file_handle)
+    os.replace(file_path + '.tmp', file_path)
+    _delete_old_files(folder, 'trace_', '.json')
+    return file_path
+
+
+def _get_file_timestamp():
+    now = time.time()
+    return '{}_{:03d}'.format(time.strftime('%Y%m%d_%H%M%S', time.localtime(now)), int(now % 1 * 1000))
+
+
+def _delete_old_files(folder, prefix, suffix):
+    """Delete the oldest files with the prefix and suffix, to keep at most MAX_TRACE_FILES files"""
+    file_names = sorted(filename for filename in os.listdir(folder)
+                        if filename.startswith(prefix) and filename.endswith(suffix))
+    for filename in file_names[:-MAX_TRACE_FILES]:
+        os.remove(os.path.join(folder, filename))
 
 
 def logdetails_decorator(func):
@@ -138,7 +294,7 @@ def logdetails_decorator(func):
     return wrapped
 
 
-def measure_exec_time_decorator(is_immediate=False):
+def measure_exec_time_decorator(is_immediate=False, category='function'):
     """A decorator that wraps a function call and times its execution"""
     # pylint: disable=missing-docstring
     def exec_time_decorator(func):
@@ -151,14 +307,58 @@ def measure_exec_time_decorator(is_immediate=False):
             try:
                 return func(*args, **kwargs)
             finally:
-                execution_time = int((time.perf_counter() - start) * 1000)
+                end = time.perf_counter()
                 if is_immediate:
-                    LOG.debug('Call to {} took {}ms', func.__name__, execution_time)
+                    LOG.debug('Call to {} took {}ms', func.__name__, int((end - start) * 1000))
                 else:
-                    LOG.add_time_trace(func.__name__, execution_time)
+                    LOG.add_time_trace(func.__qualname__, start, end, category)
                 LOG.remove_time_trace_level()
         return timing_wrapper
     return exec_time_decorator
 
 
+@contextmanager
+def measure_exec_time(name, category='function', args=None):
+    """Context to time the execution of a part of a function, added to the time trace as the decorator"""
+    if not LOG.is_time_trace_enabled:
+        yield
+        return
+    LOG.add_time_trace_level()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        LOG.add_time_trace(name, start, time.perf_counter(), category, args)
+        LOG.remove_time_trace_level()
+
+
+@contextmanager
+def profile_execution(folder):
+    """
+    Context to profile the execution with cProfile (only the calling thread is profiled),
+    the stats are saved to a file (can be opened with snakeviz or pstats) and the slowest functions are logged
+    :param folder: The folder where save the stats file
+    """
+    import cProfile
+    import io
+    import pstats
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        try:
+            os.makedirs(folder, exist_ok=True)
+            file_path = os.path.join(folder, 'profile_{}.prof'.format(_get_file_timestamp()))
+            profiler.dump_stats(file_path)
+            _delete_old_files(folder, 'profile_', '.prof')
+        except OSError as exc:
+            LOG.warn('Cannot save the profile file: {}', exc)
+            file_path = None
+        stream = io.StringIO()
+        pstats.Stats(profiler, stream=stream).sort_stats('cumulative').print_stats(PROFILE_LOG_LINES)
+        LOG.info('Profile saved to {}\n{}', file_path, stream.getvalue())
+
+
 LOG = Logging()
@@ -0,0 +1,181 @@
+# -*- coding: utf-8 -*-
+"""
+    Copyright (C) 2020 Stefano Gottardo (plugin.autoupdatekodi)
+    Mirrors selection by latency and health score
+
+    SPDX-License-Identifier: MIT
+    See LICENSES/MIT.md for more information.
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.error import HTTPError
+
+from resources.lib.globals import G
+from resources.lib.helpers.http_client import HTTP_CLIENT
+from resources.lib.helpers.logging import LOG, measure_exec_time_decorator
+from resources.lib.helpers.shared_file import SharedJsonFile
+
+SCORES_FILENAME = 'mirrors.json'
+PROBE_INTERVAL = 60 * 60  # Seconds after which the mirrors are probed again
+PROBE_TIMEOUT = 5
+LATENCY_EMA_ALPHA = 0.3
+MAX_FAILURES = 3  # Consecutive failures after which a mirror is considered unhealthy
+FAILURE_EXPIRY = 10 * 60  # Seconds after which an unhealthy mirror can be used again
+
+
+class Mirrors(object):
+    """
+    Manage the mirrors configured in the settings, each mirror have a persisted health and latency score.
+    The mirrors are probed concurrently in background, the requests are sent to the fastest healthy mirror
+    and fail over to the next one in case of errors.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # The service use the mirrors too, the file is shared with the add-on process
+        self._scores_file = SharedJsonFile(self._get_scores_path)
+        self._probe_thread = None
+
+    @property
+    def scores(self):
+        return self._scores_file.load()
+
+    def get_urls(self):
+        """Get the base URLs of the configured mirrors"""
+        urls = [url.strip() for url in G.ADDON.getSettingString('mirrors').split(',') if url.strip()]
+        return [url if url.endswith('/') else url + '/' for url in urls] or [G.MIRROR_BASE_URL]
+
+    def get_ordered(self):
+        """Get the base URLs of the mirrors, from the best to the worst"""
+        urls = self.get_urls()
+        if len(urls) == 1:
+            return urls
+        now = time.time()
+        with self._lock:
+            if any(now - self.scores.get(url, {}).get('last_probe', 0) > PROBE_INTERVAL for url in urls):
+                self._probe_async(urls)
+            # The configured order is kept for the mirrors not probed yet
+            return sorted(urls, key=lambda url: (self._get_score(url, now), urls.index(url)))
+
+    def get_best(self):
+        """Get the base URL of the best mirror"""
+        return self.get_ordered()[0]
+
+    def execute(self, path, func):
+        """
+        Execute a function with the URL of the best mirror, in case of error retry with the next mirrors
+        :param path: The path to append to the mirror base URL
+        :param func: The function to call, with the URL as argument
+        :return: The function result
+        :raise HTTPError: when a mirror returns a client error (4xx), it is not counted as a mirror failure,
+                          only the connection errors, the timeouts and the server errors (5xx) are counted
+        """
+        last_exc = None
+        for base_url in self.get_ordered():
+            try:
+                result = func(base_url + path)
+            except InterruptedError:
+                # Interrupted by the user (or paused), it is not a mirror failure
+                raise
+            except HTTPError as exc:
+                if exc.code < 500:
+                    # A client error (e.g. 404 of a folder not created yet) is returned by a working mirror
+                    raise
+                LOG.warn('Mirror {} failed ({}), try the next one', base_url, exc)
+                self.report_failure(base_url)
+                last_exc = exc
+                continue
+            except OSError as exc:
+                # Connection error or timeout (URLError and socket.timeout are OSError)
+                LOG.warn('Mirror {} failed ({}), try the next one', base_url, exc)
+                self.report_failure(base_url)
+                last_exc = exc
+                continue
+            except Exception as exc:  # pylint: disable=broad-except
+                # Not a mirror failure (e.g. a file with a wrong checksum), try the next mirror but keep its score
+                LOG.warn('Mirror {} error ({}), try the next one', base_url, exc)
+                last_exc = exc
+                continue
+            self.report_success(base_url)
+            return result
+        raise last_exc
+
+    def report_success(self, base_url, latency=None):
+        def update(scores):
+            score = scores.setdefault(base_url, {})
+            score['failures'] = 0
+            if latency is not None:
+                score['latency'] = (score['latency'] + LATENCY_EMA_ALPHA * (latency - score['latency'])
+                                    if 'latency' in score else latency)
+
+        with self._lock:
+            if not self.scores.get(base_url, {}).get('failures') and latency is None:
+                return  # The score is unchanged, avoid to rewrite the file at each request
+            self._scores_file.update(update)
+
+    def report_failure(self, base_url):
+        def update(scores):
+            score = scores.setdefault(base_url, {})
+            score['failures'] = score.get('failures', 0) + 1
+            score['last_failure'] = time.time()
+
+        with self._lock:
+            self._scores_file.update(update)
+
+    def probe(self, urls=None):
+        """Probe the mirrors concurrently, by measuring the time to get the response of a HEAD request"""
+        urls = urls or self.get_urls()
+        with ThreadPoolExecutor(max_workers=len(urls)) as executor:
+            results = list(executor.map(_probe_mirror, urls))
+        now = time.time()
+
+        def set_probe_time(scores):
+            for url in urls:
+                scores.setdefault(url, {})['last_probe'] = now
+
+        for url, latency in zip(urls, results):
+            LOG.debug('Mirror probe of {}: {}',
+                      url, 'failed' if latency is None else '{:.0f} ms'.format(latency * 1000))
+            if latency is None:
+                self.report_failure(url)
+            else:
+                self.report_success(url, latency)
+        with self._lock:
+            self._scores_file.update(set_probe_time)
+
+    def _probe_async(self, urls):
+        if self._probe_thread and self._probe_thread.is_alive():
+            return
+        self._probe_thread = threading.Thread(target=self.probe, args=(urls,))
+        self._probe_thread.daemon = True
+        self._probe_thread.start()
+
+    def _get_score(self, url, now):
+        """Get the mirror score, lower is better"""
+        score = self.scores.get(url, {})
+        failures = score.get('failures', 0)
+        if failures >= MAX_FAILURES and now - score.get('last_failure', 0) < FAILURE_EXPIRY:
+            return float('inf')
+        return score.get('latency', PROBE_TIMEOUT) * (1 + failures)
+
+    def _get_scores_path(self):
+        from resources.lib.helpers.file_ops import translate_path
+        return translate_path(G.DATA_PATH) + SCORES_FILENAME
+
+
+@measure_exec_time_decorator(category='http')
+def _probe_mirror(base_url):
+    """Return the latency in seconds, or None if the mirror is not reachable"""
+    start = time.perf_counter()
+    try:
+        with HTTP_CLIENT.request(base_url, method='HEAD', timeout=PROBE_TIMEOUT):
+            return time.perf_counter() - start
+    except HTTPError as exc:
+        # A client error response still means that the mirror is working
+        return time.perf_counter() - start if exc.code < 500 else None
+    except Exception:  # pylint: disable=broad-except
+        return None
+
+
+MIRRORS = Mirrors()
@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+"""
+    Copyright (C) 2020 Stefano Gottardo (plugin.autoupdatekodi)
+    Background prefetch of the mirror listings
+
+    SPDX-License-Identifier: MIT
+    See LICENSES/MIT.md for more information.
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from resources.lib.helpers.downloader import is_download_active
+from resources.lib.helpers.http_cache import HTTP_CACHE
+from resources.lib.helpers.logging import LOG
+from resources.lib.helpers.rate_limiter import background_transfers
+
+MAX_WORKERS = 2
+MAX_PENDING = 4  # Max number of URLs queued or in progress
+
+
+class Prefetcher(object):
+    """
+    Fetch in background the listings that the user is likely to open next, and store them in the HTTP cache.
+    The prefetch is interrupted when an installer download is started (also by the service), or when it is cancelled.
+    """
+
+    def __init__(self):
+        self._executor = None
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._cancel_event = threading.Event()
+
+    def prefetch(self, urls):
+        """Queue the URLs to be fetched in background (the exceeding URLs are ignored)"""
+        if is_download_active():
+            return
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=MAX_WORKERS)
+            for url in urls:
+                if len(self._pending) >= MAX_PENDING:
+                    break
+                if url in self._pending or HTTP_CACHE.is_fresh(url):
+                    continue
+                LOG.debug('Prefetch queued: {}', url)
+                self._pending[url] = self._executor.submit(self._fetch, url, self._cancel_event)
+
+    def wait(self, url, timeout=None):
+        """Wait for the prefetch of the URL when in progress, so that the response will be taken from the cache"""
+        with self._lock:
+            future = self._pending.get(url)
+        if future and not future.cancel():
+            try:
+                future.result(timeout)
+            except Exception:  # pylint: disable=broad-except
+                pass
+
+    def cancel(self):
+        """Cancel the queued prefetches and interrupt the ones in progress"""
+        with self._lock:
+            self._cancel_event.set()
+            # A new event for the next prefetches, the running ones keep the old event
+            self._cancel_event = threading.Event()
+            for future in self._pending.values():
+                future.cancel()
+            self._pending.clear()
+
+    def _fetch(self, url, cancel_event):
+        try:
+            if cancel_event.is_set() or is_download_active() or HTTP_CACHE.is_fresh(url):
+                return
+            # Read the whole content, HTTP_CACHE store it while it is read
+            with background_transfers():
+                for _ in HTTP_CACHE.iter_content(url):
+                    if cancel_event.is_set() or is_download_active():
+                        LOG.debug('Prefetch interrupted: {}', url)
+                        return
+            LOG.debug('Prefetch completed: {}', url)
+        except Exception as exc:  # pylint: disable=broad-except
+            LOG.warn('Prefetch failed ({}): {}', exc, url)
+        finally:
+            with self._lock:
+                self._pending.pop(url, None)
+
+
+PREFETCHER = Prefetcher()
@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+"""
+    Copyright (C) 2020 Stefano Gottardo (plugin.autoupdatekodi)
+    Progress reporting of the downloads
+
+    SPDX-License-Identifier: MIT
+    See LICENSES/MIT.md for more information.
+"""
+import time
+
+from resources.lib.helpers.kodi_ops import get_local_string
+
+UPDATE_INTERVAL = 0.25  # Seconds between each dialog update (4 Hz)
+SPEED_EMA_ALPHA = 0.2  # Weight of the last speed sample, lower values give a more stable ETA
+
+
+class DownloadProgress(object):
+    """
+    Progress callback of a download that updates a progress dialog at a fixed rate,
+    the calls between the updates only compare the time, so it can be called for every block read.
+    The speed is an exponential moving average of the samples taken at each update.
+    """
+
+    def __init__(self, dlg, filename):
+        self._dlg = dlg
+        self._filename = filename
+        # The localized strings are read once, each read is a call to the Kodi API
+        self._text_downloading = get_local_string(30500)
+        self._text_speed = get_local_string(30501)
+        self._text_eta = get_local_string(30502)
+        self._next_update = 0
+        self._last_time = None
+        self._last_downloaded = 0
+        self._speed = None  # Bytes per second
+
+    def __call__(self, downloaded, file_size):
+        """
+        Report the progress of the download
+        :param downloaded: The bytes downloaded
+        :param file_size: The file size, 0 if unknown
+        :raise InterruptedError: when the user has cancelled the download
+        """
+        now = time.monotonic()
+        if now < self._next_update:
+            return
+        self._next_update = now + UPDATE_INTERVAL
+        self._update_speed(now, downloaded)
+        self._dlg.update(int(min(downloaded * 100 / file_size, 100)) if file_size else 0,
+                         '{}[CR]{}[CR]{}'.format(self._text_downloading, self._filename,
+                                                 self._get_status(downloaded, file_size)))
+        if self._dlg.iscanceled():
+            raise InterruptedError
+
+    def _update_speed(self, now, downloaded):
+        if self._last_time is not None and now > self._last_time:
+            sample = (downloaded - self._last_downloaded) / (now - self._last_time)
+            if self._speed is None:
+                self._speed = sample
+            else:
+                self._speed += SPEED_EMA_ALPHA * (sample - self._speed)
+        # On the first call the bytes already downloaded (resumed download) are not counted in the speed
+        self._last_time = now
+        self._last_downloaded = downloaded
+
+    def _get_status(self, downloaded, file_size):
+        speed = self._speed or 0
+        eta = divmod(int(max(file_size - downloaded, 0) / speed), 60) if speed > 0 and file_size else (0, 0)
+        return '{:.02f} MB of {:.02f} MB {} {:.02f} Kb/s {} {:02d}:{:02d}'.format(
+            downloaded / (1024 * 1024), file_size / (1024 * 1024),
+            self._text_speed, speed / 1024,
+            self._text_eta, eta[0], eta[1])
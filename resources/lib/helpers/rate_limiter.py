@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+"""
+    Copyright (C) 2020 Stefano Gottardo (plugin.autoupdatekodi)
+    Bandwidth limiter of the HTTP transfers
+
+    SPDX-License-Identifier: MIT
+    See LICENSES/MIT.md for more information.
+"""
+import threading
+import time
+from contextlib import contextmanager
+
+from resources.lib.globals import G
+
+RATE_REFRESH_INTERVAL = 1  # Seconds between each read of the rate from the settings
+BURST_DURATION = 0.25  # Seconds of transfer allowed in a single burst
+
+_THREAD_CONTEXT = threading.local()
+
+
+class RateLimiter(object):
+    """
+    Token bucket limiter shared by all the transfers of the same kind (and by all their threads).
+    The bucket capacity is small, so the throughput is smooth instead of alternating bursts and pauses.
+    When there are not enough tokens the bucket goes in debt, and the caller sleeps for the time
+    needed to repay it, so the concurrent transfers are served in turn without busy waiting.
+    """
+
+    def __init__(self, setting_id):
+        self._setting_id = setting_id
+        self._lock = threading.Lock()
+        self._rate = 0
+        self._rate_time = 0
+        self._tokens = 0
+        self._last_time = time.monotonic()
+
+    def consume(self, size):
+        """
+        Take the tokens of the bytes transferred, wait when the limit is exceeded
+        :param size: The number of bytes transferred
+        """
+        with self._lock:
+            now = time.monotonic()
+            rate = self._get_rate(now)
+            if not rate:
+                self._last_time = now
+                return
+            capacity = rate * BURST_DURATION
+            self._tokens = min(capacity, self._tokens + (now - self._last_time) * rate)
+            self._last_time = now
+            self._tokens -= size
+            delay = -self._tokens / rate if self._tokens < 0 else 0
+        if delay:
+            time.sleep(delay)
+
+    def _get_rate(self, now):
+        """Get the rate in bytes per second, it is read again from the settings to apply the changes mid-transfer"""
+        if now - self._rate_time >= RATE_REFRESH_INTERVAL:
+            G.ADDON.refresh()
+            self._rate = G.ADDON.getSettingInt(self._setting_id) * 1024
+            self._rate_time = now
+        return self._rate
+
+
+@contextmanager
+def background_transfers():
+    """Context to apply the background limit to the transfers executed by the current thread"""
+    previous = getattr(_THREAD_CONTEXT, 'is_background', False)
+    _THREAD_CONTEXT.is_background = True
+    try:
+        yield
+    finally:
+        _THREAD_CONTEXT.is_background = previous
+
+
+def get_rate_limiter():
+    """Get the limiter of the current thread, the service and the speculative requests are background transfers"""
+    if G.IS_SERVICE or getattr(_THREAD_CONTEXT, 'is_background', False):
+        return BACKGROUND_LIMITER
+    return INTERACTIVE_LIMITER
+
+
+INTERACTIVE_LIMITER = RateLimiter('bandwidth_limit')
+BACKGROUND_LIMITER = RateLimiter('bandwidth_limit_background')
@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+"""
+    Copyright (C) 2020 Stefano Gottardo (plugin.autoupdatekodi)
+    JSON files shared between the add-on and the service processes
+
+    SPDX-License-Identifier: MIT
+    See LICENSES/MIT.md for more information.
+"""
+import json
+import os
+import time
+from contextlib import contextmanager
+
+from resources.lib.helpers.logging import LOG
+
+LOCK_SUFFIX = '.lock'
+LOCK_TIMEOUT = 10  # Seconds to wait for the lock, after which the lock is taken anyway
+LOCK_EXPIRY = 30  # Seconds after which a lock file is considered left by a terminated process
+LOCK_RETRY_INTERVAL = 0.01
+
+
+class SharedJsonFile(object):
+    """
+    A JSON file that can be changed by more processes (the add-on and the service run in separate interpreters).
+    The data is kept in memory and read again when the file has been changed by another process,
+    each change is applied under a lock file to the data read again from the file, so that the changes
+    made meanwhile by the other process are not lost.
+    """
+
+    def __init__(self, get_file_path, default_factory=dict):
+        """
+        :param get_file_path: function that return the file path (the profile path is known only after init_globals)
+        :param default_factory: function that return the data when the file does not exist or is not valid
+        """
+        self._get_file_path = get_file_path
+        self._default_factory = default_factory
+        self._data = None
+        self._stamp = None
+
+    def load(self):
+        """Get the data, the returned dict must not be changed (use update)"""
+        file_path = self._get_file_path()
+        stamp = _get_stamp(file_path)
+        if self._data is None or stamp != self._stamp:
+            try:
+                with open(file_path, 'r') as file_handle:
+                    self._data = json.load(file_handle)
+            except (IOError, ValueError):
+                self._data = self._default_factory()
+            self._stamp = stamp
+        return self._data
+
+    def update(self, func):
+        """
+        Change the data and save the file
+        :param func: function that change in place the data dict passed as argument
+        :return: the function result
+        """
+        file_path = self._get_file_path()
+        with file_lock(file_path):
+            data = self.load()
+            result = func(data)
+            tmp_path = file_path + '.tmp'
+            with open(tmp_path, 'w') as file_handle:
+                json.dump(data, file_handle)
+            os.replace(tmp_path, file_path)
+            self._stamp = _get_stamp(file_path)
+        return result
+
+
+@contextmanager
+def file_lock(file_path):
+    """
+    Lock a file between the processes, by creating a lock file (the creation fails when it already exists)
+    :param file_path: The file to lock, the lock file is created next to it
+    """
+    lock_path = file_path + LOCK_SUFFIX
+    start_time = time.time()
+    while True:
+        try:
+            os.close(os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+            break
+        except FileExistsError:
+            if time.time() - start_time > LOCK_TIMEOUT or _is_lock_expired(lock_path):
+                LOG.warn('The lock file {} has not been released, it will be replaced', lock_path)
+                _delete_file(lock_path)
+                start_time = time.time()
+                continue
+            time.sleep(LOCK_RETRY_INTERVAL)
+    try:
+        yield
+    finally:
+        _delete_file(lock_path)
+
+
+def _is_lock_expired(lock_path):
+    try:
+        return time.time() - os.path.getmtime(lock_path) > LOCK_EXPIRY
+    except OSError:
+        return False
+
+
+def _get_stamp(file_path):
+    try:
+        stat = os.stat(file_path)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size, stat.st_ino
+
+
+def _delete_file(file_path):
+    try:
+        os.remove(file_path)
+    except FileNotFoundError:
+        pass
@@ -5,27 +5,30 @@
     SPDX-License-Identifier: MIT
     See LICENSES/MIT.md for more information.
 """
-import json
 import re
-from urllib.request import Request, urlopen
 
+import xbmc
 import xbmcgui
 
 import resources.lib.helpers.kodi_ops as kodi_ops
-import resources.lib.helpers.misc as misc
 from resources.lib.globals import G
-from resources.lib.helpers.file_ops import delete_folder_contents
 from resources.lib.helpers.logging import LOG
 
+PRELOAD_PR_ITEMS = 5  # Number of PR's details to load in background (each PR cost two GitHub API requests)
+
 
 class ActionsExecutor(object):
-    """Execute add-on actions"""
+    """
+    Execute add-on actions.
+    Each action imports the modules it needs, so an action does not pay the import time of the others.
+    """
 
     def __init__(self, params):
         LOG.debug('Initializing "ActionsExecutor" with params: {}', params)
         self.params = params
 
     def add_task(self, pathitems=None):  # pylint: disable=unused-argument
+        import resources.lib.helpers.misc as misc
         if not kodi_ops.dlg_confirm(kodi_ops.get_local_string(30050),
                                     kodi_ops.get_local_string(30042)):
             return
@@ -40,6 +43,7 @@ class ActionsExecutor(object):
             kodi_ops.show_notification(kodi_ops.get_local_string(30044))
 
     def delete_task(self, pathitems=None):  # pylint: disable=unused-argument
+        import resources.lib.helpers.misc as misc
         if not kodi_ops.dlg_confirm(kodi_ops.get_local_string(30051),
                                     kodi_ops.get_local_string(30043)):
             return
@@ -53,25 +57,40 @@ class ActionsExecutor(object):
             kodi_ops.show_notification(kodi_ops.get_local_string(30046))
 
     def delete_downloads(self, pathitems=None):  # pylint: disable=unused-argument
+        from resources.lib.helpers.download_store import DOWNLOAD_STORE
+        from resources.lib.helpers.file_ops import delete_folder_contents
         if kodi_ops.dlg_confirm(kodi_ops.get_local_string(30074),
                                 kodi_ops.get_local_string(30075)):
             with kodi_ops.show_busy_dialog():
                 delete_folder_contents(G.DOWNLOADS_PATH, delete_subfolders=True)
+                DOWNLOAD_STORE.clear_index()
+                DOWNLOAD_STORE.prune()
+
+    def toggle_pin_download(self, pathitems=None):
+        """Pin or unpin a downloaded file, the pinned files are never deleted to respect the downloads quota"""
+        from resources.lib.helpers.download_store import DOWNLOAD_STORE
+        key = '/'.join(pathitems)
+        DOWNLOAD_STORE.set_pinned(key, not DOWNLOAD_STORE.is_pinned(key))
+        xbmc.executebuiltin('Container.Refresh')
 
     def get_git_history(self, pathitems=None):
+        from resources.lib.helpers.github_api import PULL_REQUESTS
         # Query github data
-        filename = pathitems[0]
-        data = _get_git_history(filename)
+        filename = pathitems[-1]
+        try:
+            labels = _get_git_history(pathitems[:-1], filename)
+        except InterruptedError:
+            return
         # Generate list from github data
         list_items = []
-        for commit_data in reversed(data['commits']):
-            # Show only "Merge" commits
-            if not commit_data['commit']['message'].startswith('Merge'):
-                continue
-            list_item = xbmcgui.ListItem(label=_generate_label_from_commit(commit_data),
+        for label in labels:
+            list_item = xbmcgui.ListItem(label=label,
                                          offscreen=True)
             list_item.setContentLookup(False)
             list_items.append(list_item)
+        # Load in background the details of the PR's visible in the dialog
+        PULL_REQUESTS.preload(filter(None, [_get_pr_number(list_item.getLabel())
+                                            for list_item in list_items[:PRELOAD_PR_ITEMS]]))
         # Show dialog
         index = 0
         while index != -1:
@@ -81,37 +100,33 @@ class ActionsExecutor(object):
                                             preselect=index)
             if not index == -1:
                 # Get PR number
-                pr_number = re.findall(r'#(\d+)', list_items[index].getLabel())
+                pr_number = _get_pr_number(list_items[index].getLabel())
                 xbmcgui.Dialog().textviewer(list_items[index].getLabel(), _get_pr_details(pr_number))
 
     def use_task_info(self, pathitems=None):  # pylint: disable=unused-argument
         xbmcgui.Dialog().ok(kodi_ops.get_local_string(30040), kodi_ops.get_local_string(30041))
 
 
-def _generate_label_from_commit(data):
-    list_header_text = data['commit']['message'].split('\n')
-    # Get PR number
-    pr_number = re.findall(r'#(\d+)', list_header_text[0])
-    return '#{} {}'.format(pr_number[0], list_header_text[2])
+def _get_pr_number(label):
+    pr_number = re.findall(r'#(\d+)', label)
+    return pr_number[0] if pr_number else None
 
 
-@kodi_ops.show_busy_dialog_decorator
 def _get_pr_details(pr_number):
     commits_childs_headers = []
     text = ''
     if pr_number:
-        # Get PR data
-        url = 'https://api.github.com/repos/xbmc/xbmc/pulls/{}'.format(pr_number[0])
-        page_response = make_http_request(url)
-        pr_data = json.loads(page_response.decode())
+        from resources.lib.helpers.github_api import PULL_REQUESTS
+        # Get PR data and commits data
+        if PULL_REQUESTS.is_loaded(pr_number):
+            pr_data, commits = PULL_REQUESTS.get(pr_number)
+        else:
+            with kodi_ops.show_busy_dialog():
+                pr_data, commits = PULL_REQUESTS.get(pr_number)
         text = pr_data['title'] + '[CR][CR]'
         text += 'DESCRIPTION:[CR]'
-        desc = re.sub(r'<!--.*-->', '', pr_data['body'])  # delete hidden comments
+        desc = re.sub(r'<!--.*-->', '', pr_data['body'] or '')  # delete hidden comments
         text += desc + '[CR][CR]'
-        # Get commits data
-        url = 'https://api.github.com/repos/xbmc/xbmc/pulls/{}/commits'.format(pr_number[0])
-        page_response = make_http_request(url)
-        commits = json.loads(page_response.decode())
         for commit_data in reversed(commits):
             commits_childs_headers.append(commit_data['commit']['message'].split('\n')[0])
     text += 'COMMITS:[CR]'
@@ -119,26 +134,42 @@ def _get_pr_details(pr_number):
     return text
 
 
-@kodi_ops.show_busy_dialog_decorator
-def _get_git_history(selected_file):
-    selected_commit_sha = _get_commit_sha(selected_file)
+def _get_git_history(folder_pathitems, selected_file):
+    """Get the labels of the PR's merged in the selected build (served from the local index when available)"""
+    from resources.lib.helpers.git_index import GIT_INDEX
+    from resources.lib.helpers.listing_cache import LISTING_CACHE
+    # The builds list of the folder is taken from the listings cache, the last listing displayed
+    # may not be the folder of the selected build when Kodi has shown again a listing from its own cache
+    entries = LISTING_CACHE.get(folder_pathitems, False) if folder_pathitems else None
+    files_list = [entry.name for entry in entries[1]] if entries else G.FILES_LIST
+    progress = _CompareProgress(selected_file)
     try:
-        previous_file = G.FILES_LIST[G.FILES_LIST.index(selected_file) + 1]
-    except (ValueError, IndexError):
-        previous_file = None
-    if previous_file:
-        previous_commit_sha = _get_commit_sha(previous_file)
-    else:
-        previous_commit_sha = 'HEAD'
-    url = 'https://api.github.com/repos/xbmc/xbmc/compare/{}...{}'.format(previous_commit_sha, selected_commit_sha)
-    page_response = make_http_request(url)
-    return json.loads(page_response.decode())
-
-
-def _get_commit_sha(filename):
-    return filename.split('-')[2]
-
-
-def make_http_request(url):
-    LOG.debug('Execute HTTP request to: {}', url)
-    return urlopen(Request(url), timeout=10).read()
+        return GIT_INDEX.get_merged_prs(files_list, selected_file, progress)
+    finally:
+        progress.close()
+
+
+class _CompareProgress(object):
+    """
+    Progress callback of the commits requested to GitHub, the dialog is opened only when the commits
+    are not in the local index. The select dialog of Kodi cannot be updated while it is shown,
+    so the merged PR's are counted here while the pages arrive.
+    """
+
+    def __init__(self, filename):
+        self._filename = filename
+        self._dlg = None
+
+    def __call__(self, loaded_pages, total_pages, merged_prs):
+        if self._dlg is None:
+            self._dlg = xbmcgui.DialogProgress()
+            self._dlg.create(kodi_ops.get_local_string(30081).format(self._filename))
+        self._dlg.update(int(loaded_pages * 100 / total_pages),
+                         kodi_ops.get_local_string(30082).format(loaded_pages, total_pages) + '[CR]'
+                         + kodi_ops.get_local_string(30083).format(merged_prs))
+        if self._dlg.iscanceled():
+            raise InterruptedError
+
+    def close(self):
+        if self._dlg is not None:
+            self._dlg.close()
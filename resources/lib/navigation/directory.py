@@ -5,14 +5,14 @@
     SPDX-License-Identifier: MIT
     See LICENSES/MIT.md for more information.
 """
-import os
 import re
+
 import xbmcgui
 
 import resources.lib.helpers.kodi_ops as kodi_ops
 from resources.lib.globals import G
-from resources.lib.helpers.file_ops import folder_exists
-from resources.lib.helpers.logging import LOG
+from resources.lib.helpers.listing_cache import LISTING_CACHE
+from resources.lib.helpers.logging import LOG, measure_exec_time, measure_exec_time_decorator
 from resources.lib.helpers.misc import build_url
 from resources.lib.navigation.directory_helper import finalize_directory, end_of_directory
 
@@ -29,8 +29,16 @@ ARCHITECTURES = {
 }
 
 
+PREFETCH_MAX_FOLDERS = 2
+_FILENAME_DATE_RE = re.compile(r'-(\d{4})(\d{2})(\d{2})-')  # The build date in a filename as KodiSetup-20201229-...
+
+
 class Directory(object):
-    """Directory listings"""
+    """
+    Directory listings.
+    The modules used only by the local or only by the mirror listings are imported when needed,
+    to reduce the time of the add-on start.
+    """
 
     def __init__(self, params):
         LOG.debug('Initializing "Directory" with params: {}', params)
@@ -43,10 +51,11 @@ class Directory(object):
         self.builds()
 
     def builds(self, pathitems=None):  # pylint: disable=unused-argument
+        from resources.lib.helpers.local_tree import LOCAL_TREE
         directory_items = []
         for build_name, label in BUILDS.items():
             pathitems_value = ['architecture', build_name, 'windows']
-            if self.is_local() and not _local_folder_exists(pathitems_value[1:]):
+            if self.is_local() and not LOCAL_TREE.folder_exists(pathitems_value[1:]):
                 continue
             directory_items.append(create_listitem(pathitems_value,
                                                    is_folder=True, label=label, is_local=self.is_local()))
@@ -62,67 +71,92 @@ class Directory(object):
         self.builds(pathitems)
 
     def architecture(self, pathitems=None):
+        from resources.lib.helpers.local_tree import LOCAL_TREE
         directory_items = []
         for arch_name, label in ARCHITECTURES.items():
             pathitems_value = ['subfolder'] + pathitems + [arch_name]
-            if self.is_local() and not _local_folder_exists(pathitems_value[1:]):
+            if self.is_local() and not LOCAL_TREE.folder_exists(pathitems_value[1:]):
                 continue
             directory_items.append(create_listitem(pathitems_value,
                                                    is_folder=True, label=label, is_local=self.is_local()))
         finalize_directory(directory_items, title='Architecture')
         end_of_directory(False)
+        if not self.is_local():
+            # Prefetch the listings of the architectures, the user will open one of them
+            from resources.lib.helpers.prefetch import PREFETCHER
+            PREFETCHER.prefetch([_get_mirror_url(pathitems + [arch_name]) for arch_name in ARCHITECTURES])
 
     def subfolder(self, pathitems=None):
-        G.FILES_LIST.clear()
+        folder_list, file_list = _get_folder_entries(pathitems, self.is_local())
+        # Memorize the filenames (of all pages) in to globals, allow to find other info from items for github operations
+        G.FILES_LIST[:] = [entry.name for entry in file_list]
+        if G.ADDON.getSettingBool('listing_newest_first'):
+            file_list = sorted(file_list, key=_get_build_date, reverse=True)
+        # The folders are shown in the first page, then the files are shown by pages,
+        # the page to show starts after the file in the "after" param (the last file of the previous page)
+        start = _get_page_start(file_list, self.params.get('after'))
+        page_size = G.ADDON.getSettingInt('listing_page_size')
+        end = min(start + page_size, len(file_list)) if page_size else len(file_list)
+        if start:
+            folder_list = []
+        # Only the items of the page are created
+        directory_items = self._create_subfolder_items(pathitems, folder_list, file_list[start:end])
+        if end < len(file_list):
+            directory_items.append(create_listitem(['subfolder'] + pathitems,
+                                                   is_folder=True,
+                                                   label=kodi_ops.get_local_string(30084).format(end, len(file_list)),
+                                                   is_local=self.is_local(),
+                                                   params={'after': file_list[end - 1].name}))
+        title = ARCHITECTURES.get(pathitems[-1], pathitems[-1])
+        finalize_directory(directory_items, title=title)
+        end_of_directory(False)
+        if not self.is_local() and folder_list:
+            # Prefetch the listings of the subfolders more likely to be opened ("master" first)
+            folder_names = sorted((entry.name for entry in folder_list), key=lambda name: name != 'master')
+            from resources.lib.helpers.prefetch import PREFETCHER
+            PREFETCHER.prefetch([_get_mirror_url(pathitems + [name]) for name in folder_names[:PREFETCH_MAX_FOLDERS]])
+
+    @measure_exec_time_decorator(category='listing')
+    def _create_subfolder_items(self, pathitems, folder_list, file_list):
+        """Create the directory items of the folders and of the files"""
         add_github_menu = 'master' in pathitems and 'nightlies' in pathitems and not self.is_local()
-        folder_list = []
-        file_list = []
-        if self.is_local():
-            current_path = G.DOWNLOADS_PATH + '\\'.join(pathitems)
-            for item in os.listdir(current_path):
-                if os.path.isfile(os.path.join(current_path, item)):
-                    file_list.append(item)
-                else:
-                    folder_list.append(item)
-        else:
-            url = G.MIRROR_BASE_URL + '/'.join(pathitems) + '/'
-            from urllib.request import Request, urlopen
-            page_response = urlopen(Request(url), timeout=10).read()
-            # Find the folders in the webpage
-            folder_list = re.findall(r'href="([^\/"\.]+)\/"', page_response.decode())
-            # Find the executables names in the webpage
-            file_list = re.findall(r'href="([^"]*\.exe)"', page_response.decode())
         directory_items = []
         # Create the directory items
-        for folder_name in folder_list:
-            pathitems_value = ['subfolder'] + pathitems + [folder_name]
+        for entry in folder_list:
+            pathitems_value = ['subfolder'] + pathitems + [entry.name]
             directory_items.append(create_listitem(pathitems_value,
-                                                   is_folder=True, label=folder_name, is_local=self.is_local()))
+                                                   is_folder=True, label=entry.name, is_local=self.is_local()))
         # Create the directory file items
-        for filename in file_list:
-            # Memorize filename in to globals, allow to find other info from items for github operations
-            G.FILES_LIST.append(filename)
+        for entry in file_list:
+            filename = entry.name
             pathitems_value = pathitems + [filename]
             if add_github_menu:
                 # Add "View github history" menu
                 menu_item = [(kodi_ops.get_local_string(30080),
                              kodi_ops.run_plugin_action(
-                                 build_url(['get_git_history', filename], mode=G.MODE_ACTION)))]
+                                 build_url(['get_git_history'] + pathitems_value, mode=G.MODE_ACTION)))]
+            elif self.is_local():
+                # Add "Keep this build" / "Allow automatic deletion" menu
+                from resources.lib.helpers.download_store import DOWNLOAD_STORE
+                is_pinned = DOWNLOAD_STORE.is_pinned('/'.join(pathitems_value))
+                menu_item = [(kodi_ops.get_local_string(30078 if is_pinned else 30077),
+                             kodi_ops.run_plugin_action(
+                                 build_url(['toggle_pin_download'] + pathitems_value, mode=G.MODE_ACTION)))]
             else:
                 menu_item = None
             directory_items.append(create_listitem(pathitems_value,
                                                    is_folder=False, label=filename, menu_items=menu_item,
                                                    is_local=self.is_local(),
-                                                   art_thumb='DefaultAddon.png'))
-        title = ARCHITECTURES.get(pathitems[-1], pathitems[-1])
-        finalize_directory(directory_items, title=title)
-        end_of_directory(False)
+                                                   art_thumb='DefaultAddon.png',
+                                                   info=_get_info_labels(entry)))
+        return directory_items
 
 
-def create_listitem(pathitems=None, is_folder=False, label=None, menu_items=None, is_local=False, art_thumb=None):
+def create_listitem(pathitems=None, is_folder=False, label=None, menu_items=None, is_local=False, art_thumb=None,
+                    info=None, params=None):
     list_item = xbmcgui.ListItem(label=label, offscreen=True)
     list_item.setContentLookup(False)
-    list_item.setInfo('video', {})
+    list_item.setInfo('video', info or {})
     properties = {
         'isFolder': is_folder
     }
@@ -131,13 +165,82 @@ def create_listitem(pathitems=None, is_folder=False, label=None, menu_items=None
     if art_thumb:
         list_item.setArt({'thumb': art_thumb})
     if is_local:
-        params = {'is_local': True}
-    else:
-        params = None
+        params = dict(params or {}, is_local=True)
     return build_url(pathitems=pathitems,
                      mode=G.MODE_DIRECTORY if is_folder else G.MODE_INSTALL,
                      params=params), list_item, is_folder
 
 
-def _local_folder_exists(pathitems):
-    return folder_exists(G.DOWNLOADS_PATH + '\\'.join(pathitems))
+def _get_folder_entries(pathitems, is_local):
+    """
+    Get the folders and the files of a folder, the folders already opened are served from the memory cache
+    :return: tuple of two lists of IndexEntry (folders, files)
+    """
+    if is_local:
+        from resources.lib.helpers.local_tree import LOCAL_TREE
+        stamp = LOCAL_TREE.get_folder_stamp(pathitems)
+    else:
+        stamp = None
+    entries = LISTING_CACHE.get(pathitems, is_local, stamp)
+    if entries is not None:
+        return entries
+    if is_local:
+        folder_list, file_list = LOCAL_TREE.list_folder(pathitems)
+    else:
+        from resources.lib.helpers.mirrors import MIRRORS
+        # The page is parsed within the mirror execution, so an error while reading it fails over to the next mirror
+        folder_list, file_list = MIRRORS.execute('/'.join(pathitems) + '/', _get_listing)
+    LISTING_CACHE.put(pathitems, is_local, folder_list, file_list, stamp)
+    return folder_list, file_list
+
+
+def _get_mirror_url(pathitems):
+    from resources.lib.helpers.mirrors import MIRRORS
+    return MIRRORS.get_best() + '/'.join(pathitems) + '/'
+
+
+def _get_listing(url):
+    """Get the folders and the files of a mirror webpage"""
+    from resources.lib.helpers.http_cache import HTTP_CACHE
+    from resources.lib.helpers.index_parser import parse_index
+    from resources.lib.helpers.prefetch import PREFETCHER
+    # Wait for the prefetch of this listing, if it is in progress
+    PREFETCHER.wait(url)
+    folder_list = []
+    file_list = []
+    # Find the folders and the executables in the webpage, while it is downloaded
+    # (the time trace of the parsing includes the download of the page)
+    with measure_exec_time('parse_index', 'parse'):
+        for entry in parse_index(HTTP_CACHE.iter_content(url)):
+            (folder_list if entry.is_folder else file_list).append(entry)
+    return folder_list, file_list
+
+
+def _get_page_start(file_list, after_filename):
+    """Get the position of the first file of a page, the page starts after the file specified"""
+    if after_filename:
+        for pos, entry in enumerate(file_list):
+            if entry.name == after_filename:
+                return pos + 1
+        LOG.debug('The file {} is no longer in the folder, show the first page', after_filename)
+    return 0
+
+
+def _get_build_date(entry):
+    """
+    Get the sort key of the build date, from the filename or from the date column of the index,
+    the date column (the file time) is used also to sort the builds of the same day
+    """
+    match = _FILENAME_DATE_RE.search(entry.name)
+    return ('{}-{}-{}'.format(*match.groups()) if match else entry.date[:10]), entry.date, entry.name
+
+
+def _get_info_labels(entry):
+    """Get the info labels from the size and date columns of the index"""
+    info = {}
+    if entry.size:
+        info['size'] = entry.size
+    if entry.date:
+        # From 'YYYY-MM-DD HH:MM' to the Kodi format 'DD.MM.YYYY'
+        info['date'] = '{}.{}.{}'.format(entry.date[8:10], entry.date[5:7], entry.date[:4])
+    return info
@@ -8,6 +8,7 @@
 import xbmcplugin
 
 from resources.lib.globals import G
+from resources.lib.helpers.logging import measure_exec_time_decorator
 
 CONTENT_FOLDER = 'files'
 
@@ -25,6 +26,7 @@ def add_sort_methods(sort_type):
         xbmcplugin.addSortMethod(G.PLUGIN_HANDLE, xbmcplugin.SORT_METHOD_VIDEO_TITLE)
 
 
+@measure_exec_time_decorator(category='listing')
 def finalize_directory(items, content_type=CONTENT_FOLDER, sort_type='sort_nothing', title=None):
     """Finalize a directory listing. Add items, set available sort methods and content type"""
     if title:
@@ -34,6 +36,7 @@ def finalize_directory(items, content_type=CONTENT_FOLDER, sort_type='sort_nothi
     xbmcplugin.addDirectoryItems(G.PLUGIN_HANDLE, items)
 
 
+@measure_exec_time_decorator(category='listing')
 def end_of_directory(dir_update_listing, succeeded=True):
     # If dir_update_listing=True overwrite the history list, so we can get back to the main page
     xbmcplugin.endOfDirectory(G.PLUGIN_HANDLE,
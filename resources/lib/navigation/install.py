@@ -6,16 +6,24 @@
     See LICENSES/MIT.md for more information.
 """
 from resources.lib.globals import G
-from resources.lib.helpers.file_ops import (join_folders_paths, download_file, folder_exists, create_folder, copy_file,
-                                            file_exists)
-from resources.lib.helpers.logging import LOG
+from resources.lib.helpers.block_sync import find_base_file
+from resources.lib.helpers.checksum import (KNOWN_HASHES, ChecksumError, get_published_checksums, hash_file,
+                                            verify_checksums)
+from resources.lib.helpers.download_store import DOWNLOAD_STORE
+from resources.lib.helpers.downloader import is_download_active
+from resources.lib.helpers.file_ops import (join_folders_paths, download_file, folder_exists, create_folder,
+                                            file_exists, delete_file_safe)
+from resources.lib.helpers.logging import LOG, measure_exec_time_decorator
+from resources.lib.helpers.mirrors import MIRRORS
 import resources.lib.helpers.kodi_ops as kodi_ops
 import resources.lib.helpers.misc as misc
 
+import os
 import time
 import subprocess
 
 
+@measure_exec_time_decorator(category='navigation')
 def install(pathitems, params):
     LOG.info('Start install Kodi "{}" (params "{}")', pathitems[-1], params)
     use_task_scheduler = G.ADDON.getSettingBool('usetaskscheduler')
@@ -36,28 +44,45 @@ def install(pathitems, params):
     dwn_filepath = join_folders_paths(G.DOWNLOADS_PATH, '/'.join(pathitems[:-1]), pathitems[-1])
     # Temp file path will be used by the Windows Task scheduled
     temp_filepath = join_folders_paths(G.INSTALLER_TEMP_PATH, G.INSTALLER_TEMP_NAME)
-    if params.get('is_local', 'False') == 'True':
-        # Get the file to install from "downloads" folder
-        if not file_exists(dwn_filepath):
-            raise FileExistsError('The file {] not exists'.format(pathitems[:-1]))
-        copy_file(dwn_filepath, temp_filepath)
-    else:
-        # Download the file
-        if save_downloads and file_exists(dwn_filepath):
-            # Copy the existing file to the temp file path
-            copy_file(dwn_filepath, temp_filepath)
+    url_file_path = '/'.join(pathitems)
+    try:
+        if params.get('is_local', 'False') == 'True':
+            # Get the file to install from "downloads" folder
+            if not file_exists(dwn_filepath):
+                raise FileExistsError('The file {] not exists'.format(pathitems[:-1]))
+            _stage_verified_file(url_file_path, dwn_filepath, temp_filepath)
         else:
-            # Download the setup installer file
-            url_file_path = '/'.join(pathitems)
-            if not download_file(G.MIRROR_BASE_URL + url_file_path,
-                                 temp_filepath,
-                                 pathitems[-1]):
-                # Download cancelled
+            # The service could be downloading the same build, wait for it instead of downloading it twice
+            if not _wait_background_download(url_file_path):
                 kodi_ops.show_notification(kodi_ops.get_local_string(30073))
                 return
-            # Save the setup installer file
-            if save_downloads:
-                copy_file(temp_filepath, dwn_filepath)
+            # Download the file
+            if save_downloads and file_exists(dwn_filepath):
+                # Use the existing file for the temp file path
+                _stage_verified_file(url_file_path, dwn_filepath, temp_filepath)
+            else:
+                # Download the setup installer file
+                # In case of errors the download is retried from the next mirror
+                base_path = find_base_file(url_file_path) if G.ADDON.getSettingBool('block_reuse') else None
+                hexdigests = MIRRORS.execute(url_file_path,
+                                             lambda url: _download_verified_file(url, temp_filepath, pathitems[-1],
+                                                                                 base_path))
+                if not hexdigests:
+                    # Download cancelled
+                    kodi_ops.show_notification(kodi_ops.get_local_string(30073))
+                    return
+                # Save the setup installer file, the downloaded file is moved to the store
+                # and exposed to the downloads folder and the temp file path, without copy the data
+                if save_downloads:
+                    DOWNLOAD_STORE.save_download(url_file_path, temp_filepath, hexdigests)
+                    DOWNLOAD_STORE.stage(hexdigests['sha256'], temp_filepath)
+    except ChecksumError as exc:
+        # Never run a corrupted installer
+        LOG.error('Installation refused: {}', exc)
+        delete_file_safe(temp_filepath)
+        kodi_ops.dlg_ok(kodi_ops.get_local_string(30070),
+                        kodi_ops.get_local_string(30076))
+        return
     with kodi_ops.show_busy_dialog():
         # Run the "AutoUpdateWorker" bash script
         _run_auto_update_worker(use_task=use_task_scheduler)
@@ -67,6 +92,54 @@ def install(pathitems, params):
         kodi_ops.json_rpc('Application.Quit')
 
 
+def _wait_background_download(url_file_path):
+    """
+    Wait for the download of a file in progress in another process (the service)
+    :return: False if the user has cancelled the wait
+    """
+    if not is_download_active(url_file_path):
+        return True
+    import xbmcgui
+    LOG.info('The file {} is being downloaded in background, wait for it', url_file_path)
+    dlg = xbmcgui.DialogProgress()
+    dlg.create(kodi_ops.get_local_string(30070), kodi_ops.get_local_string(30079))
+    try:
+        while is_download_active(url_file_path):
+            if dlg.iscanceled():
+                return False
+            time.sleep(0.5)
+    finally:
+        dlg.close()
+    return True
+
+
+@measure_exec_time_decorator(category='download')
+def _download_verified_file(url, dest_path, filename, base_path):
+    """Download the file and verify the hashes computed during the download with the mirror checksums"""
+    hexdigests = download_file(url, dest_path, filename, base_path)
+    if hexdigests:
+        verify_checksums(hexdigests, get_published_checksums(url), filename)
+    return hexdigests
+
+
+@measure_exec_time_decorator(category='file')
+def _stage_verified_file(url_file_path, from_path, to_path):
+    """Stage a downloaded file to the temp file path, the file is hashed only if it has not already been verified"""
+    hexdigests = KNOWN_HASHES.get(url_file_path, from_path)
+    if hexdigests:
+        LOG.debug('The file {} has already been verified', from_path)
+    else:
+        hexdigests = hash_file(from_path)
+        checksums = MIRRORS.execute(url_file_path, get_published_checksums)
+        verify_checksums(hexdigests, checksums, from_path)
+        # As for the downloaded files, the hashes are kept also when the mirror has no checksums,
+        # the file (by its size and modification time) has been accepted and has not to be hashed again
+        KNOWN_HASHES.set(url_file_path, from_path, hexdigests)
+    DOWNLOAD_STORE.adopt(from_path, hexdigests['sha256'])
+    DOWNLOAD_STORE.stage(hexdigests['sha256'], to_path, from_path)
+    DOWNLOAD_STORE.register(url_file_path, hexdigests['sha256'], os.path.getsize(from_path))
+
+
 def _run_auto_update_worker(use_task=False):
     arg = 'useTask' if use_task else join_folders_paths(G.INSTALLER_TEMP_PATH, G.INSTALLER_TEMP_NAME)
     auw_path = join_folders_paths(G.ADDON_DATA_PATH, 'utils', 'AutoUpdateWorker.bat')
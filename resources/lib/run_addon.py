@@ -5,12 +5,15 @@
     SPDX-License-Identifier: MIT
     See LICENSES/MIT.md for more information.
 """
-import resources.lib.helpers.kodi_ops as kodi_ops
+import sys
+import time
+
 from resources.lib.globals import G
 from resources.lib.helpers.exceptions import InvalidPathError
-from resources.lib.helpers.logging import LOG
+from resources.lib.helpers.logging import LOG, measure_exec_time, measure_exec_time_decorator
 
 
+@measure_exec_time_decorator(category='navigation')
 def route(pathitems):
     """Route to the appropriate handler"""
     LOG.debug('Routing navigation request')
@@ -44,27 +47,69 @@ def _execute(executor_type, pathitems, params):
     except AttributeError as exc:
         raise InvalidPathError('Unknown action {}'.format('/'.join(pathitems))) from exc
     LOG.debug('Invoking action: {}', executor.__name__)
-    executor(pathitems=pathitems[1:])
+    with measure_exec_time(executor.__qualname__, 'navigation'):
+        executor(pathitems=pathitems[1:])
 
 
-def run(argv):
+def run(argv, start_time=None):
+    """
+    Run the add-on
+    :param argv: The arguments of the add-on invocation
+    :param start_time: The time (perf_counter) of the invocation start, before the modules import
+    """
+    if start_time is None:
+        start_time = time.perf_counter()
     # Initialize globals right away to avoid stale values from the last addon invocation.
     # Otherwise Kodi's reuseLanguageInvoker will cause some really quirky behavior!
     # PR: https://github.com/xbmc/xbmc/pull/13814
     G.init_globals(argv)
+    init_time = time.perf_counter()
     LOG.info('Started (Version {})'.format(G.VERSION_RAW))
     LOG.info('URL is {}'.format(G.URL))
-    success = False
+    if LOG.is_time_trace_enabled:
+        LOG.add_time_trace('Cold start' if G.IS_ADDON_FIRSTRUN else 'Warm start', start_time, init_time, 'startup')
+    if G.ADDON.getSettingBool('profile_next_run'):
+        # The setting is reset before the execution, so that a crash does not leave the profiling active
+        G.ADDON.setSettingBool('profile_next_run', False)
+        from resources.lib.helpers.logging import profile_execution
+        with profile_execution(G.TRACES_PATH):
+            success = _route_request()
+    else:
+        success = _route_request()
+    if not success:
+        from xbmcplugin import endOfDirectory
+        endOfDirectory(handle=G.PLUGIN_HANDLE, succeeded=False)
+    _log_startup_time(start_time, init_time)
+    # The listing is already displayed, now wait for the cached responses served as stale to be refreshed
+    # (if the HTTP cache has not been imported, this path has not used it)
+    if 'resources.lib.helpers.http_cache' in sys.modules:
+        from resources.lib.helpers.http_cache import HTTP_CACHE
+        from resources.lib.helpers.http_client import HTTP_TIMEOUT
+        HTTP_CACHE.wait_revalidations(HTTP_TIMEOUT)
+    LOG.log_time_trace(argv[0] + (argv[2] if len(argv) > 2 else ''))
+
+
+def _route_request():
     try:
         pathitems = [part for part in G.REQUEST_PATH.split('/') if part]
-        success = route(pathitems)
-    except Exception as exc:
+        return route(pathitems)
+    except Exception as exc:  # pylint: disable=broad-except
         import traceback
+        import resources.lib.helpers.kodi_ops as kodi_ops
         LOG.error(traceback.format_exc())
+        LOG.write_captured()
         kodi_ops.dlg_ok('AutoUpdateKodi',
                         kodi_ops.get_local_string(30700).format(
                             '[{}] {}'.format(exc.__class__.__name__, exc)))
-    if not success:
-        from xbmcplugin import endOfDirectory
-        endOfDirectory(handle=G.PLUGIN_HANDLE, succeeded=False)
-    LOG.log_time_trace()
+    return False
+
+
+def _log_startup_time(start_time, init_time):
+    """
+    Log the time taken by this invocation, a cold start is the first invocation of the add-on where
+    all the modules are imported, a warm start is an invocation made with reuseLanguageInvoker
+    """
+    end_time = time.perf_counter()
+    LOG.info('{} start: initialization {:.1f} ms, request {:.1f} ms, total {:.1f} ms',
+             'Cold' if G.IS_ADDON_FIRSTRUN else 'Warm',
+             (init_time - start_time) * 1000, (end_time - init_time) * 1000, (end_time - start_time) * 1000)
@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+"""
+    Copyright (C) 2020 Stefano Gottardo (plugin.autoupdatekodi)
+    Background service that downloads the new builds while Kodi is idle
+
+    SPDX-License-Identifier: MIT
+    See LICENSES/MIT.md for more information.
+"""
+import os
+import time
+
+import xbmc
+
+from resources.lib.globals import G
+from resources.lib.helpers.logging import LOG, measure_exec_time_decorator
+
+POLL_INTERVAL = 10  # Seconds between each check of the service state
+RETRY_INTERVAL = 30 * 60  # Seconds to wait before retry after an error
+
+
+class AutoDownloadMonitor(xbmc.Monitor):
+    """Monitor the Kodi events, the settings are reloaded when changed"""
+
+    def __init__(self, argv):
+        super().__init__()
+        self._argv = argv
+        self.settings_changed = False
+
+    def onSettingsChanged(self):
+        G.init_globals(self._argv, reload_settings=True)
+        self.settings_changed = True
+
+
+class AutoDownloadService(object):
+    """
+    Check periodically the mirror folder configured in the settings, when there is a new build it is downloaded
+    to the downloads folder while the player is idle, so the installation can start without waiting the download.
+    When the playback starts the download is interrupted, and then resumed when the player return idle.
+    """
+
+    def __init__(self, argv):
+        self.monitor = AutoDownloadMonitor(argv)
+        self.player = xbmc.Player()
+        self._next_check = 0
+
+    def run(self):
+        while not self.monitor.abortRequested():
+            if self.monitor.settings_changed:
+                # The folder or the interval may be changed, check again now
+                self.monitor.settings_changed = False
+                self._next_check = 0
+            if self._is_enabled() and time.time() >= self._next_check and not self.player.isPlaying():
+                try:
+                    self.check_new_build()
+                    self._next_check = time.time() + G.ADDON.getSettingInt('auto_download_interval') * 3600
+                except InterruptedError:
+                    # Paused by the playback or by the Kodi exit, will be resumed at the next poll
+                    LOG.info('Background download paused')
+                except Exception as exc:  # pylint: disable=broad-except
+                    import traceback
+                    LOG.error('Background download failed: {}', exc)
+                    LOG.error(traceback.format_exc())
+                    LOG.write_captured()
+                    self._next_check = time.time() + RETRY_INTERVAL
+                LOG.log_time_trace('Background check of new builds')
+            if self.monitor.waitForAbort(POLL_INTERVAL):
+                break
+
+    @measure_exec_time_decorator(category='service')
+    def check_new_build(self):
+        """Download the newest build of the configured folder, if not already downloaded"""
+        from resources.lib.helpers.http_cache import HTTP_CACHE
+        from resources.lib.helpers.index_parser import parse_index
+        from resources.lib.helpers.mirrors import MIRRORS
+        folder_path = G.ADDON.getSettingString('auto_download_folder').strip('/') + '/'
+        # The page is parsed within the mirror execution, so an error while reading it fails over to the next mirror
+        entries = [entry for entry in MIRRORS.execute(folder_path,
+                                                      lambda url: list(parse_index(HTTP_CACHE.iter_content(url))))
+                   if not entry.is_folder]
+        if not entries:
+            LOG.warn('No builds found in the mirror folder {}', folder_path)
+            return
+        # The date is in the sortable format 'YYYY-MM-DD HH:MM', the nightly filenames start with the date too
+        newest = max(entries, key=lambda entry: (entry.date, entry.name))
+        url_file_path = folder_path + newest.name
+        if os.path.exists(G.DOWNLOADS_PATH + url_file_path):
+            LOG.debug('The newest build {} is already downloaded', url_file_path)
+            return
+        LOG.info('Download in background the new build {}', url_file_path)
+        MIRRORS.execute(url_file_path, lambda url: self._download(url, url_file_path))
+        LOG.info('Background download completed: {}', url_file_path)
+
+    def _download(self, url, url_file_path):
+        from resources.lib.helpers.block_sync import download_with_block_reuse, find_base_file
+        from resources.lib.helpers.checksum import ChecksumError, get_published_checksums, verify_checksums
+        from resources.lib.helpers.download_store import DOWNLOAD_STORE
+        from resources.lib.helpers.downloader import SegmentedDownloader
+        # A fixed path for each file, so an interrupted download can be resumed
+        dest_path = G.INSTALLER_TEMP_PATH + 'background/' + url_file_path.replace('/', '_')
+        os.makedirs(os.path.dirname(dest_path), exist_ok=True)
+        # Delete the partial downloads of the builds that are no longer the newest
+        for entry in os.scandir(os.path.dirname(dest_path)):
+            if not entry.path.startswith(dest_path):
+                os.remove(entry.path)
+        hexdigests = None
+        base_path = find_base_file(url_file_path) if G.ADDON.getSettingBool('block_reuse') else None
+        if base_path:
+            try:
+                hexdigests = download_with_block_reuse(url, dest_path, base_path, self._check_interrupt)
+            except InterruptedError:
+                raise
+            except (ChecksumError, IOError) as exc:
+                LOG.warn('Download by reusing the blocks failed ({}), download the whole file', exc)
+        if not hexdigests:
+            downloader = SegmentedDownloader(url,
+                                             dest_path,
+                                             G.ADDON.getSettingInt('download_connections'),
+                                             G.ADDON.getSettingInt('download_segment_size') * 1024 * 1024)
+            downloader.download(self._check_interrupt)
+            hexdigests = downloader.hexdigests
+        try:
+            verify_checksums(hexdigests, get_published_checksums(url), url_file_path)
+        except ChecksumError:
+            os.remove(dest_path)
+            raise
+        DOWNLOAD_STORE.save_download(url_file_path, dest_path, hexdigests)
+
+    def _check_interrupt(self, downloaded, file_size):  # pylint: disable=unused-argument
+        """Progress callback of the download, interrupt it when the playback starts or Kodi is closing"""
+        if self.player.isPlaying() or self.monitor.abortRequested() or not self._is_enabled():
+            raise InterruptedError
+
+    def _is_enabled(self):
+        return G.ADDON.getSettingBool('save_downloads') and G.ADDON.getSettingBool('auto_download')
+
+
+def run(argv):
+    G.init_globals(argv)
+    LOG.info('Service started (Version {})'.format(G.VERSION_RAW))
+    AutoDownloadService(argv).run()
+    LOG.info('Service stopped')
@@ -0,0 +1,22 @@
+# -*- coding: utf-8 -*-
+"""
+    Copyright (C) 2020 Stefano Gottardo (plugin.autoupdatekodi)
+    Tests of the add-on, run outside Kodi with the stand-ins of the Kodi modules of benchmarks/kodi_stubs
+
+    Run from the add-on folder: python -m unittest discover -s tests -t .
+
+    SPDX-License-Identifier: MIT
+    See LICENSES/MIT.md for more information.
+"""
+import os
+import sys
+import tempfile
+
+ADDON_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+os.environ.setdefault('KODI_STUB_PROFILE', tempfile.mkdtemp(prefix='autoupdatekodi_tests_'))
+sys.path[:0] = [os.path.join(ADDON_PATH, 'benchmarks', 'kodi_stubs'), ADDON_PATH]
+
+# pylint: disable=wrong-import-position
+from resources.lib.globals import G  # noqa: E402
+
+G.init_globals(['plugin://plugin.autoupdatekodi/', '1', ''])
@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+"""
+    Copyright (C) 2020 Stefano Gottardo (plugin.autoupdatekodi)
+    Tests of the segmented downloader
+
+    SPDX-License-Identifier: MIT
+    See LICENSES/MIT.md for more information.
+"""
+import hashlib
+import os
+import re
+import shutil
+import tempfile
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from resources.lib.helpers.downloader import SegmentedDownloader
+
+FILE_DATA = os.urandom(300000)
+
+
+class _UnknownSizeHandler(BaseHTTPRequestHandler):
+    """Answer the Range requests with a partial response of unknown total size ("bytes a-b/*")"""
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):  # pylint: disable=invalid-name
+        match = re.match(r'bytes=(\d+)-(\d+)', self.headers.get('Range', ''))
+        if match:
+            start, end = int(match.group(1)), int(match.group(2))
+            body = FILE_DATA[start:end + 1]
+            self.send_response(206)
+            self.send_header('Content-Range', 'bytes {}-{}/*'.format(start, end))
+        else:
+            body = FILE_DATA
+            self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):  # pylint: disable=arguments-differ
+        pass
+
+
+class TestSegmentedDownloader(unittest.TestCase):
+
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), _UnknownSizeHandler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.folder = tempfile.mkdtemp()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def test_unknown_total_size_downloads_whole_file(self):
+        dest_path = os.path.join(self.folder, 'KodiSetup.exe')
+        downloader = SegmentedDownloader('http://127.0.0.1:{}/KodiSetup.exe'.format(self.server.server_address[1]),
+                                         dest_path)
+        downloader.download()
+        with open(dest_path, 'rb') as file_handle:
+            self.assertEqual(file_handle.read(), FILE_DATA)
+        self.assertEqual(downloader.hexdigests['sha256'], hashlib.sha256(FILE_DATA).hexdigest())
+        self.assertFalse(os.path.exists(downloader.part_path))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+"""
+    Copyright (C) 2020 Stefano Gottardo (plugin.autoupdatekodi)
+    Tests of the installation of a downloaded file
+
+    SPDX-License-Identifier: MIT
+    See LICENSES/MIT.md for more information.
+"""
+import os
+import unittest
+from unittest import mock
+
+from resources.lib.globals import G
+from resources.lib.helpers.checksum import hash_file
+import resources.lib.navigation.install as install
+
+
+class TestStageVerifiedFile(unittest.TestCase):
+
+    def setUp(self):
+        self.url_file_path = 'nightlies/test_install/KodiSetup-20201229-master-x64.exe'
+        self.file_path = G.DOWNLOADS_PATH + self.url_file_path
+        self.temp_path = G.INSTALLER_TEMP_PATH + 'test_install.exe'
+        os.makedirs(os.path.dirname(self.file_path), exist_ok=True)
+        os.makedirs(G.INSTALLER_TEMP_PATH, exist_ok=True)
+        with open(self.file_path, 'wb') as file_handle:
+            file_handle.write(os.urandom(100000))
+
+    def test_no_published_checksums_hashed_once(self):
+        # The mirror does not publish the checksums of the file
+        with mock.patch.object(install.MIRRORS, 'execute', return_value={}), \
+                mock.patch.object(install, 'hash_file', wraps=hash_file) as hash_file_spy:
+            install._stage_verified_file(self.url_file_path, self.file_path, self.temp_path)
+            install._stage_verified_file(self.url_file_path, self.file_path, self.temp_path)
+        self.assertEqual(hash_file_spy.call_count, 1)
+        self.assertTrue(os.path.exists(self.temp_path))
+
+
+if __name__ == '__main__':
+    unittest.main()
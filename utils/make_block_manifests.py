@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+"""
+    Copyright (C) 2020 Stefano Gottardo (plugin.autoupdatekodi)
+    Generate the block checksums manifests of the installers, to be run on a mirror
+
+    For each installer (.exe) is written a "<filename>.blocks.json" manifest file next to it,
+    the add-on use it to download only the blocks changed from the previous build saved.
+    The manifests already up to date are skipped, so it can be run periodically (e.g. by cron).
+    Usage: python make_block_manifests.py [--block-size KB] path [path ...]
+
+    SPDX-License-Identifier: MIT
+    See LICENSES/MIT.md for more information.
+"""
+import argparse
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+# pylint: disable=wrong-import-position
+from resources.lib.helpers.block_manifest import DEFAULT_BLOCK_SIZE, MANIFEST_SUFFIX, compute_manifest
+
+
+def iter_installers(paths):
+    for path in paths:
+        if os.path.isfile(path):
+            yield path
+            continue
+        for root, _, filenames in os.walk(path):
+            for filename in filenames:
+                if filename.endswith('.exe'):
+                    yield os.path.join(root, filename)
+
+
+def write_manifest(file_path, block_size):
+    """Write the manifest of a file, return False if it is already up to date"""
+    manifest_path = file_path + MANIFEST_SUFFIX
+    if os.path.exists(manifest_path) and os.path.getmtime(manifest_path) >= os.path.getmtime(file_path):
+        return False
+    manifest = compute_manifest(file_path, block_size)
+    tmp_path = manifest_path + '.tmp'
+    with open(tmp_path, 'w') as file_handle:
+        json.dump(manifest, file_handle, separators=(',', ':'))
+    os.replace(tmp_path, manifest_path)
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate the block checksums manifests of the installers')
+    parser.add_argument('--block-size', type=int, default=DEFAULT_BLOCK_SIZE // 1024, help='block size in KB')
+    parser.add_argument('paths', nargs='+', help='installer files or folders to scan')
+    args = parser.parse_args()
+    for file_path in iter_installers(args.paths):
+        if write_manifest(file_path, args.block_size * 1024):
+            print('Written manifest of {}'.format(file_path))
+
+
+if __name__ == '__main__':
+    main()